@@ -33,6 +33,12 @@ class InterlockLogAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(AccessGroup)
+class AccessGroupAdmin(admin.ModelAdmin):
+    list_display = ("name", "description")
+    filter_horizontal = ("members", "doors", "interlocks")
+
+
 @admin.register(MemberbucksDevice)
 class MemberbucksDeviceAdmin(admin.ModelAdmin):
     pass
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:07
+
+from django.db import migrations, models
+import django_prometheus.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profile", "0029_fix_billing_group_subscription_status"),
+        ("access", "0020_accesscontrolleddevice_post_to_slack"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccessGroup",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "name",
+                    models.CharField(max_length=100, unique=True, verbose_name="Name"),
+                ),
+                (
+                    "description",
+                    models.CharField(
+                        blank=True, max_length=250, verbose_name="Description"
+                    ),
+                ),
+                (
+                    "doors",
+                    models.ManyToManyField(
+                        blank=True, related_name="access_groups", to="access.Doors"
+                    ),
+                ),
+                (
+                    "interlocks",
+                    models.ManyToManyField(
+                        blank=True, related_name="access_groups", to="access.Interlock"
+                    ),
+                ),
+                (
+                    "members",
+                    models.ManyToManyField(
+                        blank=True, related_name="access_groups", to="profile.Profile"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Access Group",
+                "verbose_name_plural": "Access Groups",
+            },
+            bases=(
+                django_prometheus.models.ExportModelOperationsMixin("access-group"),
+                models.Model,
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("access", "0021_accessgroup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="doorlog",
+            index=models.Index(fields=["user", "date"], name="doorlog_user_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="doorlog",
+            index=models.Index(fields=["door", "date"], name="doorlog_door_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="interlocklog",
+            index=models.Index(
+                fields=["interlock", "date_ended"], name="interlocklog_ended_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="interlocklog",
+            index=models.Index(
+                fields=["user_started", "date_started"], name="interlocklog_started_idx"
+            ),
+        ),
+    ]
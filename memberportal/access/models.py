@@ -10,9 +10,11 @@ from services.slack import (
     post_interlock_swipe_to_slack,
 )
 from services import sms
-from profile.models import Profile, log_event
+from profile.models import Profile, log_event, invalidate_access_permissions
 from memberbucks.models import MemberBucks
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_save, pre_delete
 from datetime import timedelta
 from django.utils import timezone
 import pytz
@@ -246,32 +248,74 @@ class AccessControlledDevice(
                     "admin",
                 )
 
+    def set_all_members_access(self, access):
+        """
+        Grants every member access to this device (or revokes it from every
+        member) with bulk inserts or one delete on the member access table.
+        """
+        field = Profile._meta.get_field(self._get_member_access_field())
+        through = field.remote_field.through
+        device_field = field.m2m_reverse_field_name()
+
+        if access:
+            member_ids = Profile.objects.exclude(**{field.name: self}).values_list(
+                "id", flat=True
+            )
+            through.objects.bulk_create(
+                [
+                    through(profile_id=member_id, **{f"{device_field}_id": self.id})
+                    for member_id in member_ids
+                ],
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+        else:
+            through.objects.filter(**{device_field: self}).delete()
+
+        # bulk changes don't send m2m_changed
+        invalidate_access_permissions()
+
+    def _get_member_access_field(self):
+        return {"door": "doors", "interlock": "interlocks"}[self.type]
+
+    def get_members_filter(self):
+        """
+        Returns a Q for the profiles that can use this device, either directly
+        or through one of its access groups.
+        """
+        field = self._get_member_access_field()
+        return Q(**{field: self}) | Q(**{f"access_groups__{field}": self})
+
     def get_tags(self):
         # Find profiles that are active and have an RFID tag assigned to them
         ProfileQueryset = Profile.objects.filter(state="active").exclude(
             rfid__isnull=True
         )
-        authorised_tags = list()
 
         # Get the device object
-        if self.type == "door":
-            ProfileQueryset = ProfileQueryset.filter(doors__in=[self])
-        elif self.type == "interlock":
-            ProfileQueryset = ProfileQueryset.filter(interlocks__in=[self])
+        if self.type in ("door", "interlock"):
+            ProfileQueryset = ProfileQueryset.filter(self.get_members_filter())
         elif self.type == "memberbucks":
             pass
             # all profiles are authorised for memberbucks devices
         else:
             raise Exception("Unknown device type")
 
-        for profile in ProfileQueryset.all():
-            # If the site sign in feature is disabled, or the device is exempt
-            # from sign in, then all tags are authorised.
-            # Otherwise check if the member is signed in to the site
-            if config.ENABLE_PORTAL_SITE_SIGN_IN == False or (
-                self.exempt_signin is True or profile.is_signed_into_site()
-            ):
-                authorised_tags.append(profile.rfid)
+        # If the site sign in feature is disabled, or the device is exempt
+        # from sign in, then all tags are authorised.
+        # Otherwise only members signed in to the site are authorised
+        if (
+            config.ENABLE_PORTAL_SITE_SIGN_IN != False
+            and self.exempt_signin is not True
+        ):
+            ProfileQueryset = ProfileQueryset.filter(
+                user__sitesession__isnull=False,
+                user__sitesession__signout_date__isnull=True,
+            )
+
+        authorised_tags = list(
+            ProfileQueryset.order_by("id").values_list("rfid", flat=True).distinct()
+        )
 
         return (
             authorised_tags,
@@ -476,6 +520,12 @@ class Interlock(ExportModelOperationsMixin("interlock"), AccessControlledDevice)
 
 
 class DoorLog(ExportModelOperationsMixin("door-log"), models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "date"], name="doorlog_user_date_idx"),
+            models.Index(fields=["door", "date"], name="doorlog_door_date_idx"),
+        ]
+
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     door = models.ForeignKey(Doors, on_delete=models.CASCADE)
@@ -487,6 +537,16 @@ class DoorLog(ExportModelOperationsMixin("door-log"), models.Model):
 
 
 class InterlockLog(ExportModelOperationsMixin("interlock-log"), models.Model):
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["interlock", "date_ended"], name="interlocklog_ended_idx"
+            ),
+            models.Index(
+                fields=["user_started", "date_started"], name="interlocklog_started_idx"
+            ),
+        ]
+
     id = models.UUIDField(default=uuid.uuid4, primary_key=True)
     interlock = models.ForeignKey(Interlock, on_delete=models.CASCADE)
     user_started = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -565,3 +625,96 @@ class InterlockLog(ExportModelOperationsMixin("interlock-log"), models.Model):
             )
 
             return True
+
+
+class AccessGroup(ExportModelOperationsMixin("access-group"), models.Model):
+    """
+    A role (eg. "Woodshop inducted") that gives its members access to a set
+    of doors and interlocks. Default access for every member isn't a group, it
+    stays a row per member (see set_all_members_access) so it can be revoked
+    from one member.
+    """
+
+    id = models.AutoField(primary_key=True)
+    name = models.CharField("Name", max_length=100, unique=True)
+    description = models.CharField("Description", max_length=250, blank=True)
+    members = models.ManyToManyField(Profile, blank=True, related_name="access_groups")
+    doors = models.ManyToManyField(Doors, blank=True, related_name="access_groups")
+    interlocks = models.ManyToManyField(
+        Interlock, blank=True, related_name="access_groups"
+    )
+
+    class Meta:
+        verbose_name = "Access Group"
+        verbose_name_plural = "Access Groups"
+
+    def __str__(self):
+        return self.name
+
+    def get_devices(self):
+        return list(self.doors.all()) + list(self.interlocks.all())
+
+
+def sync_member_devices(member_ids):
+    """
+    Sends one sync to each door and interlock that any of the members (profile
+    ids) can use, instead of syncing every device for each member.
+    :return: the number of devices synced
+    """
+    groups = AccessGroup.objects.filter(members__id__in=member_ids)
+    members_filter = Q(profile__id__in=member_ids) | Q(access_groups__in=groups)
+
+    devices = list(Doors.objects.filter(members_filter).distinct()) + list(
+        Interlock.objects.filter(members_filter).distinct()
+    )
+
+    for device in devices:
+        device.sync()
+
+    return len(devices)
+
+
+def _sync_devices_on_commit(devices):
+    devices = {(device.type, device.id): device for device in devices}.values()
+    transaction.on_commit(lambda: [device.sync() for device in devices])
+
+
+def on_access_group_saved(sender, instance, **kwargs):
+    invalidate_access_permissions()
+    _sync_devices_on_commit(instance.get_devices())
+
+
+def on_access_group_changed(sender, instance, action, model, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    invalidate_access_permissions()
+
+    if isinstance(instance, AccessGroup):
+        devices = instance.get_devices()
+        if pk_set and model in (Doors, Interlock):
+            # devices removed from the group aren't in get_devices() any more
+            devices += list(model.objects.filter(pk__in=pk_set))
+
+    else:
+        # changed from the device or member side
+        groups = (
+            AccessGroup.objects.filter(pk__in=pk_set)
+            if pk_set
+            else instance.access_groups.all()
+        )
+        devices = [device for group in groups for device in group.get_devices()]
+        if isinstance(instance, AccessControlledDevice):
+            devices.append(instance)
+
+    _sync_devices_on_commit(devices)
+
+
+post_save.connect(on_access_group_saved, sender=AccessGroup)
+pre_delete.connect(on_access_group_saved, sender=AccessGroup)
+for through in (
+    AccessGroup.members.through,
+    AccessGroup.doors.through,
+    AccessGroup.interlocks.through,
+):
+    m2m_changed.connect(on_access_group_changed, sender=through)
@@ -327,10 +327,8 @@ class InterlockConsumer(AccessDeviceConsumer):
                         reason = "locked_out"
 
                     else:
-                        allowed_interlocks = profile.interlocks.all()
-
                         # user has access to this interlock
-                        if allowed_interlocks and self.device in allowed_interlocks:
+                        if profile.get_interlocks().filter(id=self.device.id).exists():
                             if (
                                 profile.is_signed_into_site()
                                 or self.device.exempt_signin is True
@@ -0,0 +1,261 @@
+"""
+Management command to benchmark the main REST endpoints.
+
+Each endpoint is requested through the Django test client (so no server is
+needed) as an admin or a busy member from the dataset, logged in with a session
+like the SPA. Its query count, wall time and peak Python memory are recorded,
+and the query count and memory are checked against the budgets in
+benchmarks/budgets.json. The cache is cleared before every request, so cached
+endpoints are measured cold. Exits non-zero if any endpoint goes over budget.
+
+Times depend on the machine, so they are only reported here. To check them,
+compare two revisions on the same machine with scripts/compare_benchmarks.py.
+
+The budgets are what each endpoint uses now, so any increase fails. Some
+have a known_issue note about why they are high, which --write-budgets keeps.
+
+The budgets are for the dataset made by:
+    python manage.py generate_dataset --members 2000 --seed 1
+The first active member (other than the busy one) is made an admin to
+benchmark the admin endpoints with, so don't point it at a real database.
+
+Usage:
+    python manage.py benchmark_endpoints
+    python manage.py benchmark_endpoints --repeat 10 --json results.json
+    python manage.py benchmark_endpoints --only GetMembers MemberLogs
+    python manage.py benchmark_endpoints --write-budgets
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.test import Client
+from profile.models import User
+import statistics
+import tracemalloc
+import json
+import os
+import time
+
+BUDGETS_FILE = os.path.join(settings.BASE_DIR, "benchmarks", "budgets.json")
+
+# (name, url, who the request is made as)
+ENDPOINTS = [
+    ("GetConfig", "/api/config/", None),
+    ("ProfileDetail", "/api/profile/", "member"),
+    ("UserAccessPermissions", "/api/access/permissions/", "member"),
+    ("Statistics", "/api/statistics/", "member"),
+    ("SwipesList", "/api/tools/swipes/", "member"),
+    ("GetMembers", "/api/admin/members/", "admin"),
+    ("MemberLogs", "/api/admin/members/{member_id}/logs/", "admin"),
+    ("AccessSystemStatus", "/api/access/status/", "admin"),
+    ("Doors", "/api/admin/doors/", "admin"),
+    ("Interlocks", "/api/admin/interlocks/", "admin"),
+    ("MemberbucksDevices", "/api/admin/memberbucks-devices/", "admin"),
+]
+
+# headroom given to the measured memory by --write-budgets (query counts
+# are exact, memory varies a little between Python versions)
+MEMORY_HEADROOM = 2
+
+
+def get_members():
+    # the generated members, who all have the same password
+    return User.objects.filter(email__endswith="@example.com", profile__state="active")
+
+
+def get_member():
+    """Returns the active member with the most door swipes."""
+    member = (
+        get_members()
+        .annotate(swipes=Count("doorlog"))
+        .order_by("-swipes", "id")
+        .first()
+    )
+    if member is None:
+        raise CommandError(
+            "There are no active members to benchmark with, run generate_dataset first."
+        )
+
+    return member
+
+
+def get_admin(member):
+    """Returns the first active member other than `member`, made an admin."""
+    admin = get_members().exclude(id=member.id).order_by("id").first()
+    if admin is None:
+        raise CommandError(
+            "There are not enough active members to benchmark with, run generate_dataset first."
+        )
+
+    if not (admin.staff and admin.admin):
+        admin.staff = admin.admin = True
+        admin.save()
+
+    return admin
+
+
+def login(user, password):
+    """Returns a test client with a session logged in as `user`."""
+    client = Client()
+    if not client.login(username=user.email, password=password):
+        raise CommandError(
+            f"Couldn't log in as {user.email}, is --password the one given to generate_dataset?"
+        )
+
+    return client
+
+
+def measure(client, url, repeat):
+    """Requests a url `repeat` times (plus a warm up) and returns its stats."""
+    cache.clear()
+    response = client.get(url)
+
+    times = []
+    for _ in range(repeat):
+        cache.clear()
+        started = time.perf_counter()
+        client.get(url)
+        times.append((time.perf_counter() - started) * 1000)
+
+    # with DEBUG on the query log is capped, so a full log would count as 0
+    cache.clear()
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        client.get(url)
+
+    cache.clear()
+    tracemalloc.start()
+    client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "status": response.status_code,
+        "queries": len(queries),
+        "time_ms": round(statistics.median(times), 1),
+        "max_time_ms": round(max(times), 1),
+        "memory_kb": round(peak / 1024),
+    }
+
+
+def check_budget(result, budget):
+    """Returns a list of the ways a result is over its budget."""
+    over = []
+    for key in ("queries", "memory_kb"):
+        if key in budget and result[key] > budget[key]:
+            over.append(f"{key} {result[key]} > {budget[key]}")
+
+    return over
+
+
+class Command(BaseCommand):
+    help = "Benchmark the main REST endpoints against their query and memory budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Timed requests per endpoint"
+        )
+        parser.add_argument(
+            "--only", nargs="+", help="Only benchmark these endpoints (by name)"
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="The members' password (see generate_dataset --password)",
+        )
+        parser.add_argument("--json", help="Also save the results to this file")
+        parser.add_argument("--budgets", default=BUDGETS_FILE)
+        parser.add_argument(
+            "--write-budgets",
+            action="store_true",
+            help="Save the results (with some headroom) as the new budgets",
+        )
+
+    def handle(self, *args, **options):
+        member = get_member()
+        clients = {
+            None: Client(),
+            "member": login(member, options["password"]),
+            "admin": login(get_admin(member), options["password"]),
+        }
+
+        budgets = {}
+        if os.path.exists(options["budgets"]):
+            with open(options["budgets"]) as file:
+                budgets = json.load(file).get("endpoints", {})
+
+        results = {}
+        failed = []
+        self.stdout.write(
+            f"{'endpoint':<24}{'status':>7}{'queries':>9}{'time ms':>10}{'max ms':>9}{'mem kb':>9}"
+        )
+
+        for name, url, who in ENDPOINTS:
+            if options["only"] and name not in options["only"]:
+                continue
+
+            result = measure(
+                clients[who], url.format(member_id=member.id), options["repeat"]
+            )
+            results[name] = result
+            over = check_budget(result, budgets.get(name, {}))
+
+            line = (
+                f"{name:<24}{result['status']:>7}{result['queries']:>9}"
+                f"{result['time_ms']:>10}{result['max_time_ms']:>9}{result['memory_kb']:>9}"
+            )
+            if result["status"] >= 400:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"{line}  request failed"))
+            elif over:
+                failed.append(name)
+                self.stdout.write(
+                    self.style.ERROR(f"{line}  over budget: {', '.join(over)}")
+                )
+            else:
+                self.stdout.write(line)
+
+        if options["json"]:
+            with open(options["json"], "w") as file:
+                json.dump(
+                    {"member_id": member.id, "endpoints": results}, file, indent=2
+                )
+
+        if options["write_budgets"]:
+            self.write_budgets(options["budgets"], budgets, results)
+            return
+
+        if failed:
+            raise CommandError(
+                f"{len(failed)} endpoints failed or are over budget: {', '.join(failed)}"
+            )
+
+    def write_budgets(self, path, old_budgets, results):
+        budgets = dict(old_budgets)
+        for name, result in results.items():
+            budgets[name] = {
+                "queries": result["queries"],
+                "memory_kb": max(round(result["memory_kb"] * MEMORY_HEADROOM), 512),
+            }
+
+            known_issue = old_budgets.get(name, {}).get("known_issue")
+            if known_issue:
+                budgets[name]["known_issue"] = known_issue
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(
+                {
+                    "dataset": "python manage.py generate_dataset --members 2000 --seed 1",
+                    "endpoints": budgets,
+                },
+                file,
+                indent=2,
+            )
+            file.write("\n")
+
+        self.stdout.write(self.style.SUCCESS(f"Saved the budgets to {path}."))
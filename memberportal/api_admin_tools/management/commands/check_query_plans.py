@@ -0,0 +1,151 @@
+"""
+Management command to check that the hot log and session queries use indexes.
+
+Each query is run through EXPLAIN and the command fails if any of them scans a
+whole table. Query planners often prefer a full scan on small tables, so run
+it against a large database (see the generate_dataset command), and run
+ANALYZE first if the database has planner statistics.
+
+Usage:
+    python manage.py check_query_plans
+    python manage.py check_query_plans --strict --show-plans
+"""
+
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from access.models import DoorLog, InterlockLog
+from api_general.models import SiteSession
+from api_metrics.models import Metric
+from memberbucks.models import MemberBucks
+from profile.models import Log, UserEventLog
+import re
+
+
+def get_queries():
+    """Returns (name, queryset) for each query to check."""
+    # the plans don't depend on the values, so these don't need to exist
+    user_id = door_id = interlock_id = 1
+    month_ago = timezone.now() - timedelta(days=30)
+
+    return [
+        (
+            "member door swipes",
+            DoorLog.objects.filter(user_id=user_id).order_by("-date")[:500],
+        ),
+        (
+            "door swipes",
+            DoorLog.objects.filter(door_id=door_id).order_by("-date")[:500],
+        ),
+        (
+            "active interlock sessions",
+            InterlockLog.objects.filter(interlock_id=interlock_id, date_ended=None),
+        ),
+        (
+            "member interlock sessions",
+            InterlockLog.objects.filter(user_started_id=user_id).order_by(
+                "-date_started"
+            )[:1000],
+        ),
+        (
+            "member memberbucks transactions",
+            MemberBucks.objects.filter(user_id=user_id).order_by("-date")[:100],
+        ),
+        (
+            "member memberbucks balance",
+            MemberBucks.objects.filter(user_id=user_id)
+            .values("user_id")
+            .annotate(balance=Sum("amount")),
+        ),
+        (
+            "member event logs",
+            UserEventLog.objects.filter(user_id=user_id).order_by("-date")[:1000],
+        ),
+        (
+            "event logs to archive",
+            Log.objects.filter(date__lt=month_ago).order_by("date", "pk")[:1000],
+        ),
+        (
+            "member site session",
+            SiteSession.objects.filter(user_id=user_id, signout_date=None),
+        ),
+        (
+            "latest metric",
+            Metric.objects.filter(name=Metric.MetricName.MEMBER_COUNT_TOTAL).order_by(
+                "-creation_date"
+            )[:1],
+        ),
+        (
+            "metric history",
+            Metric.objects.filter(
+                name=Metric.MetricName.MEMBER_COUNT_TOTAL,
+                creation_date__gte=month_ago,
+            ).order_by("creation_date"),
+        ),
+    ]
+
+
+def check_plan(plan):
+    """
+    Looks for full table scans and sorts that can't use an index in a plan.
+    :return: (full scans, sorts)
+    """
+    if connection.vendor == "sqlite":
+        lines = plan.splitlines()
+        scans = [
+            line
+            for line in lines
+            if re.search(r"\bSCAN\b", line) and "USING" not in line
+        ]
+        sorts = [line for line in lines if "TEMP B-TREE" in line]
+
+    elif connection.vendor == "mysql":
+        scans = re.findall(r'"table_name": "(\w+)",\s*"access_type": "ALL"', plan)
+        sorts = re.findall(r'"using_filesort": true', plan)
+
+    else:
+        scans = re.findall(r"Seq Scan on \w+", plan)
+        sorts = re.findall(r"Sort Key: .+", plan)
+
+    return scans, sorts
+
+
+class Command(BaseCommand):
+    help = "Check that the hot queries use indexes (fails on full table scans)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Also fail if a query has to sort its results without an index",
+        )
+        parser.add_argument(
+            "--show-plans", action="store_true", help="Show every query plan"
+        )
+
+    def handle(self, *args, **options):
+        explain_options = {"format": "json"} if connection.vendor == "mysql" else {}
+        failed = []
+
+        for name, queryset in get_queries():
+            plan = queryset.explain(**explain_options)
+            scans, sorts = check_plan(plan)
+
+            if scans or (sorts and options["strict"]):
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"FAIL {name}"))
+            elif sorts:
+                self.stdout.write(self.style.WARNING(f"SORT {name}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK   {name}"))
+
+            if scans or sorts or options["show_plans"]:
+                for line in plan.splitlines():
+                    self.stdout.write(f"       {line}")
+
+        if failed:
+            raise CommandError(
+                f"{len(failed)} queries don't use an index: {', '.join(failed)}"
+            )
@@ -0,0 +1,350 @@
+"""
+Management command to load test a running server with mixed member traffic.
+
+Each simulated user repeatedly picks a weighted journey (booting the SPA,
+looking at their dashboard, signing in at a kiosk or browsing the admin
+pages), makes its requests over HTTP like the frontend does, and waits a
+little before the next one. The throughput and latency percentiles of each
+endpoint are reported at the end.
+
+The members made by generate_dataset (and their cards) are read from the
+database the server uses. An authorised "Load test" kiosk is created, and the
+first of them is made an admin for the admin journey.
+Kiosk sign-ins create site sessions, so don't point it at a real database.
+
+Start the server with Stripe, Postmark and Twilio stubbed out first, eg:
+    python manage.py run_fake_postmark --port 8025 &
+    stripe-mock -http-port 12111 &
+    export MM_SMS_BACKEND=fake MM_POSTMARK_API_URL=http://127.0.0.1:8025/
+    export MM_STRIPE_API_BASE=http://127.0.0.1:12111
+    daphne -b 127.0.0.1 -p 8001 membermatters.asgi:application
+
+Usage:
+    python manage.py run_load_test --host http://127.0.0.1:8001
+    python manage.py run_load_test --users 50 --duration 120 --ramp-up 30
+    python manage.py run_load_test --journeys spa_boot kiosk_sign_in --json results.json
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from api_general.models import Kiosk
+from profile.models import User
+from requests.adapters import HTTPAdapter
+import threading
+import requests
+import random
+import json
+import time
+
+KIOSK_ID = "load-test"
+
+
+class Stats:
+    """Collects the latency of every request by endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.failures = {}
+
+    def record(self, name, seconds, failed):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds * 1000)
+            if failed:
+                self.failures[name] = self.failures.get(name, 0) + 1
+
+    def summary(self, duration):
+        results = {}
+        for name, latencies in sorted(self.latencies.items()):
+            results[name] = summarise(latencies, self.failures.get(name, 0), duration)
+
+        everything = [ms for latencies in self.latencies.values() for ms in latencies]
+        if everything:
+            results["Total"] = summarise(
+                everything, sum(self.failures.values()), duration
+            )
+
+        return results
+
+
+def percentile(ordered, percent):
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+def summarise(latencies, failures, duration):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "failures": failures,
+        "rps": round(len(ordered) / duration, 2),
+        "p50_ms": round(percentile(ordered, 50)),
+        "p95_ms": round(percentile(ordered, 95)),
+        "p99_ms": round(percentile(ordered, 99)),
+        "max_ms": round(ordered[-1]),
+    }
+
+
+class SimulatedUser:
+    """A member (or admin) using the portal from their own browser session."""
+
+    def __init__(self, host, stats, member, password, timeout):
+        self.host = host.rstrip("/")
+        self.stats = stats
+        self.member = member
+        self.password = password
+        self.timeout = timeout
+        self.new_session()
+
+    def new_session(self):
+        self.session = requests.Session()
+        self.session.mount(self.host, HTTPAdapter(pool_maxsize=1))
+        self.logged_in = False
+
+    def request(self, method, url, name=None, expected=(), **kwargs):
+        headers = {}
+        if method != "GET" and "csrftoken" in self.session.cookies:
+            # session authenticated requests need the CSRF token like the SPA
+            headers["X-CSRFToken"] = self.session.cookies["csrftoken"]
+
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                self.host + url,
+                headers=headers,
+                timeout=self.timeout,
+                **kwargs,
+            )
+            failed = response.status_code >= 400
+            failed = failed and response.status_code not in expected
+        except requests.RequestException:
+            response = None
+            failed = True
+
+        self.stats.record(
+            f"{method} {name or url}", time.perf_counter() - started, failed
+        )
+        return response
+
+    def login(self):
+        if not self.logged_in:
+            response = self.request(
+                "POST",
+                "/api/login/",
+                json={"email": self.member["email"], "password": self.password},
+            )
+            self.logged_in = response is not None and response.ok
+
+
+def spa_boot(user, context):
+    """A member opens the portal in a new browser and logs in."""
+    user.new_session()
+    user.request("GET", "/api/config/")
+    user.request("GET", "/api/loggedin/", expected=(401,))
+    user.login()
+    user.request("GET", "/api/config/")
+    user.request("GET", "/api/profile/")
+    user.request("GET", "/api/access/permissions/")
+
+
+def member_dashboard(user, context):
+    """A logged in member looks around their dashboard."""
+    user.login()
+    user.request("GET", "/api/profile/")
+    user.request("GET", "/api/access/permissions/")
+    user.request("GET", "/api/sitesessions/check/")
+    user.request("GET", "/api/memberbucks/balance/")
+    user.request("GET", "/api/memberbucks/transactions/")
+    user.request("GET", "/api/statistics/")
+
+
+def kiosk_sign_in(user, context):
+    """A member swipes their card at the kiosk, signs in to the space and out."""
+    user.new_session()
+    user.request("GET", "/api/config/")
+    response = user.request(
+        "POST",
+        "/api/login/kiosk/",
+        json={"cardId": user.member["rfid"], "kioskId": KIOSK_ID},
+    )
+    if response is None or not response.ok:
+        return
+
+    user.request("GET", "/api/profile/")
+    user.request("GET", "/api/sitesessions/check/")
+    user.request("POST", "/api/sitesessions/signin/", json={"guests": []})
+    user.request("PUT", "/api/sitesessions/signout/")
+    user.request("POST", "/api/logout/")
+
+
+def admin_browsing(user, context):
+    """An admin looks through the member list, a member and the devices."""
+    admin = SimulatedUser(
+        user.host, user.stats, context["admin"], user.password, user.timeout
+    )
+    admin.login()
+    admin.request("GET", "/api/admin/members/")
+
+    member_id = random.choice(context["members"])["id"]
+    admin.request(
+        "GET",
+        f"/api/admin/members/{member_id}/access/",
+        name="/api/admin/members/{id}/access/",
+    )
+    admin.request(
+        "GET",
+        f"/api/admin/members/{member_id}/billing/",
+        name="/api/admin/members/{id}/billing/",
+    )
+    admin.request(
+        "GET",
+        f"/api/admin/members/{member_id}/logs/",
+        name="/api/admin/members/{id}/logs/",
+    )
+    admin.request("GET", "/api/access/status/")
+    admin.request("GET", "/api/admin/doors/")
+    admin.request("GET", "/api/admin/interlocks/")
+
+
+# name: (journey, weight)
+JOURNEYS = {
+    "spa_boot": (spa_boot, 3),
+    "member_dashboard": (member_dashboard, 5),
+    "kiosk_sign_in": (kiosk_sign_in, 2),
+    "admin_browsing": (admin_browsing, 1),
+}
+
+
+class Command(BaseCommand):
+    help = "Load test a running server with weighted member journeys"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="http://127.0.0.1:8001")
+        parser.add_argument(
+            "--users", type=int, default=10, help="Number of simulated users"
+        )
+        parser.add_argument(
+            "--duration", type=int, default=60, help="How long to run for (seconds)"
+        )
+        parser.add_argument(
+            "--ramp-up",
+            type=int,
+            default=10,
+            help="Seconds over which the users are started",
+        )
+        parser.add_argument(
+            "--wait",
+            type=float,
+            nargs=2,
+            default=[1, 5],
+            metavar=("MIN", "MAX"),
+            help="Seconds each user waits between journeys",
+        )
+        parser.add_argument(
+            "--journeys",
+            nargs="+",
+            choices=list(JOURNEYS),
+            default=list(JOURNEYS),
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="The members' password (see generate_dataset --password)",
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--seed", type=int)
+        parser.add_argument("--json", help="Also save the results to this file")
+
+    def handle(self, *args, **options):
+        if options["seed"] is not None:
+            random.seed(options["seed"])
+
+        context = self.setup()
+        journeys = [JOURNEYS[name] for name in options["journeys"]]
+        stats = Stats()
+
+        self.stdout.write(
+            f"Running {options['users']} users for {options['duration']}s against {options['host']}..."
+        )
+        started = time.monotonic()
+        deadline = started + options["duration"]
+
+        threads = []
+        for number in range(options["users"]):
+            user = SimulatedUser(
+                options["host"],
+                stats,
+                random.choice(context["members"]),
+                options["password"],
+                options["timeout"],
+            )
+            delay = options["ramp_up"] * number / options["users"]
+            thread = threading.Thread(
+                target=self.run_user,
+                args=(user, context, journeys, started + delay, deadline, options),
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        results = stats.summary(time.monotonic() - started)
+        self.report(results)
+
+        if options["json"]:
+            with open(options["json"], "w") as file:
+                json.dump(results, file, indent=2)
+
+    def setup(self):
+        members = list(
+            User.objects.filter(
+                # the generated members, who all have the same password
+                email__endswith="@example.com",
+                profile__state="active",
+                email_verified=True,
+                profile__rfid__isnull=False,
+            )
+            .order_by("id")
+            .values("id", "email", rfid=F("profile__rfid"))
+        )
+        if not members:
+            raise CommandError(
+                "There are no active members to load test with, run generate_dataset first."
+            )
+
+        admin = User.objects.get(id=members[0]["id"])
+        if not (admin.staff and admin.admin):
+            admin.staff = admin.admin = True
+            admin.save()
+
+        Kiosk.objects.update_or_create(
+            kiosk_id=KIOSK_ID, defaults={"name": "Load test", "authorised": True}
+        )
+
+        return {"members": members, "admin": members[0]}
+
+    def run_user(self, user, context, journeys, start, deadline, options):
+        time.sleep(max(start - time.monotonic(), 0))
+        functions, weights = zip(*journeys)
+
+        while time.monotonic() < deadline:
+            journey = random.choices(functions, weights)[0]
+            journey(user, context)
+            time.sleep(random.uniform(*options["wait"]))
+
+    def report(self, results):
+        self.stdout.write(
+            f"\n{'endpoint':<44}{'reqs':>7}{'fails':>7}{'req/s':>8}"
+            f"{'p50':>7}{'p95':>7}{'p99':>7}{'max':>7}  (ms)"
+        )
+        for name, result in results.items():
+            line = (
+                f"{name:<44}{result['requests']:>7}{result['failures']:>7}"
+                f"{result['rps']:>8}{result['p50_ms']:>7}{result['p95_ms']:>7}"
+                f"{result['p99_ms']:>7}{result['max_ms']:>7}"
+            )
+            if name == "Total":
+                self.stdout.write("")
+            self.stdout.write(self.style.ERROR(line) if result["failures"] else line)
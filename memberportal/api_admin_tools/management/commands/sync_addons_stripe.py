@@ -1,5 +1,16 @@
+"""
+Syncs subscription add-ons with their Stripe products and prices.
+
+Stripe is read once with auto-paged list calls and diffed against the
+add-ons, so only the changes that are needed are made. Use --dry-run to see
+the diff without changing anything, and --api-base to run against stripe-mock.
+"""
+
+from constance import config
 from django.core.management.base import BaseCommand
+from api_admin_tools import stripe_sync
 from api_admin_tools.models import SubscriptionAddon
+import stripe
 
 
 class Command(BaseCommand):
@@ -27,73 +38,89 @@ class Command(BaseCommand):
             action="store_true",
             help="Detect and clean up duplicate Stripe products",
         )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show what would change without changing anything",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=stripe_sync.DEFAULT_WORKERS,
+            help="Number of concurrent Stripe requests",
+        )
+        parser.add_argument(
+            "--api-base",
+            help="Stripe API base URL (eg. http://localhost:12111 for stripe-mock)",
+        )
 
     def handle(self, *args, **options):
+        if not config.ENABLE_STRIPE:
+            self.stdout.write(self.style.ERROR("Stripe is not enabled"))
+            return
+
+        workers = max(1, options["workers"])
+        stripe_sync.configure_stripe(workers, options["api_base"])
+
+        try:
+            products = stripe_sync.list_products()
+            prices = stripe_sync.list_prices_by_product()
+        except stripe.error.StripeError as e:
+            self.stdout.write(self.style.ERROR(f"Stripe error: {str(e)}"))
+            return
+
         if options["cleanup_duplicates"]:
-            self.cleanup_duplicate_stripe_products()
+            self.cleanup_duplicate_stripe_products(
+                products, prices, workers, options["dry_run"]
+            )
             return
 
+        addons = SubscriptionAddon.objects.order_by("id")
         if options["addon_ids"]:
-            addons = SubscriptionAddon.objects.filter(id__in=options["addon_ids"])
-        else:
-            addons = SubscriptionAddon.objects.all()
+            addons = addons.filter(id__in=options["addon_ids"])
+
+        plans = stripe_sync.plan_sync(
+            addons,
+            products,
+            prices,
+            create_only=options["create_only"],
+            update_only=options["update_only"],
+        )
+        self.stdout.write(
+            f"Found {len(plans)} add-on(s) and {len(products)} active Stripe product(s)"
+        )
 
-        self.stdout.write(f"Syncing {addons.count()} add-on(s) with Stripe...")
+        if options["dry_run"]:
+            self.report_plans(plans)
+            return
 
+        synced = stripe_sync.apply_sync(plans, workers)
         success_count = 0
-        error_count = 0
         error_messages = []
 
-        for addon in addons:
-            try:
-                if options["create_only"] and addon.stripe_product_id:
-                    self.stdout.write(
-                        f"Skipping {addon.name} (already has Stripe product)"
-                    )
-                    continue
-
-                if options["update_only"] and not addon.stripe_product_id:
-                    self.stdout.write(
-                        f"Skipping {addon.name} (no Stripe product to update)"
-                    )
-                    continue
-
-                if addon.stripe_product_id:
-                    # Update existing
-                    success, message = addon.update_stripe_price()
-                    action = "Updated"
-                else:
-                    # Create new
-                    success, message = addon.create_stripe_product_and_price()
-                    action = "Created"
-
-                if success:
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"✓ {action} Stripe objects for '{addon.name}'"
-                        )
-                    )
-                    success_count += 1
-                else:
-                    self.stdout.write(
-                        self.style.ERROR(f"✗ Failed to sync '{addon.name}': {message}")
+        for plan in synced:
+            if plan.error:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"✗ Failed to sync '{plan.addon.name}': {plan.error}"
                     )
-                    error_count += 1
-                    error_messages.append(f"{addon.name}: {message}")
-
-            except Exception as e:
+                )
+                error_messages.append(f"{plan.addon.name}: {plan.error}")
+            else:
                 self.stdout.write(
-                    self.style.ERROR(f"✗ Error syncing '{addon.name}': {str(e)}")
+                    self.style.SUCCESS(
+                        f"✓ {', '.join(plan.actions).capitalize()} for '{plan.addon.name}'"
+                    )
                 )
-                error_count += 1
-                error_messages.append(f"{addon.name}: {str(e)}")
+                success_count += 1
 
         # Summary
         self.stdout.write("\n" + "=" * 50)
         self.stdout.write("SYNC SUMMARY")
         self.stdout.write("=" * 50)
         self.stdout.write(f"Successfully synced: {success_count}")
-        self.stdout.write(f"Failed: {error_count}")
+        self.stdout.write(f"Already in sync: {len(plans) - len(synced)}")
+        self.stdout.write(f"Failed: {len(error_messages)}")
 
         if error_messages:
             self.stdout.write("\nErrors:")
@@ -105,75 +132,56 @@ class Command(BaseCommand):
                 self.style.SUCCESS(f"\n✓ Successfully synced {success_count} add-on(s)")
             )
 
-    def cleanup_duplicate_stripe_products(self):
+    def report_plans(self, plans):
+        self.stdout.write("\nDRY RUN - no changes will be made\n")
+
+        for plan in plans:
+            actions = ", ".join(plan.actions)
+            changes = f" ({'; '.join(plan.changes)})" if plan.changes else ""
+            self.stdout.write(
+                f"  {plan.addon.name} [{plan.addon.id}]: {actions}{changes}"
+            )
+
+        self.stdout.write(
+            f"\n{sum(plan.needs_sync for plan in plans)} of {len(plans)} add-on(s) would be synced"
+        )
+
+    def cleanup_duplicate_stripe_products(self, products, prices, workers, dry_run):
         """Detect and clean up duplicate Stripe products"""
-        import stripe
-        from constance import config
+        self.stdout.write("Scanning for duplicate Stripe products...")
 
-        if not config.ENABLE_STRIPE:
-            self.stdout.write(self.style.ERROR("Stripe is not enabled"))
+        duplicates = stripe_sync.find_duplicate_products(products)
+        if not duplicates:
+            self.stdout.write(self.style.SUCCESS("✓ No duplicate products found"))
             return
 
-        try:
-            stripe.api_key = config.STRIPE_SECRET_KEY
-
-            self.stdout.write("Scanning for duplicate Stripe products...")
-
-            # Get all products
-            products = stripe.Product.list(limit=100, active=True)
-
-            # Group products by name and addon type
-            product_groups = {}
-            for product in products.data:
-                addon_type = product.metadata.get("addon_type", "unknown")
-                key = f"{product.name}_{addon_type}"
-
-                if key not in product_groups:
-                    product_groups[key] = []
-                product_groups[key].append(product)
-
-            # Find duplicates
-            duplicates_found = 0
-            for key, product_list in product_groups.items():
-                if len(product_list) > 1:
-                    duplicates_found += 1
-                    self.stdout.write(
-                        f"\nFound {len(product_list)} products for '{key}':"
-                    )
+        # Keep the oldest product in each group, archive the rest
+        to_archive = []
+        for key, product_list in duplicates.items():
+            self.stdout.write(f"\nFound {len(product_list)} products for '{key}':")
+            for product in product_list[1:]:
+                self.stdout.write(f"  - {product.id} (created: {product.created})")
+                to_archive.append(product)
 
-                    # Sort by creation date (keep the oldest)
-                    product_list.sort(key=lambda p: p.created)
-
-                    # Keep the first one, archive the rest
-                    for i, product in enumerate(product_list[1:], 1):
-                        try:
-                            # Archive the product
-                            stripe.Product.modify(product.id, active=False)
-                            self.stdout.write(
-                                f"  ✓ Archived duplicate product: {product.id}"
-                            )
-
-                            # Archive associated prices
-                            prices = stripe.Price.list(product=product.id, active=True)
-                            for price in prices.data:
-                                stripe.Price.modify(price.id, active=False)
-                                self.stdout.write(f"    ✓ Archived price: {price.id}")
-
-                        except stripe.error.StripeError as e:
-                            self.stdout.write(
-                                f"  ✗ Failed to archive {product.id}: {str(e)}"
-                            )
-
-            if duplicates_found == 0:
-                self.stdout.write(self.style.SUCCESS("✓ No duplicate products found"))
-            else:
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"\n✓ Cleaned up {duplicates_found} duplicate product groups"
-                    )
-                )
+        if dry_run:
+            self.stdout.write(
+                f"\nDRY RUN - would archive {len(to_archive)} duplicate product(s)"
+            )
+            return
 
-        except stripe.error.StripeError as e:
-            self.stdout.write(self.style.ERROR(f"Stripe error: {str(e)}"))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
+        for product, archived_prices, error in stripe_sync.archive_products(
+            to_archive, prices, workers
+        ):
+            if error:
+                self.stdout.write(f"  ✗ Failed to archive {product.id}: {error}")
+                continue
+
+            self.stdout.write(f"  ✓ Archived duplicate product: {product.id}")
+            for price_id in archived_prices:
+                self.stdout.write(f"    ✓ Archived price: {price_id}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n✓ Cleaned up {len(duplicates)} duplicate product groups"
+            )
+        )
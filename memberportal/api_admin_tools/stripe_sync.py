@@ -0,0 +1,342 @@
+"""
+Syncs subscription add-ons with their Stripe products and prices.
+
+Everything in Stripe is read up front (two auto-paged list calls), diffed
+against the add-ons locally, and only the changes that are actually needed
+are sent to Stripe. Those calls run on a small thread pool sharing one pooled
+HTTP client, and the results are saved back to the database in bulk from the
+calling thread.
+
+Point `api_base` at stripe-mock (eg. http://localhost:12111) to try a sync
+without touching a real Stripe account.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from constance import config
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from api_admin_tools.models import SubscriptionAddon
+import requests
+import stripe
+import logging
+
+logger = logging.getLogger("stripe_sync")
+
+DEFAULT_WORKERS = 4
+
+# the sync actions, in the order they're reported
+CREATE = "create"
+LINK = "link"
+UPDATE_PRODUCT = "update product"
+REPLACE_PRICE = "replace price"
+UNCHANGED = "unchanged"
+SKIPPED = "skipped"
+
+
+@dataclass
+class AddonSync:
+    """The changes needed to bring one add-on in sync with Stripe."""
+
+    addon: SubscriptionAddon
+    actions: list = field(default_factory=list)
+    changes: list = field(default_factory=list)
+    product_id: str = ""
+    price_id: str = ""
+    error: str = ""
+
+    @property
+    def needs_sync(self):
+        return any(action not in (UNCHANGED, SKIPPED) for action in self.actions)
+
+
+def configure_stripe(workers=DEFAULT_WORKERS, api_base=None):
+    """
+    Sets up the Stripe client to share one pooled HTTP session between the
+    worker threads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    stripe.api_key = config.STRIPE_SECRET_KEY
+    stripe.default_http_client = stripe.RequestsClient(session=session)
+    stripe.max_network_retries = 2
+
+    if api_base:
+        stripe.api_base = api_base
+
+
+def list_products():
+    """Returns every active Stripe product."""
+    return list(stripe.Product.list(limit=100, active=True).auto_paging_iter())
+
+
+def list_prices_by_product():
+    """Returns every active Stripe price, grouped by product id."""
+    prices = defaultdict(list)
+    for price in stripe.Price.list(limit=100, active=True).auto_paging_iter():
+        product = price.product
+        prices[product if isinstance(product, str) else product.id].append(price)
+
+    return prices
+
+
+def _product_fields(addon):
+    return {
+        "name": addon.name,
+        "description": addon.description,
+        "metadata": {"addon_type": addon.addon_type, "django_id": str(addon.id)},
+    }
+
+
+def _price_fields(addon):
+    return {
+        "unit_amount": addon.cost,
+        "currency": addon.currency.lower(),
+        "recurring": {
+            "interval": addon.interval,
+            "interval_count": addon.interval_count,
+        },
+        "metadata": {"addon_type": addon.addon_type, "django_id": str(addon.id)},
+    }
+
+
+def _product_changes(addon, product):
+    changes = []
+    if product.get("name") != addon.name:
+        changes.append(f"name '{product.get('name')}' -> '{addon.name}'")
+    if (product.get("description") or "") != (addon.description or ""):
+        changes.append("description")
+
+    metadata = product.get("metadata") or {}
+    if metadata.get("addon_type") != addon.addon_type or metadata.get(
+        "django_id"
+    ) != str(addon.id):
+        changes.append("metadata")
+
+    return changes
+
+
+def _price_changes(addon, price):
+    if price is None:
+        return ["no active price"]
+
+    changes = []
+    recurring = price.get("recurring") or {}
+    if price.get("unit_amount") != addon.cost:
+        changes.append(f"cost {price.get('unit_amount')} -> {addon.cost}")
+    if (price.get("currency") or "") != addon.currency.lower():
+        changes.append(f"currency {price.get('currency')} -> {addon.currency}")
+    if (
+        recurring.get("interval") != addon.interval
+        or recurring.get("interval_count") != addon.interval_count
+    ):
+        changes.append(
+            f"interval {recurring.get('interval_count')} {recurring.get('interval')}"
+            f" -> {addon.interval_count} {addon.interval}"
+        )
+
+    return changes
+
+
+def plan_sync(
+    addons, products, prices_by_product, create_only=False, update_only=False
+):
+    """
+    Diffs the add-ons against what's in Stripe.
+    :return: a list of AddonSync, one per add-on
+    """
+    products_by_id = {product.id: product for product in products}
+    products_by_addon = {}
+    for product in sorted(products, key=lambda p: p.created):
+        django_id = (product.get("metadata") or {}).get("django_id")
+        if django_id:
+            products_by_addon.setdefault(django_id, product)
+
+    plans = []
+    for addon in addons:
+        plan = AddonSync(
+            addon=addon,
+            product_id=addon.stripe_product_id,
+            price_id=addon.stripe_price_id,
+        )
+        plans.append(plan)
+
+        if create_only and addon.stripe_product_id:
+            plan.actions.append(SKIPPED)
+            plan.changes.append("already has a Stripe product")
+            continue
+
+        if update_only and not addon.stripe_product_id:
+            plan.actions.append(SKIPPED)
+            plan.changes.append("no Stripe product to update")
+            continue
+
+        product = products_by_id.get(addon.stripe_product_id)
+        if product is None:
+            # reuse a product that was created for this add-on but never saved
+            # against it, instead of creating a duplicate
+            product = products_by_addon.get(str(addon.id))
+            if product is None:
+                plan.actions.append(CREATE)
+                plan.changes.append("no active Stripe product")
+                continue
+
+            plan.actions.append(LINK)
+            plan.changes.append(f"found existing product {product.id}")
+            plan.product_id = product.id
+
+        product_changes = _product_changes(addon, product)
+        if product_changes:
+            plan.actions.append(UPDATE_PRODUCT)
+            plan.changes.extend(product_changes)
+
+        product_prices = prices_by_product.get(product.id, [])
+        price = next((p for p in product_prices if p.id == addon.stripe_price_id), None)
+        if price is None and LINK in plan.actions:
+            # pick up a matching price that's already on the linked product
+            price = next(
+                (p for p in product_prices if not _price_changes(addon, p)), None
+            )
+            if price is not None:
+                plan.price_id = price.id
+
+        price_changes = _price_changes(addon, price)
+        if price_changes:
+            plan.actions.append(REPLACE_PRICE)
+            plan.changes.extend(price_changes)
+
+        if not plan.actions:
+            plan.actions.append(UNCHANGED)
+
+    return plans
+
+
+def _apply(plan):
+    """Makes the Stripe calls for one add-on. Runs on a worker thread."""
+    addon = plan.addon
+
+    try:
+        if CREATE in plan.actions:
+            product = stripe.Product.create(**_product_fields(addon))
+            plan.product_id = product.id
+            price = stripe.Price.create(product=product.id, **_price_fields(addon))
+            plan.price_id = price.id
+            return plan
+
+        if UPDATE_PRODUCT in plan.actions:
+            stripe.Product.modify(plan.product_id, **_product_fields(addon))
+
+        if REPLACE_PRICE in plan.actions:
+            # Stripe doesn't allow modifying prices, so create a new one and
+            # archive the old one
+            price = stripe.Price.create(product=plan.product_id, **_price_fields(addon))
+            if plan.price_id:
+                try:
+                    stripe.Price.modify(plan.price_id, active=False)
+                except stripe.error.InvalidRequestError:
+                    pass  # the old price might not exist
+            plan.price_id = price.id
+
+    except stripe.error.StripeError as e:
+        plan.error = f"Stripe error: {str(e)}"
+    except Exception as e:
+        plan.error = f"Error: {str(e)}"
+
+    return plan
+
+
+def _run(function, items, workers):
+    if workers <= 1:
+        return [function(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, items))
+
+
+def apply_sync(plans, workers=DEFAULT_WORKERS):
+    """
+    Applies the planned changes to Stripe, then saves the new Stripe ids on
+    the add-ons with one bulk update.
+    """
+    to_sync = [plan for plan in plans if plan.needs_sync]
+    _run(_apply, to_sync, workers)
+
+    now = timezone.now()
+    synced = []
+    for plan in to_sync:
+        if plan.error:
+            logger.error(f"Failed to sync add-on {plan.addon.id}: {plan.error}")
+            continue
+
+        plan.addon.stripe_product_id = plan.product_id
+        plan.addon.stripe_price_id = plan.price_id
+        plan.addon.stripe_synced = True
+        plan.addon.last_stripe_sync = now
+        plan.addon.updated_at = now
+        synced.append(plan.addon)
+
+    SubscriptionAddon.objects.bulk_update(
+        synced,
+        [
+            "stripe_product_id",
+            "stripe_price_id",
+            "stripe_synced",
+            "last_stripe_sync",
+            "updated_at",
+        ],
+    )
+
+    return to_sync
+
+
+def find_duplicate_products(products):
+    """
+    Groups active Stripe products by name and addon type.
+    :return: {key: [products]}, oldest first, for each group with duplicates
+    """
+    groups = defaultdict(list)
+    for product in products:
+        addon_type = (product.get("metadata") or {}).get("addon_type", "unknown")
+        groups[f"{product.name}_{addon_type}"].append(product)
+
+    return {
+        key: sorted(group, key=lambda p: p.created)
+        for key, group in groups.items()
+        if len(group) > 1
+    }
+
+
+def find_orphaned_products(products):
+    """Returns the active Stripe products that no add-on refers to."""
+    addon_product_ids = set(
+        SubscriptionAddon.objects.exclude(stripe_product_id="").values_list(
+            "stripe_product_id", flat=True
+        )
+    )
+
+    return [product for product in products if product.id not in addon_product_ids]
+
+
+def archive_products(products, prices_by_product, workers=DEFAULT_WORKERS):
+    """
+    Archives Stripe products and their active prices.
+    :return: a list of (product, [archived price ids], error)
+    """
+
+    def archive(product):
+        archived = []
+        try:
+            stripe.Product.modify(product.id, active=False)
+            for price in prices_by_product.get(product.id, []):
+                stripe.Price.modify(price.id, active=False)
+                archived.append(price.id)
+        except stripe.error.StripeError as e:
+            return product, archived, str(e)
+
+        return product, archived, None
+
+    return _run(archive, products, workers)
@@ -5,6 +5,11 @@ from . import views
 
 urlpatterns = [
     path("api/admin/members/", views.GetMembers.as_view(), name="GetMembers"),
+    path(
+        "api/admin/members/state/",
+        views.MembersState.as_view(),
+        name="MembersState",
+    ),
     path(
         "api/admin/members/<int:member_id>/state/<str:state>/",
         views.MemberState.as_view(),
@@ -8,6 +8,7 @@ from constance.backends.database.models import Constance as ConstanceSetting
 from django.db.models import F, Sum, Value, CharField, Count, Max
 from django.db.models.functions import Concat
 from django.db.utils import OperationalError
+from django.utils import timezone
 from rest_framework import permissions
 from rest_framework import status
 from rest_framework.response import Response
@@ -23,7 +24,9 @@ from memberbucks.models import (
     MemberbucksProductPurchaseLog,
 )
 from profile.models import User, UserEventLog
+from profile import lifecycle
 from services import sms
+from api_billing import billing_groups, stripe_mirror
 from services.emails import send_email_to_admin
 from .models import MemberTier, PaymentPlan
 
@@ -89,6 +92,36 @@ class MemberState(APIView):
         return Response()
 
 
+class MembersState(APIView):
+    """
+    post: This method sets the state of many members at once.
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def post(self, request):
+        member_ids = request.data.get("members")
+        state = request.data.get("state")
+
+        if not isinstance(member_ids, list) or state not in lifecycle.STATES:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        result = lifecycle.set_members_state(
+            member_ids,
+            state,
+            requesting_user=request.user,
+            notify=request.data.get("notify", True),
+        )
+
+        return Response(
+            {
+                "updated": len(result["updated"]),
+                "unchanged": result["unchanged"],
+                "devicesSynced": result["devices_synced"],
+            }
+        )
+
+
 class MakeMember(APIView):
     """
     post: This activates a new member.
@@ -101,13 +134,8 @@ class MakeMember(APIView):
 
         # if they're a new member or account only
         if user.profile.state == "noob" or user.profile.state == "accountonly":
-            # give default door access
-            for door in models.Doors.objects.filter(all_members=True):
-                user.profile.doors.add(door)
-
-            # give default interlock access
-            for interlock in models.Interlock.objects.filter(all_members=True):
-                user.profile.interlocks.add(interlock)
+            # give default door and interlock access
+            user.profile.grant_default_access()
 
             # send the welcome email
             email = user.email_welcome()
@@ -244,15 +272,7 @@ class Doors(APIView):
             )
 
         if all_members_added or all_members_removed:
-            members = User.objects.all()
-
-            for member in members:
-                if all_members_added:
-                    member.profile.doors.add(door)
-                else:
-                    member.profile.doors.remove(door)
-
-                member.profile.save()
+            door.set_all_members_access(all_members_added)
 
         if (
             all_members_added
@@ -366,15 +386,7 @@ class Interlocks(APIView):
             )
 
         if all_members_added or all_members_removed:
-            members = User.objects.all()
-
-            for member in members:
-                if all_members_added:
-                    member.profile.interlocks.add(interlock)
-                else:
-                    member.profile.interlocks.remove(interlock)
-
-                member.profile.save()
+            interlock.set_all_members_access(all_members_added)
 
         if (
             all_members_added
@@ -585,8 +597,7 @@ class MemberProfile(APIView):
         member.profile.save()
 
         if rfid_changed:
-            for door in member.profile.doors.all():
-                door.sync()
+            member.profile.sync_access()
 
         return Response()
 
@@ -790,8 +801,8 @@ class MemberBillingInfo(StripeAPIView):
 
             # if we have a subscription id, fetch the details
             if member.profile.stripe_subscription_id:
-                s = stripe.Subscription.retrieve(
-                    member.profile.stripe_subscription_id,
+                s = stripe_mirror.get_subscription(
+                    member.profile.stripe_subscription_id
                 )
 
             # if we got subscription details
@@ -1145,20 +1156,20 @@ class BillingGroupDetail(APIView):
         billing_group_name = billing_group.name
 
         # Remove Stripe subscription items for all members before removing them
-        for member in billing_group.members.all():
-            self._remove_stripe_subscription_item_for_member(
-                member, billing_group, request.user
-            )
-            member.billing_group = None
-            member.save()
+        members = list(billing_group.members.all())
+        billing_groups.remove_member_addons(
+            billing_group, members, request.user, "admin"
+        )
+        billing_group.members.update(billing_group=None, modified=timezone.now())
 
         # Remove all invites from the billing group and their locked pricing
-        for invite in billing_group.members_invites.all():
-            self._remove_addon_pricing_for_invited_member(
-                invite, billing_group, request.user
-            )
-            invite.billing_group_invite = None
-            invite.save()
+        invites = list(billing_group.members_invites.all())
+        billing_groups.remove_invitee_addons(
+            billing_group, invites, request.user, "admin"
+        )
+        billing_group.members_invites.update(
+            billing_group_invite=None, modified=timezone.now()
+        )
 
         billing_group.delete()
 
@@ -1175,52 +1186,9 @@ class BillingGroupDetail(APIView):
         """
         Remove Stripe subscription items for a member leaving a billing group.
         """
-        try:
-            from profile.models import BillingGroupMemberAddon
-
-            # Get all locked addon records for this member
-            locked_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=member_profile
-            )
-
-            for locked_addon in locked_addons:
-                # Check if stripe_subscription_item_id field exists and has a value
-                stripe_item_id = getattr(
-                    locked_addon, "stripe_subscription_item_id", None
-                )
-                if stripe_item_id:
-                    try:
-                        # Remove the subscription item from Stripe
-                        stripe.SubscriptionItem.delete(
-                            stripe_item_id,
-                            proration_behavior="create_prorations",
-                        )
-
-                        requesting_user.log_event(
-                            f"Removed Stripe subscription item for {member_profile.get_full_name()} - {locked_addon.addon.name}",
-                            "admin",
-                        )
-                    except stripe.error.InvalidRequestError as e:
-                        # Subscription item might already be deleted
-                        requesting_user.log_event(
-                            f"Stripe subscription item for {member_profile.get_full_name()} was already deleted or not found",
-                            "admin",
-                        )
-                else:
-                    requesting_user.log_event(
-                        f"No Stripe subscription item ID found for {member_profile.get_full_name()} - {locked_addon.addon.name} (may need database migration)",
-                        "admin",
-                    )
-
-                # Clean up the locked addon record
-                locked_addon.delete()
-
-        except Exception as e:
-            requesting_user.log_event(
-                f"Error removing Stripe subscription item for {member_profile.get_full_name()}: {str(e)}",
-                "admin",
-            )
-            capture_exception(e)
+        billing_groups.remove_member_addons(
+            billing_group, [member_profile], requesting_user, "admin"
+        )
 
     def _remove_addon_pricing_for_invited_member(
         self, member_profile, billing_group, requesting_user
@@ -1228,32 +1196,9 @@ class BillingGroupDetail(APIView):
         """
         Remove locked addon pricing for an invited member who hasn't joined yet.
         """
-        try:
-            from profile.models import BillingGroupMemberAddon
-
-            # Get all locked addon records for this invited member
-            locked_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=member_profile
-            )
-
-            addon_names = []
-            count = 0
-            for locked_addon in locked_addons:
-                addon_names.append(locked_addon.addon.name)
-                locked_addon.delete()
-                count += 1
-
-            if count > 0:
-                requesting_user.log_event(
-                    f"Removed {count} locked addon pricing records for invited member {member_profile.get_full_name()}: {', '.join(addon_names)}",
-                    "admin",
-                )
-
-        except Exception as e:
-            requesting_user.log_event(
-                f"Error removing addon pricing for invited member {member_profile.get_full_name()}: {str(e)}",
-                "admin",
-            )
+        billing_groups.remove_invitee_addons(
+            billing_group, [member_profile], requesting_user, "admin"
+        )
 
 
 class BillingGroupMemberManagement(APIView):
@@ -1388,52 +1333,9 @@ class BillingGroupMemberManagement(APIView):
         """
         Remove Stripe subscription items for a member leaving a billing group.
         """
-        try:
-            from profile.models import BillingGroupMemberAddon
-
-            # Get all locked addon records for this member
-            locked_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=member_profile
-            )
-
-            for locked_addon in locked_addons:
-                # Check if stripe_subscription_item_id field exists and has a value
-                stripe_item_id = getattr(
-                    locked_addon, "stripe_subscription_item_id", None
-                )
-                if stripe_item_id:
-                    try:
-                        # Remove the subscription item from Stripe
-                        stripe.SubscriptionItem.delete(
-                            stripe_item_id,
-                            proration_behavior="create_prorations",
-                        )
-
-                        requesting_user.log_event(
-                            f"Removed Stripe subscription item for {member_profile.get_full_name()} - {locked_addon.addon.name}",
-                            "admin",
-                        )
-                    except stripe.error.InvalidRequestError as e:
-                        # Subscription item might already be deleted
-                        requesting_user.log_event(
-                            f"Stripe subscription item for {member_profile.get_full_name()} was already deleted or not found",
-                            "admin",
-                        )
-                else:
-                    requesting_user.log_event(
-                        f"No Stripe subscription item ID found for {member_profile.get_full_name()} - {locked_addon.addon.name} (may need database migration)",
-                        "admin",
-                    )
-
-                # Clean up the locked addon record
-                locked_addon.delete()
-
-        except Exception as e:
-            requesting_user.log_event(
-                f"Error removing Stripe subscription item for {member_profile.get_full_name()}: {str(e)}",
-                "admin",
-            )
-            capture_exception(e)
+        billing_groups.remove_member_addons(
+            billing_group, [member_profile], requesting_user, "admin"
+        )
 
     def _cancel_individual_subscription_with_proration(
         self, member_profile, requesting_user
@@ -1486,6 +1388,7 @@ class BillingGroupMemberManagement(APIView):
                 cancel_at_period_end=False,
                 proration_behavior="create_prorations",
             )
+            stripe_mirror.save_subscription(cancelled_subscription)
 
             # Update the profile to reflect the cancellation
             member_profile.stripe_subscription_id = None
@@ -1521,7 +1424,6 @@ class BillingGroupMemberManagement(APIView):
         Lock in the current addon pricing for a member joining a billing group.
         This captures the current additional member addon pricing.
         """
-        from profile.models import BillingGroupMemberAddon
         from api_admin_tools.models import SubscriptionAddon
 
         try:
@@ -1538,16 +1440,8 @@ class BillingGroupMemberManagement(APIView):
                     )
 
                     # Create the locked pricing record
-                    BillingGroupMemberAddon.objects.get_or_create(
-                        billing_group=billing_group,
-                        member=member_profile,
-                        addon=current_addon,
-                        defaults={
-                            "locked_cost": current_addon.cost,
-                            "locked_currency": current_addon.currency,
-                            "locked_interval": current_addon.interval,
-                            "locked_interval_count": current_addon.interval_count,
-                        },
+                    billing_groups.lock_addon_pricing(
+                        billing_group, [member_profile], current_addon
                     )
 
                     requesting_user.log_event(
@@ -1642,6 +1536,7 @@ class BillingGroupMemberManagement(APIView):
                     price=stripe_price_id,
                     proration_behavior="create_prorations",
                 )
+                stripe_mirror.mark_stale(subscription_item.subscription)
 
                 # Store the Stripe subscription item ID in the locked addon record
                 if hasattr(locked_addon, "stripe_subscription_item_id"):
@@ -1717,6 +1612,7 @@ class BillingGroupMemberManagement(APIView):
                         "removed_from_billing_group": "true",
                     },
                 )
+                stripe_mirror.save_subscription(subscription)
 
                 # Update the member's profile
                 member_profile.stripe_subscription_id = subscription.id
@@ -1761,7 +1657,6 @@ class BillingGroupInviteManagement(APIView):
         This captures the current additional member addon pricing when someone
         is invited to a billing group.
         """
-        from profile.models import BillingGroupMemberAddon
         from api_admin_tools.models import SubscriptionAddon
 
         try:
@@ -1778,16 +1673,8 @@ class BillingGroupInviteManagement(APIView):
                     )
 
                     # Create the locked pricing record
-                    BillingGroupMemberAddon.objects.get_or_create(
-                        billing_group=billing_group,
-                        member=member_profile,
-                        addon=current_addon,
-                        defaults={
-                            "locked_cost": current_addon.cost,
-                            "locked_currency": current_addon.currency,
-                            "locked_interval": current_addon.interval,
-                            "locked_interval_count": current_addon.interval_count,
-                        },
+                    billing_groups.lock_addon_pricing(
+                        billing_group, [member_profile], current_addon
                     )
 
                     requesting_user.log_event(
@@ -1818,30 +1705,9 @@ class BillingGroupInviteManagement(APIView):
         """
         Remove the locked addon pricing records when an invitation is cancelled.
         """
-        from profile.models import BillingGroupMemberAddon
-
-        try:
-            # Remove all locked addon pricing for this member in this billing group
-            removed_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=member_profile
-            )
-
-            addon_names = [addon.addon.name for addon in removed_addons]
-            count = removed_addons.count()
-
-            removed_addons.delete()
-
-            if count > 0:
-                requesting_user.log_event(
-                    f"Removed {count} locked addon pricing records for {member_profile.get_full_name()}: {', '.join(addon_names)}",
-                    "admin",
-                )
-
-        except Exception as e:
-            requesting_user.log_event(
-                f"Error removing addon pricing for {member_profile.get_full_name()}: {str(e)}",
-                "admin",
-            )
+        billing_groups.remove_invitee_addons(
+            billing_group, [member_profile], requesting_user, "admin"
+        )
 
     def post(self, request, billing_group_id):
         from profile.models import BillingGroup, Profile
@@ -0,0 +1,27 @@
+from django.contrib import admin
+from .models import *
+
+
+class StripeSubscriptionItemInline(admin.TabularInline):
+    model = StripeSubscriptionItem
+    extra = 0
+
+
+@admin.register(StripeSubscription)
+class StripeSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ("stripe_id", "customer_id", "status", "synced")
+    list_filter = ("status",)
+    search_fields = ("stripe_id", "customer_id")
+    inlines = (StripeSubscriptionItemInline,)
+
+
+@admin.register(StripeUpcomingInvoice)
+class StripeUpcomingInvoiceAdmin(admin.ModelAdmin):
+    list_display = ("subscription", "total", "amount_due", "synced")
+
+
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "event_type", "customer_id", "status", "received")
+    list_filter = ("status", "event_type")
+    search_fields = ("event_id", "customer_id")
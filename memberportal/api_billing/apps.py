@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.conf import settings
+import stripe
+
+
+class ApiBillingConfig(AppConfig):
+    name = "api_billing"
+
+    def ready(self):
+        if settings.STRIPE_API_BASE:
+            stripe.api_base = settings.STRIPE_API_BASE
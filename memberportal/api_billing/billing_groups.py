@@ -0,0 +1,206 @@
+"""
+Set based operations on billing group members.
+
+Billing groups can have a lot of members (eg. a family or corporate plan), so
+these update every member with a fixed number of queries and Stripe calls
+instead of saving each member in turn.
+"""
+
+from django.utils import timezone
+from sentry_sdk import capture_exception
+from profile.models import Profile, BillingGroupMemberAddon
+from services.emails import queue_emails
+from api_billing import stripe_mirror
+import stripe
+import logging
+
+logger = logging.getLogger("billing")
+
+
+def set_member_subscription_status(primary_member, subscription_status):
+    """
+    Sets the subscription status of every secondary member in the billing
+    groups the primary member pays for with one UPDATE.
+    :return: the members that were updated (with their users loaded)
+    """
+    members = list(
+        Profile.objects.filter(billing_group__primary_member=primary_member)
+        .exclude(id=primary_member.id)
+        .select_related("user", "billing_group")
+    )
+
+    Profile.objects.filter(id__in=[member.id for member in members]).update(
+        subscription_status=subscription_status, modified=timezone.now()
+    )
+    for member in members:
+        member.subscription_status = subscription_status
+
+    return members
+
+
+def notify_members(members, subject, message):
+    """Queues the same email notification to a list of members as one batch."""
+    return queue_emails(
+        [
+            {
+                "to_email": member.user.email,
+                "subject": subject,
+                "template_vars": {"title": subject, "message": message},
+                "user": member.user,
+            }
+            for member in members
+        ]
+    )
+
+
+def lock_addon_pricing(billing_group, members, addon):
+    """
+    Locks the current pricing of an addon for members of (or invitees to) a
+    billing group. Members that already have locked pricing keep it.
+    """
+    BillingGroupMemberAddon.objects.bulk_create(
+        [
+            BillingGroupMemberAddon(
+                billing_group=billing_group,
+                member=member,
+                addon=addon,
+                locked_cost=addon.cost,
+                locked_currency=addon.currency,
+                locked_interval=addon.interval,
+                locked_interval_count=addon.interval_count,
+            )
+            for member in members
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def _delete_subscription_items(subscription_id, item_ids):
+    """
+    Deletes subscription items from Stripe, in one call if they're all on the
+    billing group's subscription.
+    :return: the set of item ids that were already deleted or not found
+    """
+    if subscription_id and len(item_ids) > 1:
+        try:
+            subscription = stripe.Subscription.modify(
+                subscription_id,
+                items=[{"id": item_id, "deleted": True} for item_id in item_ids],
+                proration_behavior="create_prorations",
+            )
+            stripe_mirror.save_subscription(subscription)
+            return set()
+
+        except stripe.error.InvalidRequestError as e:
+            # one of the items is missing or on another subscription, so
+            # delete them one at a time instead
+            logger.warning(f"Couldn't remove subscription items in one call: {e}")
+
+    missing = set()
+    for item_id in item_ids:
+        try:
+            stripe.SubscriptionItem.delete(
+                item_id, proration_behavior="create_prorations"
+            )
+            stripe_mirror.mark_stale(item_id=item_id)
+        except stripe.error.InvalidRequestError:
+            missing.add(item_id)
+
+    return missing
+
+
+def remove_member_addons(billing_group, members, requesting_user, log_type):
+    """
+    Removes the Stripe subscription items and locked addon pricing for members
+    leaving a billing group (or invitees whose invite is cancelled).
+    """
+    try:
+        locked_addons = list(
+            BillingGroupMemberAddon.objects.filter(
+                billing_group=billing_group, member__in=members
+            ).select_related("member", "addon")
+        )
+        if not locked_addons:
+            return
+
+        item_ids = [
+            locked_addon.stripe_subscription_item_id
+            for locked_addon in locked_addons
+            if locked_addon.stripe_subscription_item_id
+        ]
+        primary_member = billing_group.primary_member
+        missing = (
+            _delete_subscription_items(
+                primary_member.stripe_subscription_id if primary_member else None,
+                item_ids,
+            )
+            if item_ids
+            else set()
+        )
+
+        for locked_addon in locked_addons:
+            member_name = locked_addon.member.get_full_name()
+            item_id = locked_addon.stripe_subscription_item_id
+
+            if not item_id:
+                continue
+            elif item_id in missing:
+                requesting_user.log_event(
+                    f"Stripe subscription item for {member_name} was already deleted or not found",
+                    log_type,
+                )
+            else:
+                requesting_user.log_event(
+                    f"Removed Stripe subscription item for {member_name} - {locked_addon.addon.name}",
+                    log_type,
+                )
+
+        BillingGroupMemberAddon.objects.filter(
+            id__in=[locked_addon.id for locked_addon in locked_addons]
+        ).delete()
+
+    except Exception as e:
+        names = ", ".join(member.get_full_name() for member in members)
+        requesting_user.log_event(
+            f"Error removing Stripe subscription items for {names}: {str(e)}",
+            log_type,
+        )
+        capture_exception(e)
+
+
+def remove_invitee_addons(billing_group, members, requesting_user, log_type):
+    """
+    Removes the locked addon pricing for invitees (who don't have Stripe
+    subscription items yet) when their invite is cancelled or accepted.
+    """
+    try:
+        locked_addons = list(
+            BillingGroupMemberAddon.objects.filter(
+                billing_group=billing_group, member__in=members
+            ).select_related("member", "addon")
+        )
+        if not locked_addons:
+            return
+
+        BillingGroupMemberAddon.objects.filter(
+            id__in=[locked_addon.id for locked_addon in locked_addons]
+        ).delete()
+
+        addon_names = {}
+        for locked_addon in locked_addons:
+            addon_names.setdefault(locked_addon.member, []).append(
+                locked_addon.addon.name
+            )
+
+        for member, names in addon_names.items():
+            requesting_user.log_event(
+                f"Removed {len(names)} locked addon pricing records for {member.get_full_name()}: {', '.join(names)}",
+                log_type,
+            )
+
+    except Exception as e:
+        names = ", ".join(member.get_full_name() for member in members)
+        requesting_user.log_event(
+            f"Error removing addon pricing for {names}: {str(e)}",
+            log_type,
+        )
@@ -0,0 +1,62 @@
+from profile.models import Profile
+from api_admin_tools.models import SubscriptionAddon
+
+
+class LineItemResolver:
+    """
+    Resolves the add-ons and billing group members that subscription items or
+    invoice lines refer to. Everything referenced by the items is loaded up
+    front with one query for add-ons and one for members, so describing each
+    item doesn't hit the database.
+    """
+
+    def __init__(self, plan, prices):
+        """
+        :param plan: the member's PaymentPlan
+        :param prices: (price_id, price_metadata) for each line item
+        """
+        self.plan = plan
+        prices = list(prices)
+
+        price_ids = {price_id for price_id, _ in prices if price_id}
+        self.addons = {
+            addon.stripe_price_id: addon
+            for addon in SubscriptionAddon.objects.filter(stripe_price_id__in=price_ids)
+        }
+
+        member_ids = set()
+        for _, metadata in prices:
+            member_id = str((metadata or {}).get("member_id") or "")
+            if member_id.isdigit():
+                member_ids.add(int(member_id))
+        self.members = Profile.objects.in_bulk(member_ids)
+
+    def get_addon(self, price_id):
+        """Returns the SubscriptionAddon for a price, or None."""
+        return self.addons.get(price_id)
+
+    def get_member(self, price_metadata):
+        """Returns the billing group member a price was created for, or None."""
+        member_id = str((price_metadata or {}).get("member_id") or "")
+
+        return self.members.get(int(member_id)) if member_id.isdigit() else None
+
+    def describe(self, price_id, price_metadata=None, price_nickname=None):
+        """Returns a description for a line item that Stripe didn't describe."""
+        if price_id and self.plan and price_id == self.plan.stripe_id:
+            return self.plan.name or "Base Membership Plan"
+
+        if (price_metadata or {}).get("member_id"):
+            member = self.get_member(price_metadata)
+            if member:
+                return f"Additional Member: {member.get_full_name()}"
+            return "Additional Member: Unknown"
+
+        addon = self.get_addon(price_id)
+        if addon:
+            return addon.name
+
+        if price_id:
+            return price_nickname or "Unknown Add-on"
+
+        return "Unknown Charge"
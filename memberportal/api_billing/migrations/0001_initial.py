@@ -0,0 +1,124 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_prometheus.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="StripeSubscription",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "stripe_id",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Stripe Id"
+                    ),
+                ),
+                (
+                    "customer_id",
+                    models.CharField(
+                        db_index=True, max_length=100, verbose_name="Stripe Customer Id"
+                    ),
+                ),
+                ("status", models.CharField(max_length=30, verbose_name="Status")),
+                ("billing_cycle_anchor", models.BigIntegerField(blank=True, null=True)),
+                ("current_period_end", models.BigIntegerField(blank=True, null=True)),
+                ("cancel_at", models.BigIntegerField(blank=True, null=True)),
+                ("cancel_at_period_end", models.BooleanField(default=False)),
+                ("start_date", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "synced",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Last synced from Stripe"
+                    ),
+                ),
+            ],
+            bases=(
+                django_prometheus.models.ExportModelOperationsMixin(
+                    "stripe-subscription"
+                ),
+                models.Model,
+            ),
+        ),
+        migrations.CreateModel(
+            name="StripeUpcomingInvoice",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("lines", models.JSONField(blank=True, default=list)),
+                ("subtotal", models.IntegerField(default=0)),
+                ("total", models.IntegerField(default=0)),
+                ("amount_due", models.IntegerField(default=0)),
+                ("period_start", models.BigIntegerField(blank=True, null=True)),
+                ("period_end", models.BigIntegerField(blank=True, null=True)),
+                ("next_payment_attempt", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "synced",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Last synced from Stripe"
+                    ),
+                ),
+                (
+                    "subscription",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="upcoming_invoice",
+                        to="api_billing.stripesubscription",
+                    ),
+                ),
+            ],
+            bases=(
+                django_prometheus.models.ExportModelOperationsMixin(
+                    "stripe-upcoming-invoice"
+                ),
+                models.Model,
+            ),
+        ),
+        migrations.CreateModel(
+            name="StripeSubscriptionItem",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "stripe_id",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Stripe Id"
+                    ),
+                ),
+                (
+                    "price_id",
+                    models.CharField(max_length=100, verbose_name="Stripe Price Id"),
+                ),
+                (
+                    "price_nickname",
+                    models.CharField(blank=True, default="", max_length=250),
+                ),
+                ("price_metadata", models.JSONField(blank=True, default=dict)),
+                (
+                    "unit_amount",
+                    models.IntegerField(default=0, verbose_name="Unit amount in cents"),
+                ),
+                ("quantity", models.IntegerField(default=1)),
+                (
+                    "subscription",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="api_billing.stripesubscription",
+                    ),
+                ),
+            ],
+            bases=(
+                django_prometheus.models.ExportModelOperationsMixin(
+                    "stripe-subscription-item"
+                ),
+                models.Model,
+            ),
+        ),
+    ]
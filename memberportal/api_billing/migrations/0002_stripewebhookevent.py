@@ -0,0 +1,76 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:52
+
+from django.db import migrations, models
+import django_prometheus.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_billing", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StripeWebhookEvent",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "event_id",
+                    models.CharField(
+                        max_length=255, unique=True, verbose_name="Stripe Event Id"
+                    ),
+                ),
+                (
+                    "event_type",
+                    models.CharField(max_length=100, verbose_name="Event Type"),
+                ),
+                (
+                    "customer_id",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=100,
+                        verbose_name="Stripe Customer Id",
+                    ),
+                ),
+                (
+                    "created",
+                    models.BigIntegerField(
+                        verbose_name="Created in Stripe (unix timestamp)"
+                    ),
+                ),
+                ("payload", models.JSONField(default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processed", "Processed"),
+                            ("failed", "Failed"),
+                            ("ignored", "Ignored"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("received", models.DateTimeField(auto_now_add=True)),
+                ("processed", models.DateTimeField(blank=True, null=True)),
+            ],
+            bases=(
+                django_prometheus.models.ExportModelOperationsMixin(
+                    "stripe-webhook-event"
+                ),
+                models.Model,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stripewebhookevent",
+            index=models.Index(
+                fields=["customer_id", "status", "created"],
+                name="api_billing_custome_6b4425_idx",
+            ),
+        ),
+    ]
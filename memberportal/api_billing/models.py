@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django_prometheus.models import ExportModelOperationsMixin
+
+
+def _is_fresh(synced):
+    return (
+        synced is not None and timezone.now() - synced < settings.STRIPE_MIRROR_MAX_AGE
+    )
+
+
+# Dates are kept as unix timestamps, the same as the Stripe API returns them.
+class StripeSubscription(
+    ExportModelOperationsMixin("stripe-subscription"), models.Model
+):
+    """A local copy of a Stripe subscription kept current by webhooks."""
+
+    id = models.AutoField(primary_key=True)
+    stripe_id = models.CharField("Stripe Id", max_length=100, unique=True)
+    customer_id = models.CharField("Stripe Customer Id", max_length=100, db_index=True)
+    status = models.CharField("Status", max_length=30)
+    billing_cycle_anchor = models.BigIntegerField(null=True, blank=True)
+    current_period_end = models.BigIntegerField(null=True, blank=True)
+    cancel_at = models.BigIntegerField(null=True, blank=True)
+    cancel_at_period_end = models.BooleanField(default=False)
+    start_date = models.BigIntegerField(null=True, blank=True)
+    synced = models.DateTimeField("Last synced from Stripe", null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.stripe_id} ({self.status})"
+
+    def is_fresh(self):
+        return _is_fresh(self.synced)
+
+
+class StripeSubscriptionItem(
+    ExportModelOperationsMixin("stripe-subscription-item"), models.Model
+):
+    """A local copy of an item (price and quantity) on a Stripe subscription."""
+
+    id = models.AutoField(primary_key=True)
+    subscription = models.ForeignKey(
+        StripeSubscription, on_delete=models.CASCADE, related_name="items"
+    )
+    stripe_id = models.CharField("Stripe Id", max_length=100, unique=True)
+    price_id = models.CharField("Stripe Price Id", max_length=100)
+    price_nickname = models.CharField(max_length=250, blank=True, default="")
+    price_metadata = models.JSONField(default=dict, blank=True)
+    unit_amount = models.IntegerField("Unit amount in cents", default=0)
+    quantity = models.IntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.price_id} x {self.quantity}"
+
+
+class StripeUpcomingInvoice(
+    ExportModelOperationsMixin("stripe-upcoming-invoice"), models.Model
+):
+    """
+    A local copy of the upcoming invoice for a Stripe subscription. Each line
+    is stored as a dict with description, amount, proration, period_start,
+    period_end, quantity, price_id, price_nickname and price_metadata.
+    """
+
+    id = models.AutoField(primary_key=True)
+    subscription = models.OneToOneField(
+        StripeSubscription, on_delete=models.CASCADE, related_name="upcoming_invoice"
+    )
+    lines = models.JSONField(default=list, blank=True)
+    subtotal = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    amount_due = models.IntegerField(default=0)
+    period_start = models.BigIntegerField(null=True, blank=True)
+    period_end = models.BigIntegerField(null=True, blank=True)
+    next_payment_attempt = models.BigIntegerField(null=True, blank=True)
+    synced = models.DateTimeField("Last synced from Stripe", null=True, blank=True)
+
+    def __str__(self):
+        return f"Upcoming invoice for {self.subscription.stripe_id}"
+
+    def is_fresh(self):
+        return _is_fresh(self.synced)
+
+
+class StripeWebhookEvent(
+    ExportModelOperationsMixin("stripe-webhook-event"), models.Model
+):
+    """A Stripe webhook event, stored by its event id until it's processed."""
+
+    STATUSES = [
+        ("pending", "Pending"),
+        ("processed", "Processed"),
+        ("failed", "Failed"),
+        ("ignored", "Ignored"),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    event_id = models.CharField("Stripe Event Id", max_length=255, unique=True)
+    event_type = models.CharField("Event Type", max_length=100)
+    customer_id = models.CharField(
+        "Stripe Customer Id", max_length=100, blank=True, default=""
+    )
+    created = models.BigIntegerField("Created in Stripe (unix timestamp)")
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default="pending")
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    received = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["customer_id", "status", "created"])]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id})"
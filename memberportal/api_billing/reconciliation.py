@@ -0,0 +1,325 @@
+"""
+Reconciles member subscription details with Stripe in bulk.
+
+Profile.subscription_status only changes when we receive a webhook, so a
+missed webhook leaves a member with the wrong status (and access) until
+someone notices. This pages through every live Stripe subscription once,
+diffs them against our members locally and applies the corrections with a
+handful of bulk updates, then syncs each affected access device once.
+
+Stripe's subscription list only returns subscriptions that haven't been
+cancelled, so a member whose subscription isn't in the list has ended.
+"""
+
+from dataclasses import dataclass, asdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from access.models import sync_member_devices
+from api_admin_tools.models import PaymentPlan
+from api_billing import stripe_mirror
+from profile.models import Profile
+from services import metrics
+from services.emails import send_email_to_admin
+import stripe
+import logging
+import time
+
+logger = logging.getLogger("billing")
+
+# Stripe statuses where the member is still paying (past_due is retried by
+# Stripe until it either pays or the subscription is cancelled)
+LIVE_STATUSES = ("active", "trialing", "past_due")
+
+
+@dataclass
+class Correction:
+    member_id: int
+    member: str
+    change: str
+    old: str
+    new: str
+
+
+def _expected_status(subscription):
+    """Returns the subscription_status for a live Stripe subscription or None."""
+    if subscription["status"] not in LIVE_STATUSES:
+        # incomplete, unpaid and paused subscriptions are left to the webhooks
+        # and admins to sort out
+        return None
+
+    return "cancelling" if subscription.get("cancel_at_period_end") else "active"
+
+
+def list_subscriptions():
+    """Returns every live Stripe subscription, keyed by subscription id."""
+    return {
+        subscription["id"]: subscription
+        for subscription in stripe.Subscription.list(limit=100).auto_paging_iter()
+    }
+
+
+def _get_plan_prices(subscription):
+    return [item["price"]["id"] for item in subscription["items"]["data"]]
+
+
+def plan_corrections(subscriptions):
+    """
+    Diffs our members against the live Stripe subscriptions.
+    :return: (corrections, updated profiles, subscriptions to mirror)
+    """
+    by_customer = {}
+    for subscription in subscriptions.values():
+        if _expected_status(subscription):
+            by_customer.setdefault(subscription["customer"], []).append(subscription)
+
+    members = (
+        Profile.objects.exclude(stripe_customer_id__isnull=True)
+        .exclude(stripe_customer_id="")
+        .select_related("user")
+        .only(
+            "id",
+            "first_name",
+            "last_name",
+            "state",
+            "stripe_customer_id",
+            "stripe_subscription_id",
+            "subscription_status",
+            "membership_plan",
+            "user__id",
+        )
+    )
+
+    corrections = []
+    updated = []
+    mirrored = []
+
+    plan_ids = {}
+    if by_customer:
+        price_ids = {
+            price_id
+            for customer_subscriptions in by_customer.values()
+            for subscription in customer_subscriptions
+            for price_id in _get_plan_prices(subscription)
+        }
+        plan_ids = dict(
+            PaymentPlan.objects.filter(stripe_id__in=price_ids).values_list(
+                "stripe_id", "id"
+            )
+        )
+
+    for member in members:
+        name = member.get_full_name()
+        subscription = subscriptions.get(member.stripe_subscription_id or "")
+        expected = _expected_status(subscription) if subscription else None
+
+        if member.stripe_subscription_id and expected:
+            mirrored.append(subscription)
+            if member.subscription_status != expected:
+                corrections.append(
+                    Correction(
+                        member.id,
+                        name,
+                        "status",
+                        member.subscription_status,
+                        expected,
+                    )
+                )
+                member.subscription_status = expected
+                updated.append(member)
+            continue
+
+        if subscription is not None:
+            # it still exists in Stripe but isn't live (incomplete, unpaid or
+            # paused), which is left to the webhooks and admins
+            continue
+
+        # the member's subscription has ended (or they never had one), so see
+        # if they have another live subscription we don't know about
+        live = by_customer.get(member.stripe_customer_id, [])
+        if len(live) == 1:
+            subscription = live[0]
+            mirrored.append(subscription)
+            corrections.append(
+                Correction(
+                    member.id,
+                    name,
+                    "linked",
+                    member.stripe_subscription_id or "",
+                    subscription["id"],
+                )
+            )
+            member.stripe_subscription_id = subscription["id"]
+            member.subscription_status = _expected_status(subscription)
+            if not member.membership_plan_id:
+                member.membership_plan_id = next(
+                    (
+                        plan_ids[price_id]
+                        for price_id in _get_plan_prices(subscription)
+                        if price_id in plan_ids
+                    ),
+                    None,
+                )
+            updated.append(member)
+
+        elif len(live) > 1:
+            logger.warning(
+                f"Not linking {name} to a subscription because they have {len(live)} live subscriptions."
+            )
+
+        elif member.stripe_subscription_id:
+            corrections.append(
+                Correction(
+                    member.id,
+                    name,
+                    "ended",
+                    member.stripe_subscription_id,
+                    "",
+                )
+            )
+            member.stripe_subscription_id = None
+            member.membership_plan_id = None
+            member.subscription_status = "inactive"
+            updated.append(member)
+
+    return corrections, updated, mirrored
+
+
+def _plan_group_corrections():
+    """
+    Finds billing group members whose status doesn't match their primary
+    member's subscription (see Profile.get_effective_subscription_status).
+    :return: {group status: [member ids]}
+    """
+    secondary_members = Profile.objects.filter(
+        billing_group__primary_member__isnull=False
+    ).exclude(id=F("billing_group__primary_member"))
+
+    return {
+        "group_active": list(
+            secondary_members.filter(
+                billing_group__primary_member__subscription_status="active"
+            )
+            .exclude(subscription_status="group_active")
+            .values_list("id", flat=True)
+        ),
+        "group_inactive": list(
+            secondary_members.filter(
+                billing_group__primary_member__subscription_status__in=[
+                    "inactive",
+                    "cancelling",
+                ]
+            )
+            .exclude(subscription_status="group_inactive")
+            .values_list("id", flat=True)
+        ),
+    }
+
+
+def _email_report(report):
+    lines = [
+        f"{correction['member']}: {correction['change']} ({correction['old'] or 'none'} -> {correction['new'] or 'none'})"
+        for correction in report["corrections"]
+    ]
+    if report["aborted"]:
+        lines.insert(0, report["aborted"])
+
+    subject = "Stripe subscription reconciliation report"
+    send_email_to_admin(
+        subject,
+        template_vars={"title": subject, "message": "<br>".join(lines)},
+    )
+
+
+def reconcile_subscriptions(dry_run=False, max_ended=None):
+    """
+    Corrects member subscription details that don't match Stripe.
+    :param dry_run: only report the corrections that would be made
+    :param max_ended: the most subscriptions that can be ended in one run
+    :return: the reconciliation report (a dict)
+    """
+    started = time.monotonic()
+    if max_ended is None:
+        max_ended = settings.STRIPE_RECONCILE_MAX_ENDED
+
+    subscriptions = list_subscriptions()
+    corrections, updated, mirrored = plan_corrections(subscriptions)
+    group_corrections = _plan_group_corrections()
+
+    ended_ids = [c.member_id for c in corrections if c.change == "ended"]
+    deactivated_ids = [
+        member.id
+        for member in updated
+        if member.id in ended_ids and member.state == "active"
+    ]
+
+    report = {
+        "dry_run": dry_run,
+        "aborted": "",
+        "subscriptions": len(subscriptions),
+        "corrections": [asdict(correction) for correction in corrections],
+        "deactivated": len(deactivated_ids),
+        "group_members_updated": sum(len(ids) for ids in group_corrections.values()),
+        "devices_synced": 0,
+    }
+
+    if len(ended_ids) > max_ended:
+        report["aborted"] = (
+            f"Not applying any corrections because {len(ended_ids)} subscriptions "
+            f"would be ended (the limit is {max_ended}). Please check the Stripe "
+            f"account or increase MM_STRIPE_RECONCILE_MAX_ENDED."
+        )
+        logger.error(report["aborted"])
+
+    elif not dry_run:
+        now = timezone.now()
+
+        with transaction.atomic():
+            Profile.objects.bulk_update(
+                updated,
+                ["stripe_subscription_id", "subscription_status", "membership_plan"],
+                batch_size=500,
+            )
+            Profile.objects.filter(id__in=[m.id for m in updated]).update(modified=now)
+            Profile.objects.filter(id__in=deactivated_ids).update(state="inactive")
+
+            for status, member_ids in group_corrections.items():
+                Profile.objects.filter(id__in=member_ids).update(
+                    subscription_status=status, modified=now
+                )
+
+            for subscription in mirrored:
+                stripe_mirror.save_subscription(subscription)
+
+            members = {member.id: member for member in updated}
+            for correction in corrections:
+                members[correction.member_id].user.log_event(
+                    f"Subscription reconciled with Stripe: {correction.change} ({correction.old or 'none'} -> {correction.new or 'none'})",
+                    "stripe",
+                )
+
+        if deactivated_ids:
+            from api_spacedirectory.spaceapi import invalidate_spaceapi_document
+
+            report["devices_synced"] = sync_member_devices(deactivated_ids)
+            invalidate_spaceapi_document()
+
+        for correction in corrections:
+            metrics.stripe_reconciliation_corrections_total.labels(
+                change=correction.change
+            ).inc()
+
+    report["duration"] = round(time.monotonic() - started, 2)
+    metrics.stripe_reconciliation_duration_seconds.observe(report["duration"])
+
+    logger.info(
+        f"Reconciled {report['subscriptions']} Stripe subscriptions in {report['duration']}s: "
+        f"{len(corrections)} corrections, {report['group_members_updated']} group members "
+        f"updated, {report['deactivated']} deactivated{' (dry run)' if dry_run else ''}."
+    )
+
+    if not dry_run and (corrections or report["aborted"]):
+        _email_report(report)
+
+    return report
@@ -0,0 +1,273 @@
+"""
+A local read model of Stripe subscriptions and upcoming invoices.
+
+Views read from the local copy so that browsing billing information doesn't
+call Stripe on every page view. The copy is updated from StripeWebhook events,
+after we modify a subscription, and by a periodic reconciliation task. Anything
+older than settings.STRIPE_MIRROR_MAX_AGE is refreshed from Stripe when it's
+read, and a stale copy is used if Stripe can't be reached.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from services import metrics
+from .models import StripeSubscription, StripeSubscriptionItem, StripeUpcomingInvoice
+import stripe
+import logging
+
+logger = logging.getLogger("billing")
+
+
+def _get(obj, key, default=None):
+    # works for both stripe objects and the plain dicts from unsigned webhooks
+    try:
+        value = obj[key]
+    except (KeyError, TypeError):
+        return default
+
+    return default if value is None else value
+
+
+def _get_price_details(price):
+    return {
+        "price_id": _get(price, "id", ""),
+        "price_nickname": _get(price, "nickname", ""),
+        "price_metadata": dict(_get(price, "metadata", {})),
+    }
+
+
+def _get_subscription_items(subscription):
+    items = _get(subscription, "items", {})
+
+    if _get(items, "has_more", False):
+        # subscriptions with lots of billing group members don't fit in one page
+        return stripe.SubscriptionItem.list(
+            subscription=subscription["id"]
+        ).auto_paging_iter()
+
+    return _get(items, "data", [])
+
+
+@transaction.atomic
+def save_subscription(subscription):
+    """
+    Updates the local copy of a subscription from a Stripe subscription object.
+    :return: StripeSubscription
+    """
+    local_subscription, _ = StripeSubscription.objects.update_or_create(
+        stripe_id=subscription["id"],
+        defaults={
+            "customer_id": _get(subscription, "customer", ""),
+            "status": _get(subscription, "status", ""),
+            "billing_cycle_anchor": _get(subscription, "billing_cycle_anchor"),
+            "current_period_end": _get(subscription, "current_period_end"),
+            "cancel_at": _get(subscription, "cancel_at"),
+            "cancel_at_period_end": _get(subscription, "cancel_at_period_end", False),
+            "start_date": _get(subscription, "start_date"),
+            "synced": timezone.now(),
+        },
+    )
+
+    items = [
+        StripeSubscriptionItem(
+            subscription=local_subscription,
+            stripe_id=item["id"],
+            unit_amount=_get(item["price"], "unit_amount", 0),
+            quantity=_get(item, "quantity", 1),
+            **_get_price_details(item["price"]),
+        )
+        for item in _get_subscription_items(subscription)
+    ]
+    local_subscription.items.all().delete()
+    StripeSubscriptionItem.objects.bulk_create(items)
+
+    # any change to the subscription can change what will be invoiced next
+    StripeUpcomingInvoice.objects.filter(subscription=local_subscription).update(
+        synced=None
+    )
+
+    return local_subscription
+
+
+def fetch_subscription(subscription_id):
+    """
+    Refreshes the local copy of a subscription from Stripe.
+    :return: StripeSubscription
+    """
+    metrics.stripe_mirror_reads_total.labels(object="subscription", result="miss").inc()
+    subscription = stripe.Subscription.retrieve(subscription_id, expand=["items"])
+
+    return save_subscription(subscription)
+
+
+def get_subscription(subscription_id):
+    """
+    Returns the local copy of a subscription, refreshing it from Stripe if it's
+    missing or stale. A stale copy is returned if Stripe can't be reached.
+    :return: StripeSubscription
+    """
+    local_subscription = (
+        StripeSubscription.objects.filter(stripe_id=subscription_id)
+        .prefetch_related("items")
+        .first()
+    )
+
+    if local_subscription and local_subscription.is_fresh():
+        metrics.stripe_mirror_reads_total.labels(
+            object="subscription", result="hit"
+        ).inc()
+        return local_subscription
+
+    try:
+        fetch_subscription(subscription_id)
+
+    except stripe.error.StripeError as e:
+        if local_subscription is None:
+            raise e
+
+        logger.warning(f"Using stale copy of subscription {subscription_id}: {e}")
+        metrics.stripe_mirror_reads_total.labels(
+            object="subscription", result="stale"
+        ).inc()
+        return local_subscription
+
+    return StripeSubscription.objects.prefetch_related("items").get(
+        stripe_id=subscription_id
+    )
+
+
+def _get_invoice_lines(invoice, customer_id, subscription_id):
+    lines = _get(invoice, "lines", {})
+
+    if _get(lines, "has_more", False):
+        return stripe.Invoice.upcoming_lines(
+            customer=customer_id, subscription=subscription_id
+        ).auto_paging_iter()
+
+    return _get(lines, "data", [])
+
+
+def save_upcoming_invoice(local_subscription, invoice):
+    """
+    Updates the local copy of a subscription's upcoming invoice.
+    :return: StripeUpcomingInvoice
+    """
+    lines = []
+
+    for line in _get_invoice_lines(
+        invoice, local_subscription.customer_id, local_subscription.stripe_id
+    ):
+        period = _get(line, "period")
+        lines.append(
+            {
+                "description": _get(line, "description", ""),
+                "amount": _get(line, "amount", 0),
+                "proration": _get(line, "proration", False),
+                "period_start": _get(period, "start"),
+                "period_end": _get(period, "end"),
+                "quantity": _get(line, "quantity", 1),
+                **_get_price_details(_get(line, "price", {})),
+            }
+        )
+
+    upcoming_invoice, _ = StripeUpcomingInvoice.objects.update_or_create(
+        subscription=local_subscription,
+        defaults={
+            "lines": lines,
+            "subtotal": _get(invoice, "subtotal", 0),
+            "total": _get(invoice, "total", 0),
+            "amount_due": _get(invoice, "amount_due", 0),
+            "period_start": _get(invoice, "period_start"),
+            "period_end": _get(invoice, "period_end"),
+            "next_payment_attempt": _get(invoice, "next_payment_attempt"),
+            "synced": timezone.now(),
+        },
+    )
+
+    return upcoming_invoice
+
+
+def fetch_upcoming_invoice(customer_id, subscription_id):
+    """
+    Refreshes the local copy of a subscription's upcoming invoice from Stripe.
+    :return: StripeUpcomingInvoice
+    """
+    metrics.stripe_mirror_reads_total.labels(
+        object="upcoming_invoice", result="miss"
+    ).inc()
+    invoice = stripe.Invoice.upcoming(
+        customer=customer_id, subscription=subscription_id
+    )
+
+    local_subscription = StripeSubscription.objects.filter(
+        stripe_id=subscription_id
+    ).first()
+    if local_subscription is None:
+        local_subscription = fetch_subscription(subscription_id)
+
+    return save_upcoming_invoice(local_subscription, invoice)
+
+
+def get_upcoming_invoice(customer_id, subscription_id):
+    """
+    Returns the local copy of a subscription's upcoming invoice, refreshing it
+    from Stripe if it's missing or stale. A stale copy is returned if Stripe
+    can't be reached.
+    :return: StripeUpcomingInvoice
+    """
+    upcoming_invoice = StripeUpcomingInvoice.objects.filter(
+        subscription__stripe_id=subscription_id
+    ).first()
+
+    if upcoming_invoice and upcoming_invoice.is_fresh():
+        metrics.stripe_mirror_reads_total.labels(
+            object="upcoming_invoice", result="hit"
+        ).inc()
+        return upcoming_invoice
+
+    try:
+        return fetch_upcoming_invoice(customer_id, subscription_id)
+
+    except stripe.error.StripeError as e:
+        if upcoming_invoice is None:
+            raise e
+
+        logger.warning(f"Using stale upcoming invoice for {subscription_id}: {e}")
+        metrics.stripe_mirror_reads_total.labels(
+            object="upcoming_invoice", result="stale"
+        ).inc()
+        return upcoming_invoice
+
+
+def mark_stale(subscription_id=None, item_id=None):
+    """
+    Marks the local copy of a subscription (found by its id or the id of one of
+    its items) and its upcoming invoice as stale, so they're refreshed from
+    Stripe the next time they're read. Call this after modifying a subscription
+    in Stripe.
+    """
+    if subscription_id:
+        subscriptions = StripeSubscription.objects.filter(stripe_id=subscription_id)
+    elif item_id:
+        subscriptions = StripeSubscription.objects.filter(items__stripe_id=item_id)
+    else:
+        return
+
+    subscription_ids = list(subscriptions.values_list("id", flat=True))
+    StripeSubscription.objects.filter(id__in=subscription_ids).update(synced=None)
+    StripeUpcomingInvoice.objects.filter(subscription_id__in=subscription_ids).update(
+        synced=None
+    )
+
+
+def apply_webhook_event(event_type, data):
+    """Updates the local copies from a Stripe webhook event."""
+    if event_type.startswith("customer.subscription."):
+        save_subscription(data)
+
+    elif event_type.startswith("invoice."):
+        subscription_id = _get(data, "subscription")
+        if subscription_id:
+            StripeUpcomingInvoice.objects.filter(
+                subscription__stripe_id=subscription_id
+            ).update(synced=None)
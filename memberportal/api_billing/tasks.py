@@ -0,0 +1,136 @@
+from membermatters.celeryapp import app
+from django.conf import settings
+from django.utils import timezone
+from constance import config
+from profile.models import Profile
+from api_billing import reconciliation, stripe_mirror, webhooks
+from api_billing.models import (
+    StripeSubscription,
+    StripeUpcomingInvoice,
+    StripeWebhookEvent,
+)
+from services import metrics
+from datetime import timedelta
+import stripe
+import logging
+
+logger = logging.getLogger("celery:api_billing")
+
+
+@app.on_after_finalize.connect
+def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(
+        3600,
+        reconcile_stripe_mirror.s(),
+        expires=3600,
+        name="celery_reconcile_stripe_mirror",
+    )
+    # picks up webhook events whose processing task was lost or is retrying
+    sender.add_periodic_task(
+        300,
+        process_pending_stripe_events.s(),
+        expires=300,
+        name="celery_process_pending_stripe_events",
+    )
+    sender.add_periodic_task(
+        3600 * 24,
+        reconcile_subscriptions.s(),
+        expires=3600,
+        name="celery_reconcile_subscriptions",
+    )
+
+
+@app.task
+def reconcile_stripe_mirror(limit=500):
+    """
+    Refreshes local copies of member subscriptions (and upcoming invoices that
+    have been viewed) before they go stale, in case we missed a webhook.
+    """
+    if not config.ENABLE_STRIPE or not config.STRIPE_SECRET_KEY:
+        return 0
+
+    stripe.api_key = config.STRIPE_SECRET_KEY
+
+    # refresh anything past half its max age so views rarely have to
+    refresh_before = timezone.now() - settings.STRIPE_MIRROR_MAX_AGE / 2
+    subscription_ids = set(
+        Profile.objects.exclude(stripe_subscription_id__isnull=True)
+        .exclude(stripe_subscription_id="")
+        .values_list("stripe_subscription_id", flat=True)
+    )
+    fresh_ids = set(
+        StripeSubscription.objects.filter(
+            stripe_id__in=subscription_ids, synced__gte=refresh_before
+        ).values_list("stripe_id", flat=True)
+    )
+
+    refreshed = 0
+    for subscription_id in list(subscription_ids - fresh_ids)[:limit]:
+        try:
+            stripe_mirror.fetch_subscription(subscription_id)
+            refreshed += 1
+        except stripe.error.StripeError as e:
+            logger.warning(f"Failed to refresh subscription {subscription_id}: {e}")
+
+    stale_invoices = StripeUpcomingInvoice.objects.filter(
+        subscription__stripe_id__in=subscription_ids
+    ).exclude(synced__gte=refresh_before)
+
+    for upcoming_invoice in stale_invoices.select_related("subscription")[:limit]:
+        try:
+            stripe_mirror.fetch_upcoming_invoice(
+                upcoming_invoice.subscription.customer_id,
+                upcoming_invoice.subscription.stripe_id,
+            )
+        except stripe.error.StripeError as e:
+            logger.warning(
+                f"Failed to refresh upcoming invoice for {upcoming_invoice.subscription.stripe_id}: {e}"
+            )
+
+    logger.info(f"Refreshed {refreshed} subscriptions from Stripe.")
+    return refreshed
+
+
+@app.task(bind=True, max_retries=8)
+def process_stripe_events(self, customer_id):
+    """Processes the pending webhook events for a Stripe customer in order."""
+    if not config.ENABLE_STRIPE:
+        return False
+
+    stripe.api_key = config.STRIPE_SECRET_KEY
+
+    if not webhooks.process_customer_events(customer_id):
+        # retry the failed event (and any after it) with exponential backoff
+        raise self.retry(countdown=30 * 2**self.request.retries)
+
+    metrics.stripe_webhook_events_pending.set(
+        StripeWebhookEvent.objects.filter(status="pending").count()
+    )
+    return True
+
+
+@app.task
+def process_pending_stripe_events():
+    """Queues processing for customers whose webhook events are still pending."""
+    customer_ids = webhooks.get_customers_with_pending_events(
+        older_than=timezone.now() - timedelta(minutes=5)
+    )
+
+    for customer_id in customer_ids:
+        process_stripe_events.delay(customer_id)
+
+    metrics.stripe_webhook_events_pending.set(
+        StripeWebhookEvent.objects.filter(status="pending").count()
+    )
+    return len(customer_ids)
+
+
+@app.task
+def reconcile_subscriptions(dry_run=False):
+    """Corrects member subscription details that don't match Stripe."""
+    if not config.ENABLE_STRIPE or not config.STRIPE_SECRET_KEY:
+        return None
+
+    stripe.api_key = config.STRIPE_SECRET_KEY
+
+    return reconciliation.reconcile_subscriptions(dry_run=dry_run)
@@ -2,7 +2,6 @@ from asgiref.sync import sync_to_async
 from django.http import HttpRequest
 
 from profile.models import Profile
-from access.models import Doors, Interlock
 from api_admin_tools.models import *
 
 from rest_framework import status, permissions
@@ -11,12 +10,18 @@ from rest_framework.views import APIView
 
 import stripe
 import logging
+import json
+import uuid
 from services.canvas import Canvas
 from services.moodle_integration import (
     moodle_get_course_activity_completion_status,
     moodle_get_user_from_email,
 )
 from services.emails import send_email_to_admin
+from api_billing import billing_groups, stripe_mirror, webhooks
+from api_billing.line_items import LineItemResolver
+from api_billing.tasks import process_stripe_events
+from django.db import transaction
 from constance import config
 from django.db.utils import OperationalError
 from sentry_sdk import capture_exception
@@ -482,16 +487,11 @@ class CompleteSignup(StripeAPIView):
         signupCheck = member_profile.can_signup()
 
         if signupCheck["success"]:
+            # give default door and interlock access before activating, so
+            # activating syncs each of their devices once
+            member_profile.grant_default_access()
             member_profile.activate()
 
-            # give default door access
-            for door in Doors.objects.filter(all_members=True):
-                member_profile.doors.add(door)
-
-            # give default interlock access
-            for interlock in Interlock.objects.filter(all_members=True):
-                member_profile.interlocks.add(interlock)
-
             member_profile.user.email_membership_application()
             member_profile.user.email_welcome()
 
@@ -529,52 +529,43 @@ class SubscriptionInfo(StripeAPIView):
             return Response({"success": False})
 
         else:
-            s = stripe.Subscription.retrieve(
-                request.user.profile.stripe_subscription_id, expand=["items"]
+            s = stripe_mirror.get_subscription(
+                request.user.profile.stripe_subscription_id
             )
 
             if s:
                 # Get add-ons from subscription items
                 addons = []
-                from api_admin_tools.models import SubscriptionAddon
-
-                # Get subscription items - handle both expanded and non-expanded cases
-                try:
-                    if hasattr(s.items, "data"):
-                        items = s.items.data
-                    else:
-                        # If items is not expanded, we need to list them separately
-                        items = stripe.SubscriptionItem.list(subscription=s.id).data
-                except AttributeError:
-                    # Fallback: list subscription items separately
-                    items = stripe.SubscriptionItem.list(subscription=s.id).data
+                items = list(s.items.all())
+                resolver = LineItemResolver(
+                    current_plan,
+                    [(item.price_id, item.price_metadata) for item in items],
+                )
 
                 for item in items:
-                    if item.price.id != request.user.profile.membership_plan.stripe_id:
+                    if item.price_id != current_plan.stripe_id:
                         # This is an add-on item
-                        try:
-                            addon = SubscriptionAddon.objects.get(
-                                stripe_price_id=item.price.id
-                            )
+                        addon = resolver.get_addon(item.price_id)
+                        if addon:
                             addons.append(
                                 {
                                     "id": addon.id,
                                     "name": addon.name,
                                     "quantity": item.quantity,
-                                    "cost": item.price.unit_amount,
-                                    "cost_display": f"${item.price.unit_amount/100:.2f}",
-                                    "stripe_subscription_item_id": item.id,
+                                    "cost": item.unit_amount,
+                                    "cost_display": f"${item.unit_amount/100:.2f}",
+                                    "stripe_subscription_item_id": item.stripe_id,
                                 }
                             )
-                        except SubscriptionAddon.DoesNotExist:
+                        else:
                             # Unknown add-on, include basic info
                             addons.append(
                                 {
                                     "name": "Unknown Add-on",
                                     "quantity": item.quantity,
-                                    "cost": item.price.unit_amount,
-                                    "cost_display": f"${item.price.unit_amount/100:.2f}",
-                                    "stripe_subscription_item_id": item.id,
+                                    "cost": item.unit_amount,
+                                    "cost_display": f"${item.unit_amount/100:.2f}",
+                                    "stripe_subscription_item_id": item.stripe_id,
                                 }
                             )
 
@@ -641,67 +632,38 @@ class MembershipPlanCostSummary(StripeAPIView):
 
         try:
             # Get the upcoming invoice to see actual charges including prorations
-            upcoming_invoice = stripe.Invoice.upcoming(
-                customer=profile.stripe_customer_id,
-                subscription=profile.stripe_subscription_id,
+            upcoming_invoice = stripe_mirror.get_upcoming_invoice(
+                profile.stripe_customer_id, profile.stripe_subscription_id
             )
 
             # Process line items from the upcoming invoice using Stripe's descriptions
             line_items = []
 
-            for line_item in upcoming_invoice.lines.data:
+            resolver = LineItemResolver(
+                plan,
+                [
+                    (line_item["price_id"], line_item["price_metadata"])
+                    for line_item in upcoming_invoice.lines
+                ],
+            )
+
+            for line_item in upcoming_invoice.lines:
                 # Use Stripe's description if available, otherwise fall back to our own logic
-                description = line_item.description
-
-                if not description:
-                    # Fallback logic for missing descriptions
-                    if line_item.price and line_item.price.id == plan.stripe_id:
-                        description = plan.name or "Base Membership Plan"
-                    elif (
-                        line_item.price
-                        and hasattr(line_item.price, "metadata")
-                        and line_item.price.metadata
-                    ):
-                        member_id = line_item.price.metadata.get("member_id")
-                        if member_id:
-                            try:
-                                member = Profile.objects.get(id=member_id)
-                                description = (
-                                    f"Additional Member: {member.get_full_name()}"
-                                )
-                            except Profile.DoesNotExist:
-                                description = "Additional Member: Unknown"
-                        else:
-                            # Try to get addon name from our database
-                            try:
-                                addon = SubscriptionAddon.objects.get(
-                                    stripe_price_id=line_item.price.id
-                                )
-                                description = addon.name
-                            except SubscriptionAddon.DoesNotExist:
-                                description = (
-                                    line_item.price.nickname or "Unknown Add-on"
-                                )
-                    else:
-                        description = "Unknown Charge"
+                description = line_item["description"] or resolver.describe(
+                    line_item["price_id"],
+                    line_item["price_metadata"],
+                    line_item["price_nickname"],
+                )
 
                 line_items.append(
                     {
                         "description": description,
-                        "cost": line_item.amount,
-                        "cost_display": f"${line_item.amount/100:.2f}",
-                        "proration": (
-                            line_item.proration
-                            if hasattr(line_item, "proration")
-                            else False
-                        ),
-                        "period_start": (
-                            line_item.period.start if line_item.period else None
-                        ),
-                        "period_end": (
-                            line_item.period.end if line_item.period else None
-                        ),
-                        "quantity": getattr(line_item, "quantity", 1),
+                        "cost": line_item["amount"],
+                        "cost_display": f"${line_item['amount']/100:.2f}",
+                        "proration": line_item["proration"],
+                        "period_start": line_item["period_start"],
+                        "period_end": line_item["period_end"],
+                        "quantity": line_item["quantity"],
                     }
                 )
 
@@ -731,42 +693,23 @@ class MembershipPlanCostSummary(StripeAPIView):
 
             try:
                 # Get the subscription and its items as fallback
-                subscription = stripe.Subscription.retrieve(
-                    profile.stripe_subscription_id, expand=["items"]
+                subscription = stripe_mirror.get_subscription(
+                    profile.stripe_subscription_id
                 )
 
                 line_items = []
+                items = list(subscription.items.all())
+                resolver = LineItemResolver(
+                    plan, [(item.price_id, item.price_metadata) for item in items]
+                )
 
                 # Process each subscription item
-                for item in subscription.items.data:
-                    # Generate description for each item
-                    if item.price.id == plan.stripe_id:
-                        description = plan.name or "Base Membership Plan"
-                    else:
-                        # This is an addon item
-                        description = "Unknown Add-on"
-
-                        if hasattr(item.price, "metadata") and item.price.metadata:
-                            member_id = item.price.metadata.get("member_id")
-                            if member_id:
-                                try:
-                                    member = Profile.objects.get(id=member_id)
-                                    description = (
-                                        f"Additional Member: {member.get_full_name()}"
-                                    )
-                                except Profile.DoesNotExist:
-                                    description = "Additional Member: Unknown"
-                        else:
-                            # Try to get addon name
-                            try:
-                                addon = SubscriptionAddon.objects.get(
-                                    stripe_price_id=item.price.id
-                                )
-                                description = addon.name
-                            except SubscriptionAddon.DoesNotExist:
-                                description = item.price.nickname or "Unknown Add-on"
-
-                    item_cost = item.price.unit_amount * item.quantity
+                for item in items:
+                    description = resolver.describe(
+                        item.price_id, item.price_metadata, item.price_nickname
+                    )
+
+                    item_cost = item.unit_amount * item.quantity
                     line_items.append(
                         {
                             "description": description,
@@ -886,6 +829,7 @@ class PaymentPlanResumeCancel(StripeAPIView):
                     request.user.profile.stripe_subscription_id,
                     cancel_at_period_end=False,
                 )
+                stripe_mirror.save_subscription(modified_subscription)
 
                 if not modified_subscription.cancel_at_period_end:
                     request.user.profile.subscription_status = "active"
@@ -927,6 +871,7 @@ class PaymentPlanResumeCancel(StripeAPIView):
                     request.user.profile.stripe_subscription_id,
                     cancel_at_period_end=True,
                 )
+                stripe_mirror.save_subscription(modified_subscription)
 
                 if modified_subscription.cancel_at_period_end == True:
                     request.user.profile.subscription_status = "cancelling"
@@ -1029,6 +974,8 @@ class SubscriptionAddonManagement(StripeAPIView):
                     f"Removed add-on {addon.name} from subscription.", "stripe"
                 )
 
+            stripe_mirror.mark_stale(request.user.profile.stripe_subscription_id)
+
             return Response({"success": True})
 
         except stripe.error.StripeError as e:
@@ -1044,7 +991,7 @@ class SubscriptionAddonManagement(StripeAPIView):
 
 class StripeWebhook(StripeAPIView):
     """
-    post: processes a Stripe webhook event.
+    post: stores a Stripe webhook event and queues it to be processed.
     """
 
     permission_classes = (permissions.AllowAny,)
@@ -1052,200 +999,34 @@ class StripeWebhook(StripeAPIView):
     def post(self, request):
         webhook_secret = config.STRIPE_WEBHOOK_SECRET
         body = request.body
-        request_data = request.data
 
         if webhook_secret:
             # Retrieve the event by verifying the signature if webhook signing is configured.
             signature = request.headers.get("stripe-signature")
             try:
-                event = stripe.Webhook.construct_event(
+                stripe.Webhook.construct_event(
                     payload=body, sig_header=signature, secret=webhook_secret
                 )
-                data = event["data"]
+                event = json.loads(body)
             except Exception as e:
                 logger.error(e)
                 capture_exception(e)
                 return Response({"error": "Error validating Stripe signature."})
-
-            # Get the type of webhook event sent - used to check the status of PaymentIntents.
-            event_type = event["type"]
         else:
-            data = request_data["data"]
-            event_type = request_data["type"]
-
-        data = data["object"]
-        try:
-            member_profile = Profile.objects.get(stripe_customer_id=data["customer"])
-
-        except Profile.DoesNotExist as e:
-            capture_exception(e)
-            return Response()
-
-        # Just in case the linked Stripe account also processes other payments we should just ignore a non existent
-        # customer.
-        if not member_profile:
-            return Response()
-
-        if event_type == "invoice.paid":
-            invoice_status = data["status"]
-
-            member_profile.user.log_event("Membership payment received.", "stripe")
-
-            if (
-                invoice_status == "paid"
-                and not member_profile.subscription_first_created
-            ):
-                member_profile.subscription_first_created = timezone.now()
-                member_profile.save()
-
-            # If they aren't an active member, are allowed to signup, and have paid the invoice
-            # then lets activate their account (this could be a new OR returning member)
-            if (
-                member_profile.state != "active"
-                and member_profile.can_signup()["success"]
-                and invoice_status == "paid"
-            ):
-                subject = "Your payment was successful."
-                message = (
-                    "Thanks for making a membership payment using our online payment system. "
-                    "You've already met all of the requirements for activating your site access. Please check "
-                    "for another email message confirming this was successful."
-                )
-                member_profile.user.email_notification(subject, message)
-
-                # set the subscription status to active
-                member_profile.subscription_status = "active"
-                member_profile.save()
-
-                # Update billing group members if this is a primary member
-                if hasattr(member_profile, "primary_billing_groups"):
-                    for billing_group in member_profile.primary_billing_groups.all():
-                        # Update all members in the billing group to group_active
-                        for group_member in billing_group.members.exclude(
-                            id=member_profile.id
-                        ):
-                            group_member.subscription_status = "group_active"
-                            group_member.save()
-
-                # activate their access card
-                member_profile.activate()
-
-                member_profile.user.log_event(
-                    "Activated membership because member met all requirements.",
-                    "stripe",
-                )
-
-            # If they aren't an active member, are NOT allowed to signup, and have paid the invoice
-            # then we need to let them know and mark the subscription as active
-            # (this could be a new OR returning member that's been too long since induction etc.)
-            elif member_profile.state != "active" and invoice_status == "paid":
-                subject = "Your payment was successful."
-                message = (
-                    "Thanks for making a membership payment using our online payment system. "
-                    "You haven't yet met all of the requirements for automatically activating your site access. "
-                    "You'll receive confirmation that your site access is enabled soon, or we'll be in touch. "
-                    "If you don't hear from us soon or require assistance, please contact us."
-                )
-                member_profile.user.email_notification(subject, message)
-
-                member_profile.subscription_status = "active"
-                member_profile.save()
-
-                # Update billing group members if this is a primary member
-                if hasattr(member_profile, "primary_billing_groups"):
-                    for billing_group in member_profile.primary_billing_groups.all():
-                        # Update all members in the billing group to group_active
-                        for group_member in billing_group.members.exclude(
-                            id=member_profile.id
-                        ):
-                            group_member.subscription_status = "group_active"
-                            group_member.save()
-
-                # if this is a returning member then send the exec an email (new members have
-                # already had this sent)
-                if member_profile.state != "noob":
-                    subject = "Action Required: Verify returning member"
-                    title = subject
-                    message = (
-                        "An existing member (or someone who clicked 'skip signup I just want an account') "
-                        "has setup a membership subscription. You must now decide whether to enable their site access."
-                    )
-                    send_email_to_admin(
-                        subject, title, message, reply_to=member_profile.user.email
-                    )
-
-                member_profile.user.log_event(
-                    "Did not activate membership because member did not meet all requirements.",
-                    "stripe",
-                )
-
-            # in all other instances, we don't care about a paid invoice and can ignore it
-
-        if event_type == "invoice.payment_failed":
-            subject = "Your membership payment failed"
-            message = (
-                "Hi there, we tried to collect your membership payment but "
-                "weren't successful. Please update your billing method or contact "
-                "us if you need more time. We'll try again a few times, but if we're unable to "
-                "collect your payment soon, your membership may be cancelled."
-            )
-
-            member_profile.user.email_notification(subject, message)
-            member_profile.user.log_event("Membership payment failed", "stripe")
-
-        if event_type == "customer.subscription.deleted":
-            # the subscription was deleted, so deactivate the member
-            subject = "Your membership has been cancelled"
-            message = (
-                "You will receive another email shortly confirming that your access has been deactivated. Your "
-                "membership was cancelled because we couldn't collect your payment, or you chose not to renew it."
-            )
-
-            member_profile.deactivate()
-            member_profile.user.email_notification(subject, message)
-
-            member_profile.membership_plan = None
-            member_profile.stripe_subscription_id = None
-            member_profile.subscription_status = "inactive"
-            member_profile.save()
-
-            # Update billing group members if this is a primary member
-            if hasattr(member_profile, "primary_billing_groups"):
-                for billing_group in member_profile.primary_billing_groups.all():
-                    # Update all members in the billing group to group_inactive
-                    for group_member in billing_group.members.exclude(
-                        id=member_profile.id
-                    ):
-                        group_member.subscription_status = "group_inactive"
-                        group_member.save()
-
-                        # Send notification to group members
-                        group_subject = f"Billing group '{billing_group.name}' subscription cancelled"
-                        group_message = (
-                            f"The subscription for billing group '{billing_group.name}' has been cancelled. "
-                            f"Your access may be affected. Please contact the group administrator or us for assistance."
-                        )
-                        group_member.user.email_notification(
-                            group_subject, group_message
-                        )
-
-            member_profile.user.log_event(
-                "Membership was cancelled due to Stripe subscription ending", "stripe"
-            )
-
-            subject = f"The membership for {member_profile.get_full_name()} was just cancelled"
-            title = subject
-            message = (
-                f"The Stripe subscription for {member_profile.get_full_name()} ended, so their membership has "
-                f"been cancelled. Their site access has been turned off."
-            )
-            template_vars = {"title": title, "message": message}
+            event = request.data
+
+        # Stripe retries deliveries that time out, so we only store the event
+        # here and process it (once) in a celery worker
+        stored_event = webhooks.store_event(
+            event.get("id") or f"unsigned_{uuid.uuid4()}",
+            event["type"],
+            event.get("created"),
+            event["data"]["object"],
+        )
 
-            send_email_to_admin(
-                subject,
-                template_vars=template_vars,
-                reply_to=member_profile.user.email,
-                user=member_profile.user,
+        if stored_event and stored_event.status == "pending":
+            transaction.on_commit(
+                lambda: process_stripe_events.delay(stored_event.customer_id)
             )
 
         return Response()
@@ -1478,43 +1259,9 @@ class MemberBillingGroupMemberManagement(StripeAPIView):
         """
         Remove Stripe subscription items for a member leaving a billing group.
         """
-        try:
-            from profile.models import BillingGroupMemberAddon
-
-            # Get all locked addon records for this member
-            locked_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=member_profile
-            )
-
-            for locked_addon in locked_addons:
-                if locked_addon.stripe_subscription_item_id:
-                    try:
-                        # Remove the subscription item from Stripe
-                        stripe.SubscriptionItem.delete(
-                            locked_addon.stripe_subscription_item_id,
-                            proration_behavior="create_prorations",
-                        )
-
-                        requesting_user.log_event(
-                            f"Removed Stripe subscription item for {member_profile.get_full_name()} - {locked_addon.addon.name}",
-                            "billing_group",
-                        )
-                    except stripe.error.InvalidRequestError as e:
-                        # Subscription item might already be deleted
-                        requesting_user.log_event(
-                            f"Stripe subscription item for {member_profile.get_full_name()} was already deleted or not found",
-                            "billing_group",
-                        )
-
-                # Clean up the locked addon record
-                locked_addon.delete()
-
-        except Exception as e:
-            requesting_user.log_event(
-                f"Error removing Stripe subscription item for {member_profile.get_full_name()}: {str(e)}",
-                "billing_group",
-            )
-            capture_exception(e)
+        billing_groups.remove_member_addons(
+            billing_group, [member_profile], requesting_user, "billing_group"
+        )
 
     def _lock_addon_pricing_for_invited_member(
         self, member_profile, billing_group, requesting_user
@@ -1524,7 +1271,6 @@ class MemberBillingGroupMemberManagement(StripeAPIView):
         This captures the current additional member addon pricing when someone
         is invited to a billing group.
         """
-        from profile.models import BillingGroupMemberAddon
         from api_admin_tools.models import SubscriptionAddon
         from constance import config
 
@@ -1542,16 +1288,8 @@ class MemberBillingGroupMemberManagement(StripeAPIView):
                     )
 
                     # Create the locked pricing record
-                    BillingGroupMemberAddon.objects.get_or_create(
-                        billing_group=billing_group,
-                        member=member_profile,
-                        addon=current_addon,
-                        defaults={
-                            "locked_cost": current_addon.cost,
-                            "locked_currency": current_addon.currency,
-                            "locked_interval": current_addon.interval,
-                            "locked_interval_count": current_addon.interval_count,
-                        },
+                    billing_groups.lock_addon_pricing(
+                        billing_group, [member_profile], current_addon
                     )
 
                     requesting_user.log_event(
@@ -1583,30 +1321,9 @@ class MemberBillingGroupMemberManagement(StripeAPIView):
         Remove the locked addon pricing records when a member is removed from a billing group
         or when an invitation is cancelled.
         """
-        from profile.models import BillingGroupMemberAddon
-
-        try:
-            # Remove all locked addon pricing for this member in this billing group
-            removed_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=member_profile
-            )
-
-            addon_names = [addon.addon.name for addon in removed_addons]
-            count = removed_addons.count()
-
-            removed_addons.delete()
-
-            if count > 0:
-                requesting_user.log_event(
-                    f"Removed {count} locked addon pricing records for {member_profile.get_full_name()}: {', '.join(addon_names)}",
-                    "billing_group",
-                )
-
-        except Exception as e:
-            requesting_user.log_event(
-                f"Error removing addon pricing for {member_profile.get_full_name()}: {str(e)}",
-                "billing_group",
-            )
+        billing_groups.remove_invitee_addons(
+            billing_group, [member_profile], requesting_user, "billing_group"
+        )
 
     def post(self, request):
         from profile.models import Profile
@@ -1854,6 +1571,7 @@ class MemberBillingGroupInviteResponse(StripeAPIView):
                 cancel_at_period_end=False,
                 proration_behavior="create_prorations",
             )
+            stripe_mirror.save_subscription(cancelled_subscription)
 
             # Update the profile to reflect the cancellation
             member_profile.stripe_subscription_id = None
@@ -1941,6 +1659,7 @@ class MemberBillingGroupInviteResponse(StripeAPIView):
                     quantity=1,
                     proration_behavior="create_prorations",
                 )
+                stripe_mirror.mark_stale(subscription_item.subscription)
 
                 # Store the Stripe subscription item ID in the locked addon record
                 locked_addon.stripe_subscription_item_id = subscription_item.id
@@ -1968,43 +1687,9 @@ class MemberBillingGroupInviteResponse(StripeAPIView):
         """
         Remove Stripe subscription items for a member leaving a billing group.
         """
-        try:
-            from profile.models import BillingGroupMemberAddon
-
-            # Get all locked addon records for this member
-            locked_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=member_profile
-            )
-
-            for locked_addon in locked_addons:
-                if locked_addon.stripe_subscription_item_id:
-                    try:
-                        # Remove the subscription item from Stripe
-                        stripe.SubscriptionItem.delete(
-                            locked_addon.stripe_subscription_item_id,
-                            proration_behavior="create_prorations",
-                        )
-
-                        requesting_user.log_event(
-                            f"Removed Stripe subscription item for {member_profile.get_full_name()} - {locked_addon.addon.name}",
-                            "billing_group",
-                        )
-                    except stripe.error.InvalidRequestError as e:
-                        # Subscription item might already be deleted
-                        requesting_user.log_event(
-                            f"Stripe subscription item for {member_profile.get_full_name()} was already deleted or not found",
-                            "billing_group",
-                        )
-
-                # Clean up the locked addon record
-                locked_addon.delete()
-
-        except Exception as e:
-            requesting_user.log_event(
-                f"Error removing Stripe subscription item for {member_profile.get_full_name()}: {str(e)}",
-                "billing_group",
-            )
-            capture_exception(e)
+        billing_groups.remove_member_addons(
+            billing_group, [member_profile], requesting_user, "billing_group"
+        )
 
     def _lock_addon_pricing_for_member(
         self, member_profile, billing_group, requesting_user
@@ -2014,7 +1699,6 @@ class MemberBillingGroupInviteResponse(StripeAPIView):
         This captures the current additional member addon pricing when someone
         is added to a billing group.
         """
-        from profile.models import BillingGroupMemberAddon
         from api_admin_tools.models import SubscriptionAddon
         from constance import config
 
@@ -2031,16 +1715,8 @@ class MemberBillingGroupInviteResponse(StripeAPIView):
                     )
 
                     # Create the locked pricing record
-                    BillingGroupMemberAddon.objects.get_or_create(
-                        billing_group=billing_group,
-                        member=member_profile,
-                        addon=current_addon,
-                        defaults={
-                            "locked_cost": current_addon.cost,
-                            "locked_currency": current_addon.currency,
-                            "locked_interval": current_addon.interval,
-                            "locked_interval_count": current_addon.interval_count,
-                        },
+                    billing_groups.lock_addon_pricing(
+                        billing_group, [member_profile], current_addon
                     )
 
                     requesting_user.log_event(
@@ -2071,30 +1747,9 @@ class MemberBillingGroupInviteResponse(StripeAPIView):
         """
         Remove the locked addon pricing records when an invitation is declined.
         """
-        from profile.models import BillingGroupMemberAddon
-
-        try:
-            # Remove all locked addon pricing for this member in this billing group
-            removed_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=member_profile
-            )
-
-            addon_names = [addon.addon.name for addon in removed_addons]
-            count = removed_addons.count()
-
-            removed_addons.delete()
-
-            if count > 0:
-                requesting_user.log_event(
-                    f"Removed {count} locked addon pricing records for {member_profile.get_full_name()}: {', '.join(addon_names)}",
-                    "billing_group",
-                )
-
-        except Exception as e:
-            requesting_user.log_event(
-                f"Error removing addon pricing for {member_profile.get_full_name()}: {str(e)}",
-                "billing_group",
-            )
+        billing_groups.remove_invitee_addons(
+            billing_group, [member_profile], requesting_user, "billing_group"
+        )
 
     def post(self, request):
         from profile.models import Profile
@@ -2219,43 +1874,9 @@ class MemberBillingGroupLeave(StripeAPIView):
         billing_group_name = billing_group.name
 
         # Remove Stripe subscription items for this member
-        try:
-            from profile.models import BillingGroupMemberAddon
-
-            # Get all locked addon records for this member
-            locked_addons = BillingGroupMemberAddon.objects.filter(
-                billing_group=billing_group, member=user_profile
-            )
-
-            for locked_addon in locked_addons:
-                if locked_addon.stripe_subscription_item_id:
-                    try:
-                        # Remove the subscription item from Stripe
-                        stripe.SubscriptionItem.delete(
-                            locked_addon.stripe_subscription_item_id,
-                            proration_behavior="create_prorations",
-                        )
-
-                        request.user.log_event(
-                            f"Removed Stripe subscription item when leaving billing group - {locked_addon.addon.name}",
-                            "billing_group",
-                        )
-                    except stripe.error.InvalidRequestError:
-                        # Subscription item might already be deleted
-                        request.user.log_event(
-                            f"Stripe subscription item was already deleted when leaving billing group",
-                            "billing_group",
-                        )
-
-                # Clean up the locked addon record
-                locked_addon.delete()
-
-        except Exception as e:
-            request.user.log_event(
-                f"Error removing Stripe subscription items when leaving billing group: {str(e)}",
-                "billing_group",
-            )
-            capture_exception(e)
+        billing_groups.remove_member_addons(
+            billing_group, [user_profile], request.user, "billing_group"
+        )
 
         # Remove user from billing group
         user_profile.billing_group = None
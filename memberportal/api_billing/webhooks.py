@@ -0,0 +1,301 @@
+"""
+Processing for Stripe webhook events.
+
+StripeWebhook only verifies and stores each event, then queues
+process_stripe_events to handle it in a celery worker. Events are stored by
+their Stripe event id so a retried delivery is only processed once, and each
+customer's events are processed one at a time in the order Stripe created them.
+"""
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from sentry_sdk import capture_exception
+from profile.models import Profile
+from services import metrics
+from services.emails import send_email_to_admin
+from api_billing import billing_groups, stripe_mirror
+from .models import StripeWebhookEvent
+import logging
+import time
+
+logger = logging.getLogger("billing")
+
+# give up on an event after this many failed attempts so it doesn't hold up
+# the rest of the customer's events forever
+STRIPE_EVENT_MAX_ATTEMPTS = 5
+
+
+def store_event(event_id, event_type, created, data):
+    """
+    Saves a webhook event to be processed. Returns the stored event, or None if
+    we've already received an event with this id.
+    """
+    customer_id = data.get("customer") or ""
+    if not isinstance(customer_id, str):
+        # an expanded customer object
+        customer_id = customer_id.get("id", "")
+
+    event, new = StripeWebhookEvent.objects.get_or_create(
+        event_id=event_id,
+        defaults={
+            "event_type": event_type,
+            "customer_id": customer_id,
+            "created": created or int(time.time()),
+            "payload": data,
+            "status": "pending" if customer_id else "ignored",
+        },
+    )
+
+    metrics.stripe_webhook_events_total.labels(
+        type=event_type, status="received" if new else "duplicate"
+    ).inc()
+
+    return event if new else None
+
+
+def handle_event(event_type, data):
+    """Acts on a single Stripe event for one of our members."""
+    try:
+        member_profile = Profile.objects.get(stripe_customer_id=data["customer"])
+
+    except Profile.DoesNotExist as e:
+        capture_exception(e)
+        return
+
+    # Just in case the linked Stripe account also processes other payments we should just ignore a non existent
+    # customer.
+    if not member_profile:
+        return
+
+    # keep our local copy of the member's subscription up to date
+    stripe_mirror.apply_webhook_event(event_type, data)
+
+    if event_type == "invoice.paid":
+        invoice_status = data["status"]
+
+        member_profile.user.log_event("Membership payment received.", "stripe")
+
+        if invoice_status == "paid" and not member_profile.subscription_first_created:
+            member_profile.subscription_first_created = timezone.now()
+            member_profile.save()
+
+        # If they aren't an active member, are allowed to signup, and have paid the invoice
+        # then lets activate their account (this could be a new OR returning member)
+        if (
+            member_profile.state != "active"
+            and member_profile.can_signup()["success"]
+            and invoice_status == "paid"
+        ):
+            subject = "Your payment was successful."
+            message = (
+                "Thanks for making a membership payment using our online payment system. "
+                "You've already met all of the requirements for activating your site access. Please check "
+                "for another email message confirming this was successful."
+            )
+            member_profile.user.email_notification(subject, message)
+
+            # set the subscription status to active
+            member_profile.subscription_status = "active"
+            member_profile.save()
+
+            # Update billing group members if this is a primary member
+            billing_groups.set_member_subscription_status(
+                member_profile, "group_active"
+            )
+
+            # activate their access card
+            member_profile.activate()
+
+            member_profile.user.log_event(
+                "Activated membership because member met all requirements.",
+                "stripe",
+            )
+
+        # If they aren't an active member, are NOT allowed to signup, and have paid the invoice
+        # then we need to let them know and mark the subscription as active
+        # (this could be a new OR returning member that's been too long since induction etc.)
+        elif member_profile.state != "active" and invoice_status == "paid":
+            subject = "Your payment was successful."
+            message = (
+                "Thanks for making a membership payment using our online payment system. "
+                "You haven't yet met all of the requirements for automatically activating your site access. "
+                "You'll receive confirmation that your site access is enabled soon, or we'll be in touch. "
+                "If you don't hear from us soon or require assistance, please contact us."
+            )
+            member_profile.user.email_notification(subject, message)
+
+            member_profile.subscription_status = "active"
+            member_profile.save()
+
+            # Update billing group members if this is a primary member
+            billing_groups.set_member_subscription_status(
+                member_profile, "group_active"
+            )
+
+            # if this is a returning member then send the exec an email (new members have
+            # already had this sent)
+            if member_profile.state != "noob":
+                subject = "Action Required: Verify returning member"
+                title = subject
+                message = (
+                    "An existing member (or someone who clicked 'skip signup I just want an account') "
+                    "has setup a membership subscription. You must now decide whether to enable their site access."
+                )
+                send_email_to_admin(
+                    subject, title, message, reply_to=member_profile.user.email
+                )
+
+            member_profile.user.log_event(
+                "Did not activate membership because member did not meet all requirements.",
+                "stripe",
+            )
+
+        # in all other instances, we don't care about a paid invoice and can ignore it
+
+    if event_type == "invoice.payment_failed":
+        subject = "Your membership payment failed"
+        message = (
+            "Hi there, we tried to collect your membership payment but "
+            "weren't successful. Please update your billing method or contact "
+            "us if you need more time. We'll try again a few times, but if we're unable to "
+            "collect your payment soon, your membership may be cancelled."
+        )
+
+        member_profile.user.email_notification(subject, message)
+        member_profile.user.log_event("Membership payment failed", "stripe")
+
+    if event_type == "customer.subscription.deleted":
+        # the subscription was deleted, so deactivate the member
+        subject = "Your membership has been cancelled"
+        message = (
+            "You will receive another email shortly confirming that your access has been deactivated. Your "
+            "membership was cancelled because we couldn't collect your payment, or you chose not to renew it."
+        )
+
+        member_profile.deactivate()
+        member_profile.user.email_notification(subject, message)
+
+        member_profile.membership_plan = None
+        member_profile.stripe_subscription_id = None
+        member_profile.subscription_status = "inactive"
+        member_profile.save()
+
+        # Update billing group members if this is a primary member
+        group_members = billing_groups.set_member_subscription_status(
+            member_profile, "group_inactive"
+        )
+
+        # Send one batch of notifications to the members of each group
+        members_by_group = {}
+        for group_member in group_members:
+            members_by_group.setdefault(group_member.billing_group, []).append(
+                group_member
+            )
+
+        for billing_group, members in members_by_group.items():
+            group_subject = (
+                f"Billing group '{billing_group.name}' subscription cancelled"
+            )
+            group_message = (
+                f"The subscription for billing group '{billing_group.name}' has been cancelled. "
+                f"Your access may be affected. Please contact the group administrator or us for assistance."
+            )
+            billing_groups.notify_members(members, group_subject, group_message)
+
+        member_profile.user.log_event(
+            "Membership was cancelled due to Stripe subscription ending", "stripe"
+        )
+
+        subject = (
+            f"The membership for {member_profile.get_full_name()} was just cancelled"
+        )
+        title = subject
+        message = (
+            f"The Stripe subscription for {member_profile.get_full_name()} ended, so their membership has "
+            f"been cancelled. Their site access has been turned off."
+        )
+        template_vars = {"title": title, "message": message}
+
+        send_email_to_admin(
+            subject,
+            template_vars=template_vars,
+            reply_to=member_profile.user.email,
+            user=member_profile.user,
+        )
+
+
+def process_customer_events(customer_id):
+    """
+    Processes the pending events for a customer in the order Stripe created
+    them, each in its own transaction. Processing stops at the first event that
+    fails so that later events aren't applied out of order.
+    :return: True if every pending event was processed
+    """
+    while True:
+        with transaction.atomic():
+            # locking the customer's pending events stops another worker
+            # processing them at the same time, but only for one event
+            events = list(
+                StripeWebhookEvent.objects.select_for_update()
+                .filter(customer_id=customer_id, status="pending")
+                .order_by("created", "id")
+            )
+            if not events:
+                return True
+
+            if not process_event(events[0]):
+                return False
+
+
+def process_event(event):
+    """
+    Handles one locked event and records the outcome. Emails, SMS and device
+    syncs from the handler are only sent once the transaction commits, so a
+    failed event can be retried without repeating them.
+    :return: False if the event failed and should be retried
+    """
+    try:
+        with transaction.atomic():
+            handle_event(event.event_type, event.payload)
+
+    except Exception as e:
+        capture_exception(e)
+        logger.error(f"Error processing Stripe event {event.event_id}: {e}")
+        event.attempts += 1
+        event.last_error = str(e)
+        if event.attempts >= STRIPE_EVENT_MAX_ATTEMPTS:
+            event.status = "failed"
+        event.save()
+
+        metrics.stripe_webhook_events_total.labels(
+            type=event.event_type, status="failed"
+        ).inc()
+
+        return event.status != "pending"
+
+    event.status = "processed"
+    event.attempts += 1
+    event.processed = timezone.now()
+    event.save()
+
+    metrics.stripe_webhook_events_total.labels(
+        type=event.event_type, status="processed"
+    ).inc()
+    metrics.stripe_webhook_lag_seconds.observe(max(time.time() - event.created, 0))
+
+    return True
+
+
+def get_customers_with_pending_events(older_than=None):
+    """Returns the customer ids with pending events, oldest first."""
+    pending = StripeWebhookEvent.objects.filter(status="pending")
+    if older_than:
+        pending = pending.filter(received__lt=older_than)
+
+    return list(
+        pending.values("customer_id")
+        .annotate(oldest=Min("created"))
+        .order_by("oldest")
+        .values_list("customer_id", flat=True)
+    )
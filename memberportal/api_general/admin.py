@@ -10,3 +10,10 @@ class AdminLogAdmin(admin.ModelAdmin):
 @admin.register(SiteSession)
 class AdminLogAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ("to_email", "subject", "status", "attempts", "created", "sent_date")
+    list_filter = ("status",)
+    search_fields = ("to_email", "subject")
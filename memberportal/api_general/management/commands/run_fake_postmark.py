@@ -0,0 +1,111 @@
+"""
+Management command to run a local stand-in for the Postmark API.
+
+The server accepts the single and batch email endpoints and records every
+message it receives, so the email outbox can be exercised without sending real
+emails. Point MemberMatters at it with MM_POSTMARK_API_URL.
+
+Usage:
+    python manage.py run_fake_postmark --port 8025
+    MM_POSTMARK_API_URL=http://localhost:8025/ python manage.py runserver
+
+Recipients listed with --inactive are rejected with Postmark's 406 (inactive
+recipient) error and --fail-rate makes a share of messages fail with a
+retryable error.
+"""
+
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import random
+import uuid
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for the Postmark email API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8025)
+        parser.add_argument(
+            "--inactive",
+            nargs="*",
+            default=[],
+            help="Recipients to reject as inactive (Postmark error 406)",
+        )
+        parser.add_argument(
+            "--fail-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of messages to fail with a retryable error",
+        )
+
+    def handle(self, *args, **options):
+        command = self
+        inactive = {email.lower() for email in options["inactive"]}
+        fail_rate = options["fail_rate"]
+        counter = itertools.count(1)
+
+        def process_message(message):
+            to = message.get("To", "")
+            number = next(counter)
+
+            if to.lower() in inactive:
+                response = {
+                    "ErrorCode": 406,
+                    "Message": "You tried to send to a recipient that has been marked as inactive.",
+                }
+            elif random.random() < fail_rate:
+                response = {"ErrorCode": 100, "Message": "Simulated failure."}
+            else:
+                response = {
+                    "ErrorCode": 0,
+                    "Message": "OK",
+                    "MessageID": str(uuid.uuid4()),
+                    "To": to,
+                }
+
+            command.stdout.write(
+                f"#{number} [{response['ErrorCode']}] {to}: {message.get('Subject')}"
+            )
+            return response
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                data = json.loads(self.rfile.read(length) or b"null")
+
+                if self.path.rstrip("/") == "/email/batch":
+                    body = [process_message(message) for message in data]
+                    status = 200
+                elif self.path.rstrip("/") == "/email":
+                    body = process_message(data)
+                    status = 200 if body["ErrorCode"] == 0 else 422
+                else:
+                    body = {"ErrorCode": 404, "Message": "Unknown endpoint."}
+                    status = 404
+
+                encoded = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options["host"], options["port"]), Handler)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fake Postmark API listening on http://{options['host']}:{options['port']}/"
+            )
+        )
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
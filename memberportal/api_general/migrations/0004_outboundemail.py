@@ -0,0 +1,89 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import django_prometheus.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api_general", "0003_auto_20211005_0015"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboundEmail",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("to_email", models.CharField(max_length=255, verbose_name="To")),
+                (
+                    "reply_to",
+                    models.CharField(
+                        blank=True, default="", max_length=255, verbose_name="Reply To"
+                    ),
+                ),
+                ("subject", models.CharField(max_length=500, verbose_name="Subject")),
+                ("html_body", models.TextField(verbose_name="HTML Body")),
+                (
+                    "template_vars",
+                    models.TextField(
+                        blank=True, default="", verbose_name="Template variables"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("sending", "Sending"),
+                            ("sent", "Sent"),
+                            ("failed", "Failed"),
+                            ("dead", "Dead Letter"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, null=True)),
+                (
+                    "provider_message_id",
+                    models.CharField(blank=True, max_length=100, null=True),
+                ),
+                ("created", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "next_attempt",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("sent_date", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="outbound_emails",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Outbound Email",
+                "verbose_name_plural": "Outbound Emails",
+            },
+            bases=(
+                django_prometheus.models.ExportModelOperationsMixin("outbound-email"),
+                models.Model,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="outboundemail",
+            index=models.Index(
+                fields=["status", "next_attempt"], name="api_general_status_86ec61_idx"
+            ),
+        ),
+    ]
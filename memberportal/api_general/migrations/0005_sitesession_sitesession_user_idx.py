@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_general", "0004_outboundemail"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sitesession",
+            index=models.Index(
+                fields=["user", "signout_date"], name="sitesession_user_idx"
+            ),
+        ),
+    ]
@@ -36,6 +36,11 @@ class Kiosk(ExportModelOperationsMixin("kiosk"), models.Model):
 
 
 class SiteSession(ExportModelOperationsMixin("site-session"), models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "signout_date"], name="sitesession_user_idx"),
+        ]
+
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     signin_date = models.DateTimeField(default=timezone.now)
@@ -57,3 +62,47 @@ class EmailVerificationToken(
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     creation_date = models.DateTimeField(default=timezone.now)
     verification_token = models.UUIDField(default=uuid4)
+
+
+class OutboundEmail(ExportModelOperationsMixin("outbound-email"), models.Model):
+    """
+    A rendered email waiting in (or processed by) the outbox. Emails are queued
+    by services.emails and delivered in batches by a celery worker.
+    """
+
+    STATUSES = (
+        ("queued", "Queued"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+        ("dead", "Dead Letter"),
+    )
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="outbound_emails",
+    )
+    to_email = models.CharField("To", max_length=255)
+    reply_to = models.CharField("Reply To", max_length=255, blank=True, default="")
+    subject = models.CharField("Subject", max_length=500)
+    html_body = models.TextField("HTML Body")
+    template_vars = models.TextField("Template variables", blank=True, default="")
+    status = models.CharField(max_length=10, choices=STATUSES, default="queued")
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    provider_message_id = models.CharField(max_length=100, blank=True, null=True)
+    created = models.DateTimeField(default=timezone.now)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        indexes = [models.Index(fields=["status", "next_attempt"])]
+
+    def __str__(self):
+        return f"{self.to_email} - {self.subject} ({self.status})"
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from constance import config
+from constance.signals import config_updated
+from django.core.cache import cache
+from django.dispatch import receiver
+
+logger = logging.getLogger("general")
+
+PACKAGE_JSON_PATH = "../package.json"
+
+# The generation counter lives in the django cache so that a config change in
+# one process invalidates the document in every process sharing that cache.
+# SITE_CONFIG_MAX_AGE is a safety net for deployments without a shared cache.
+SITE_CONFIG_GENERATION_KEY = "api_general:site_config_generation"
+SITE_CONFIG_MAX_AGE = 300
+
+
+class SiteConfigDocument:
+    """
+    A prebuilt, serialised copy of the public site config document. A variant is
+    kept for both logged in and anonymous requests so that serving a request
+    is a dictionary lookup.
+    """
+
+    def __init__(self, document, generation, version_mtime):
+        self.generation = generation
+        self.version_mtime = version_mtime
+        self.built_at = time.monotonic()
+        self.variants = {}
+
+        for logged_in in (True, False):
+            body = json.dumps(
+                {**document, "loggedIn": logged_in}, separators=(",", ":")
+            ).encode("utf-8")
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            self.variants[logged_in] = (body, etag)
+
+    def get(self, logged_in):
+        return self.variants[bool(logged_in)]
+
+
+_document = None
+_lock = threading.Lock()
+
+
+def _get_package_mtime():
+    try:
+        return os.stat(PACKAGE_JSON_PATH).st_mtime
+    except OSError:
+        return None
+
+
+def _get_generation():
+    return cache.get(SITE_CONFIG_GENERATION_KEY, 0)
+
+
+def _get_version():
+    try:
+        with open(PACKAGE_JSON_PATH) as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError) as e:
+        logger.error(f"Unable to read version from package.json: {e}")
+        return None
+
+
+def build_site_config():
+    """
+    Builds the site config document used to customise the front end. This
+    reads every constance value it needs once, so it should only be called when
+    the cached document is stale.
+    """
+    features = {
+        "memberbucks_topup_options": json.loads(
+            config.STRIPE_MEMBERBUCKS_TOPUP_OPTIONS
+        ),
+        "enableProxyVoting": config.ENABLE_PROXY_VOTING,
+        "enableStripe": config.ENABLE_STRIPE
+        and len(config.STRIPE_PUBLISHABLE_KEY) > 0
+        and len(config.STRIPE_SECRET_KEY) > 0,
+        "enableMembershipPayments": config.ENABLE_STRIPE
+        and config.ENABLE_STRIPE_MEMBERSHIP_PAYMENTS,
+        "enableMemberBucks": config.ENABLE_MEMBERBUCKS,
+        "signup": {
+            "inductionLink": config.INDUCTION_ENROL_LINK,
+            "requireAccessCard": config.REQUIRE_ACCESS_CARD,
+            "postInductionUrl": config.POST_INDUCTION_URL,
+            "collectVehicleRegistrationPlate": config.COLLECT_VEHICLE_REGISTRATION_PLATE,
+        },
+        "enableWebcams": config.ENABLE_WEBCAMS,
+        "siteBanner": config.SITE_BANNER,
+        "enableSiteSignIn": config.ENABLE_PORTAL_SITE_SIGN_IN,
+        "enableMembersOnSite": config.ENABLE_PORTAL_MEMBERS_ON_SITE,
+        "sms": {
+            "enable": config.SMS_ENABLE,
+            "senderId": config.SMS_SENDER_ID,
+            "footer": config.SMS_FOOTER,
+        },
+        "enableStatsPage": config.ENABLE_STATS_PAGE,
+    }
+
+    keys = {"stripePublishableKey": config.STRIPE_PUBLISHABLE_KEY}
+
+    try:
+        homepage_cards = json.loads(config.HOME_PAGE_CARDS)
+    except:
+        homepage_cards = [
+            {
+                "title": "Error loading configuration",
+                "description": "There was an error loading the home page cards configuration. Please try re-saving the configuration in the admin panel.",
+                "icon": "mdi-alert",
+                "url": "#",
+                "btn_text": "",
+            },
+        ]
+
+    try:
+        webcam_links = json.loads(config.WEBCAM_PAGE_URLS)
+    except:
+        webcam_links = [
+            ["Error Loading Webcam Configuration", ""],
+        ]
+
+    return {
+        "version": _get_version(),
+        "general": {
+            "siteName": config.SITE_NAME,
+            "siteOwner": config.SITE_OWNER,
+            "siteLocaleCurrency": config.SITE_LOCALE_CURRENCY,
+        },
+        "contact": {
+            "admin": config.EMAIL_ADMIN,
+            "sysadmin": config.EMAIL_SYSADMIN,
+            "address": config.SITE_MAIL_ADDRESS,
+        },
+        "images": {
+            "siteLogo": config.SITE_LOGO,
+            "statsCard": config.STATS_CARD_IMAGE,
+            "siteFavicon": config.SITE_FAVICON,
+            "menuBackground": config.MENU_BACKGROUND,
+        },
+        "theme": {
+            "themePrimary": config.THEME_PRIMARY,
+            "themeToolbar": config.THEME_TOOLBAR,
+            "themeAccent": config.THEME_ACCENT,
+        },
+        "homepageCards": homepage_cards,
+        "webcamLinks": webcam_links,
+        "keys": keys,
+        "features": features,
+        "analyticsId": config.GOOGLE_ANALYTICS_MEASUREMENT_ID,
+        "sentryDSN": config.SENTRY_DSN_FRONTEND,
+    }
+
+
+def _is_stale(document, generation, version_mtime):
+    return (
+        document is None
+        or document.generation != generation
+        or document.version_mtime != version_mtime
+        or time.monotonic() - document.built_at > SITE_CONFIG_MAX_AGE
+    )
+
+
+def get_site_config():
+    """
+    Returns the current SiteConfigDocument, rebuilding it if the config or the
+    version has changed since it was last built.
+    """
+    global _document
+
+    generation = _get_generation()
+    version_mtime = _get_package_mtime()
+    document = _document
+
+    if _is_stale(document, generation, version_mtime):
+        with _lock:
+            document = _document
+            if _is_stale(document, generation, version_mtime):
+                logger.debug("Rebuilding the site config document.")
+                document = SiteConfigDocument(
+                    build_site_config(), generation, version_mtime
+                )
+                _document = document
+
+    return document
+
+
+def invalidate_site_config():
+    """Marks the site config document as stale in every process."""
+    global _document
+
+    try:
+        cache.incr(SITE_CONFIG_GENERATION_KEY)
+    except ValueError:
+        cache.set(SITE_CONFIG_GENERATION_KEY, 1, timeout=None)
+    _document = None
+
+
+@receiver(config_updated)
+def on_config_updated(sender, key, old_value, new_value, **kwargs):
+    invalidate_site_config()
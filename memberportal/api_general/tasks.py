@@ -1,9 +1,23 @@
 from celery import signals
+from membermatters.celeryapp import app
+from services.emails import send_queued_emails
 import logging
 
 logger = logging.getLogger("api_general:tasks")
 
 
+@app.on_after_finalize.connect
+def setup_periodic_tasks(sender, **kwargs):
+    # picks up emails that are due for a retry or were queued while no
+    # delivery run was scheduled
+    sender.add_periodic_task(
+        60,
+        send_queued_emails.s(),
+        expires=60,
+        name="celery_send_queued_emails",
+    )
+
+
 @signals.task_failure.connect
 @signals.task_revoked.connect
 def on_task_failure(**kwargs):
@@ -12,10 +12,13 @@ import datetime
 from pytz import UTC as utc
 from profile.models import User, Profile
 
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
 from rest_framework import status, permissions, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import Kiosk, SiteSession, EmailVerificationToken
+from .site_config import get_site_config
 from services.discord import post_kiosk_swipe_to_discord
 from services.slack import post_kiosk_swipe_to_slack
 import base64
@@ -34,94 +37,21 @@ class GetConfig(APIView):
     permission_classes = (permissions.AllowAny,)
 
     def get(self, request):
-        features = {
-            "memberbucks_topup_options": json.loads(
-                config.STRIPE_MEMBERBUCKS_TOPUP_OPTIONS
-            ),
-            "enableProxyVoting": config.ENABLE_PROXY_VOTING,
-            "enableStripe": config.ENABLE_STRIPE
-            and len(config.STRIPE_PUBLISHABLE_KEY) > 0
-            and len(config.STRIPE_SECRET_KEY) > 0,
-            "enableMembershipPayments": config.ENABLE_STRIPE
-            and config.ENABLE_STRIPE_MEMBERSHIP_PAYMENTS,
-            "enableMemberBucks": config.ENABLE_MEMBERBUCKS,
-            "signup": {
-                "inductionLink": config.INDUCTION_ENROL_LINK,
-                "requireAccessCard": config.REQUIRE_ACCESS_CARD,
-                "postInductionUrl": config.POST_INDUCTION_URL,
-                "collectVehicleRegistrationPlate": config.COLLECT_VEHICLE_REGISTRATION_PLATE,
-            },
-            "enableWebcams": config.ENABLE_WEBCAMS,
-            "siteBanner": config.SITE_BANNER,
-            "enableSiteSignIn": config.ENABLE_PORTAL_SITE_SIGN_IN,
-            "enableMembersOnSite": config.ENABLE_PORTAL_MEMBERS_ON_SITE,
-            "sms": {
-                "enable": config.SMS_ENABLE,
-                "senderId": config.SMS_SENDER_ID,
-                "footer": config.SMS_FOOTER,
-            },
-            "enableStatsPage": config.ENABLE_STATS_PAGE,
-        }
-
-        keys = {"stripePublishableKey": config.STRIPE_PUBLISHABLE_KEY}
-
-        with open("../package.json") as f:
-            package = json.load(f)
-            version = package.get("version")
+        document = get_site_config()
+        body, etag = document.get(request.user.is_authenticated)
 
-        try:
-            homepage_cards = json.loads(config.HOME_PAGE_CARDS)
-        except:
-            homepage_cards = [
-                {
-                    "title": "Error loading configuration",
-                    "description": "There was an error loading the home page cards configuration. Please try re-saving the configuration in the admin panel.",
-                    "icon": "mdi-alert",
-                    "url": "#",
-                    "btn_text": "",
-                },
-            ]
-
-        try:
-            webcam_links = json.loads(config.WEBCAM_PAGE_URLS)
-        except:
-            webcam_links = [
-                ["Error Loading Webcam Configuration", ""],
-            ]
+        if etag in request.META.get("HTTP_IF_NONE_MATCH", ""):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type="application/json")
 
-        response = {
-            "version": version,
-            "loggedIn": request.user.is_authenticated,
-            "general": {
-                "siteName": config.SITE_NAME,
-                "siteOwner": config.SITE_OWNER,
-                "siteLocaleCurrency": config.SITE_LOCALE_CURRENCY,
-            },
-            "contact": {
-                "admin": config.EMAIL_ADMIN,
-                "sysadmin": config.EMAIL_SYSADMIN,
-                "address": config.SITE_MAIL_ADDRESS,
-            },
-            "images": {
-                "siteLogo": config.SITE_LOGO,
-                "statsCard": config.STATS_CARD_IMAGE,
-                "siteFavicon": config.SITE_FAVICON,
-                "menuBackground": config.MENU_BACKGROUND,
-            },
-            "theme": {
-                "themePrimary": config.THEME_PRIMARY,
-                "themeToolbar": config.THEME_TOOLBAR,
-                "themeAccent": config.THEME_ACCENT,
-            },
-            "homepageCards": homepage_cards,
-            "webcamLinks": webcam_links,
-            "keys": keys,
-            "features": features,
-            "analyticsId": config.GOOGLE_ANALYTICS_MEASUREMENT_ID,
-            "sentryDSN": config.SENTRY_DSN_FRONTEND,
-        }
+        # the document varies on the session (loggedIn) so it must not be stored
+        # by shared caches, but browsers can revalidate cheaply with the ETag
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ("Cookie", "Authorization"))
 
-        return Response(response)
+        return response
 
 
 class Login(APIView):
@@ -284,7 +214,7 @@ class LoginKiosk(APIView):
 
         # rfid matches a user so log them in
         if user is not None:
-            login(request, user)
+            login(request, user, backend="membermatters.authentication.ProfileBackend")
             return Response(status=status.HTTP_200_OK)
 
         else:
@@ -592,11 +522,7 @@ class SiteSignIn(APIView):
         SiteSession.objects.create(user=request.user, guests=guests)
         post_kiosk_swipe_to_discord(request.user.profile.get_full_name(), True)
 
-        for door in request.user.profile.doors.all():
-            door.sync()
-
-        for interlock in request.user.profile.interlocks.all():
-            interlock.sync()
+        request.user.profile.sync_access()
 
         return Response()
 
@@ -617,11 +543,7 @@ class SiteSignOut(APIView):
         if config.ENABLE_DISCORD_INTEGRATION and config.SLACK_DOOR_WEBHOOK:
             post_kiosk_swipe_to_discord(request.user.profile.get_full_name(), False)
 
-        for door in request.user.profile.doors.all():
-            door.sync()
-
-        for interlock in request.user.profile.interlocks.all():
-            interlock.sync()
+        request.user.profile.sync_access()
 
         return Response()
 
@@ -786,7 +708,11 @@ class VerifyEmail(APIView):
             verification_token.user.save()
 
             # auto log the user in after verifying their email
-            login(request, verification_token.user)
+            login(
+                request,
+                verification_token.user,
+                backend="membermatters.authentication.ProfileBackend",
+            )
 
             # delete the verification token so it can't be used again
             verification_token.delete()
@@ -1,5 +1,6 @@
 from .models import Meeting, ProxyVote
-from profile.models import Profile
+from profile.models import Profile, User
+from django.db.models import Count, Prefetch
 from django.utils.timezone import make_aware, localtime
 from datetime import datetime
 
@@ -20,7 +21,39 @@ class Meetings(APIView):
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request):
-        meetings = Meeting.objects.all()
+        # everything is loaded up front so the number of queries doesn't grow
+        # with the number of meetings, attendees or proxies
+        meetings = (
+            Meeting.objects.annotate(attendee_count=Count("attendees", distinct=True))
+            .prefetch_related(
+                Prefetch(
+                    "attendees",
+                    queryset=User.objects.select_related("profile").only(
+                        "id", "profile__first_name", "profile__last_name"
+                    ),
+                ),
+                Prefetch(
+                    "proxyvote_set",
+                    queryset=ProxyVote.objects.select_related(
+                        "user__profile", "proxy_user__profile"
+                    ),
+                ),
+            )
+            .order_by("-date", "-id")
+        )
+        total = None
+
+        # historical meetings can be paged through with ?limit= and ?offset=
+        limit = request.GET.get("limit")
+        if limit is not None:
+            try:
+                limit = max(int(limit), 0)
+                offset = max(int(request.GET.get("offset", 0)), 0)
+            except ValueError:
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+
+            total = Meeting.objects.count()
+            meetings = meetings[offset : offset + limit]
 
         def get_attendee(attendee):
             return attendee.profile.get_full_name()
@@ -39,14 +72,18 @@ class Meetings(APIView):
                 "chair": meeting.chair,
                 "type": meeting.get_type(),
                 "typeValue": meeting.type,
-                "attendeeCount": meeting.attendees.count(),
+                "attendeeCount": meeting.attendee_count,
                 "attendees": list(map(get_attendee, meeting.attendees.all())),
                 "proxyList": list(map(get_proxy, meeting.proxyvote_set.all())),
             }
 
         meetings_object = list(map(get_meeting, meetings))
 
-        return Response(meetings_object)
+        response = Response(meetings_object)
+        if total is not None:
+            response["X-Total-Count"] = total
+
+        return response
 
     def post(self, request):
         body = request.data
@@ -88,7 +125,9 @@ class Proxies(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        proxies = ProxyVote.objects.filter(user=request.user)
+        proxies = ProxyVote.objects.filter(user=request.user).select_related(
+            "proxy_user__profile", "meeting"
+        )
 
         def get_proxy_details(proxy):
             return {
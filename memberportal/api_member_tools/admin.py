@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import *
+
+
+@admin.register(IssueReport)
+class IssueReportAdmin(admin.ModelAdmin):
+    list_display = ("title", "user", "status", "attempts", "created")
+    list_filter = ("status",)
+    search_fields = ("title",)
@@ -0,0 +1,224 @@
+"""
+Forwards reported issues to the configured issue trackers (Vikunja and
+Trello).
+
+Reports are saved locally first and forwarded by a Celery task, so a slow or
+unreachable tracker doesn't hold up the member's request. Each tracker's URL
+is saved as soon as it's created, so a retry only sends the report to the
+trackers that haven't got it yet.
+"""
+
+from constance import config
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from services import discord
+import requests
+import logging
+
+logger = logging.getLogger("api_member_tools")
+
+# (connect, read) timeouts for tracker requests
+TIMEOUT = (5, 20)
+
+_session = None
+
+
+class IssueTrackerError(Exception):
+    pass
+
+
+def get_session():
+    """Returns a pooled HTTP session shared by every tracker request."""
+    global _session
+
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+
+    return _session
+
+
+def vikunja_enabled():
+    return config.REPORT_ISSUE_ENABLE_VIKUNJA and bool(
+        config.VIKUNJA_DEFAULT_PROJECT_ID
+    )
+
+
+def create_vikunja_task(title, description):
+    """Creates a Vikunja task for an issue and returns its URL."""
+    vikunja_project_id = int(config.VIKUNJA_DEFAULT_PROJECT_ID)
+    vikunja_label_id = config.VIKUNJA_DEFAULT_LABEL_ID
+    headers = {"Authorization": "Bearer " + config.VIKUNJA_API_TOKEN}
+
+    task_body = {
+        "max_right": None,
+        "id": 0,
+        "title": title,
+        "description": description,
+        "done": False,
+        "done_at": None,
+        "priority": 0,
+        "labels": [],
+        "assignees": [],
+        "due_date": None,
+        "start_date": None,
+        "end_date": None,
+        "repeat_after": 0,
+        "repeat_from_current_date": False,
+        "repeat_mode": 0,
+        "reminders": [],
+        "parent_task_id": 0,
+        "hex_color": "",
+        "percent_done": 0,
+        "related_tasks": {},
+        "attachments": [],
+        "cover_image_attachment_id": None,
+        "identifier": "",
+        "index": 0,
+        "is_favorite": False,
+        "subscription": None,
+        "position": 64,
+        "reactions": {},
+        "created_by": {
+            "max_right": None,
+            "id": 0,
+            "email": "",
+            "username": "",
+            "name": "",
+            "exp": 0,
+            "type": 0,
+            "created": None,
+            "updated": None,
+            "settings": {
+                "max_right": None,
+                "name": "",
+                "email_reminders_enabled": False,
+                "discoverable_by_name": False,
+                "discoverable_by_email": True,
+                "overdue_tasks_reminders_enabled": False,
+                "week_start": 0,
+                "timezone": "",
+                "language": "en",
+                "frontend_settings": {
+                    "play_sound_when_done": False,
+                    "quick_add_magic_mode": "vikunja",
+                    "color_schema": "auto",
+                    "default_view": "first",
+                },
+            },
+        },
+        "created": "1970-01-01T00:00:00.000Z",
+        "updated": "1970-01-01T00:00:00.000Z",
+        "project_id": vikunja_project_id,
+        "bucket_id": 0,
+        "reminder_dates": None,
+    }
+
+    task_response = get_session().put(
+        f"{config.VIKUNJA_API_URL}/api/v1/projects/{vikunja_project_id}/tasks",
+        json=task_body,
+        headers=headers,
+        timeout=TIMEOUT,
+    )
+
+    if task_response.status_code != 201:
+        raise IssueTrackerError(
+            f"Failed to create Vikunja task ({task_response.status_code}): {task_response.text}"
+        )
+
+    task_id = task_response.json()["id"]
+
+    if vikunja_label_id:
+        # the task was created, so a missing label isn't worth retrying for
+        try:
+            label_response = get_session().put(
+                f"{config.VIKUNJA_API_URL}/api/v1/tasks/{task_id}/labels",
+                json={
+                    "label_id": int(vikunja_label_id),
+                    "created": "1970-01-01T00:00:00.000Z",
+                },
+                headers=headers,
+                timeout=TIMEOUT,
+            )
+
+            if label_response.status_code != 201:
+                logger.warning(
+                    f"Failed to add label to Vikunja task {task_id}: %s",
+                    label_response.text,
+                )
+
+        except Exception:
+            logger.exception(f"Failed to add label to Vikunja task {task_id}.")
+
+    return f"{config.VIKUNJA_API_URL}/tasks/{task_id}"
+
+
+def create_trello_card(title, description):
+    """Creates a Trello card for an issue and returns its URL."""
+    response = get_session().post(
+        "https://api.trello.com/1/cards",
+        params={
+            "name": title,
+            "desc": description,
+            "pos": "top",
+            "idList": config.TRELLO_ID_LIST,
+            "keepFromSource": "all",
+            "key": config.TRELLO_API_KEY,
+            "token": config.TRELLO_API_TOKEN,
+        },
+        timeout=TIMEOUT,
+    )
+
+    if response.status_code != 200:
+        raise IssueTrackerError(
+            f"Failed to create Trello card ({response.status_code}): {response.text}"
+        )
+
+    return response.json()["shortUrl"]
+
+
+def forward_report(report):
+    """
+    Sends a report to each enabled tracker that doesn't have it yet. The
+    report is saved after each tracker so a failure doesn't lose earlier ones.
+    :return: a list of error messages (empty if every tracker succeeded)
+    """
+    errors = []
+    description = report.user.profile.get_full_name() + ": " + report.description
+    trackers = [
+        (vikunja_enabled(), "vikunja_task_url", create_vikunja_task),
+        (config.REPORT_ISSUE_ENABLE_TRELLO, "trello_card_url", create_trello_card),
+    ]
+
+    for enabled, url_field, create in trackers:
+        if not enabled or getattr(report, url_field):
+            continue
+
+        try:
+            setattr(report, url_field, create(report.title, description))
+            report.save(update_fields=[url_field])
+
+        except Exception as e:
+            logger.exception(f"Failed to forward reported issue {report.id}.")
+            errors.append(str(e))
+
+    return errors
+
+
+def finish_report(report, errors):
+    """Records the outcome of forwarding a report and posts it to Discord."""
+    report.status = "failed" if errors else "submitted"
+    report.last_error = "\n".join(errors)
+    report.forwarded = timezone.now()
+    report.save(update_fields=["status", "last_error", "forwarded"])
+
+    if config.REPORT_ISSUE_ENABLE_DISCORD:
+        discord.post_reported_issue_to_discord(
+            report.user.profile.get_full_name(),
+            report.title,
+            report.description,
+            report.vikunja_task_url or None,
+            report.trello_card_url or None,
+        )
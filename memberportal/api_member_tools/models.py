@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import models
+from django_prometheus.models import ExportModelOperationsMixin
+
+
+class IssueReport(ExportModelOperationsMixin("issue-report"), models.Model):
+    """
+    An issue reported by a member. It's saved before being forwarded to the
+    configured issue trackers so the member doesn't wait on them.
+    """
+
+    STATUSES = [
+        ("pending", "Pending"),
+        ("submitted", "Submitted"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    title = models.CharField(max_length=250)
+    description = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUSES, default="pending")
+    vikunja_task_url = models.URLField(max_length=500, blank=True, default="")
+    trello_card_url = models.URLField(max_length=500, blank=True, default="")
+    emailed = models.BooleanField(default=False)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    forwarded = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+    def get_url(self):
+        return self.vikunja_task_url or self.trello_card_url or None
+
+    def get_object(self):
+        return {
+            "id": self.id,
+            "title": self.title,
+            "status": self.status,
+            "url": self.get_url(),
+            "vikunjaTaskUrl": self.vikunja_task_url or None,
+            "trelloCardUrl": self.trello_card_url or None,
+            "created": self.created,
+        }
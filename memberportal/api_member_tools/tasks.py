@@ -0,0 +1,71 @@
+from membermatters.celeryapp import app
+from django.utils import timezone
+from api_member_tools import issues
+from api_member_tools.models import IssueReport
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger("api_member_tools")
+
+# reports still pending after this long have probably lost their task
+PENDING_REQUEUE_AFTER = timedelta(hours=1)
+
+
+@app.on_after_finalize.connect
+def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(
+        3600,
+        forward_pending_issue_reports.s(),
+        expires=3600,
+        name="celery_forward_pending_issue_reports",
+    )
+
+
+@app.task(bind=True, max_retries=6)
+def forward_issue_report(self, report_id):
+    """
+    Forwards a reported issue to the configured issue trackers, retrying with
+    exponential backoff (about an hour in total) if any of them fail.
+    """
+    report = (
+        IssueReport.objects.select_related("user__profile")
+        .filter(id=report_id, status="pending")
+        .first()
+    )
+    if report is None:
+        return False
+
+    report.attempts += 1
+    report.save(update_fields=["attempts"])
+
+    errors = issues.forward_report(report)
+
+    if errors and self.request.retries < self.max_retries:
+        report.last_error = "\n".join(errors)
+        report.save(update_fields=["last_error"])
+        raise self.retry(countdown=30 * 2**self.request.retries)
+
+    issues.finish_report(report, errors)
+
+    if errors:
+        logger.error(
+            f"Gave up forwarding reported issue {report.id} after {report.attempts} attempts."
+        )
+        return False
+
+    return True
+
+
+@app.task
+def forward_pending_issue_reports():
+    """Queues forwarding for reports whose task was lost (eg. a worker restart)."""
+    report_ids = list(
+        IssueReport.objects.filter(
+            status="pending", created__lt=timezone.now() - PENDING_REQUEUE_AFTER
+        ).values_list("id", flat=True)
+    )
+
+    for report_id in report_ids:
+        forward_issue_report.delay(report_id)
+
+    return len(report_ids)
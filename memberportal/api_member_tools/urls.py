@@ -5,6 +5,11 @@ urlpatterns = [
     path("api/tools/swipes/", views.SwipesList.as_view(), name="SwipesList"),
     path("api/tools/lastseen/", views.Lastseen.as_view(), name="Lastseen"),
     path("api/tools/issue/", views.IssueDetail.as_view(), name="IssueDetail"),
+    path(
+        "api/tools/issue/<int:report_id>/",
+        views.IssueStatus.as_view(),
+        name="IssueStatus",
+    ),
     path("api/tools/meetings/", views.MeetingList.as_view(), name="MeetingList"),
     path("api/tools/members/", views.Members.as_view(), name="api_members"),
 ]
@@ -0,0 +1,90 @@
+"""
+Thins out old Metric rows.
+
+calculate_metrics stores a row for each metric every METRICS_INTERVAL, but the
+statistics page only shows the last row of each day. Rows older than
+METRICS_FULL_RESOLUTION_DAYS are thinned to the last row of each (UTC) day, and
+rows older than METRICS_DAILY_RESOLUTION_DAYS to the last row of each week.
+Running it again only touches rows that have aged into a coarser resolution.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from api_metrics.models import Metric
+from services import metrics
+import logging
+
+logger = logging.getLogger("metrics")
+
+BATCH_SIZE = 1000
+
+
+def _get_bucket(creation_date, weekly_before):
+    day = creation_date.astimezone(timezone.utc).date()
+
+    if weekly_before and creation_date < weekly_before:
+        return ("weekly",) + tuple(day.isocalendar()[:2])
+
+    return ("daily", day)
+
+
+def plan_downsampling(now=None):
+    """
+    Works out which old metric rows are redundant.
+    :return: {resolution: [metric ids to delete]}
+    """
+    now = now or timezone.now()
+    daily_before = now - timedelta(days=settings.METRICS_FULL_RESOLUTION_DAYS)
+    weekly_before = None
+    if settings.METRICS_DAILY_RESOLUTION_DAYS:
+        weekly_before = now - timedelta(days=settings.METRICS_DAILY_RESOLUTION_DAYS)
+
+    rows = (
+        Metric.objects.filter(creation_date__lt=daily_before)
+        .order_by("name", "creation_date", "id")
+        .values_list("id", "name", "creation_date")
+    )
+
+    redundant = {"daily": [], "weekly": []}
+    previous_id = previous_bucket = None
+
+    for metric_id, name, creation_date in rows.iterator(chunk_size=BATCH_SIZE):
+        bucket = (name,) + _get_bucket(creation_date, weekly_before)
+
+        # rows are in order, so only the last row of each bucket is kept
+        if bucket == previous_bucket:
+            redundant[bucket[1]].append(previous_id)
+
+        previous_id, previous_bucket = metric_id, bucket
+
+    return redundant
+
+
+def downsample_metrics(now=None, dry_run=False):
+    """
+    Deletes the redundant old metric rows, in batches.
+    :return: {resolution: rows reclaimed (or that would be with dry_run)}
+    """
+    redundant = plan_downsampling(now)
+
+    if not dry_run:
+        for resolution, metric_ids in redundant.items():
+            for i in range(0, len(metric_ids), BATCH_SIZE):
+                with transaction.atomic():
+                    Metric.objects.filter(
+                        id__in=metric_ids[i : i + BATCH_SIZE]
+                    ).delete()
+
+            metrics.metric_rows_downsampled_total.labels(resolution=resolution).inc(
+                len(metric_ids)
+            )
+
+    reclaimed = {resolution: len(ids) for resolution, ids in redundant.items()}
+    logger.info(
+        f"Downsampled metrics, {sum(reclaimed.values())} rows reclaimed "
+        f"({reclaimed['daily']} daily, {reclaimed['weekly']} weekly){' (dry run)' if dry_run else ''}."
+    )
+
+    return reclaimed
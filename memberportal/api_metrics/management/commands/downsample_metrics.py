@@ -0,0 +1,36 @@
+"""
+Management command to thin out old Metric rows.
+
+Rows older than METRICS_FULL_RESOLUTION_DAYS are reduced to the last row of
+each day, and rows older than METRICS_DAILY_RESOLUTION_DAYS to the last row of
+each week. This also runs nightly as a Celery beat job.
+
+Usage:
+    python manage.py downsample_metrics --dry-run
+    python manage.py downsample_metrics
+"""
+
+from django.core.management.base import BaseCommand
+from api_metrics.downsampling import downsample_metrics
+
+
+class Command(BaseCommand):
+    help = "Thin out old metric rows to one per day (and later one per week)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show how many rows would be reclaimed without deleting them",
+        )
+
+    def handle(self, *args, **options):
+        reclaimed = downsample_metrics(dry_run=options["dry_run"])
+        verb = "would be reclaimed" if options["dry_run"] else "reclaimed"
+
+        for resolution, rows in reclaimed.items():
+            self.stdout.write(f"{resolution}: {rows} rows {verb}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{sum(reclaimed.values())} metric rows {verb}.")
+        )
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api_metrics", "0003_alter_metric_name"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="metric",
+            index=models.Index(
+                fields=["name", "creation_date"], name="metric_name_date_idx"
+            ),
+        ),
+    ]
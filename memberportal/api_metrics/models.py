@@ -39,5 +39,10 @@ class Metric(ExportModelOperationsMixin("metric"), models.Model):
         default=None,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["name", "creation_date"], name="metric_name_date_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.creation_date}"
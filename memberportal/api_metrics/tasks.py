@@ -1,5 +1,6 @@
 from membermatters.celeryapp import app
 from api_metrics.metrics import *
+from api_metrics.downsampling import downsample_metrics
 
 import requests
 from constance import config
@@ -28,6 +29,13 @@ def setup_periodic_tasks(sender, **kwargs):
             name="celery_calculate_metrics",
         )
 
+    sender.add_periodic_task(
+        3600 * 24,
+        downsample_old_metrics.s(),
+        expires=3600,
+        name="celery_downsample_old_metrics",
+    )
+
 
 @app.task
 def calculate_metrics():
@@ -45,3 +53,8 @@ def calculate_metrics():
 
     except Exception as e:
         logger.error(f"Failed to update Prometheus metrics: {e}")
+
+
+@app.task
+def downsample_old_metrics():
+    return downsample_metrics()
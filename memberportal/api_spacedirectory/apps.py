@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ApiSpacedirectoryConfig(AppConfig):
+    name = "api_spacedirectory"
+
+    def ready(self):
+        # connects the signals that invalidate the cached spaceapi document
+        import api_spacedirectory.spaceapi
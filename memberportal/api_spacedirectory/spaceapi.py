@@ -0,0 +1,155 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from constance import config
+from constance.signals import config_updated
+from rest_framework.utils.encoders import JSONEncoder
+from .models import SpaceAPI, SpaceAPISensor, SpaceAPISensorProperties
+from profile.models import Profile
+from api_general.models import SiteSession
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger("api_spacedirectory")
+
+SPACEAPI_CACHE_KEY = "api_spacedirectory:spaceapi_document"
+
+# Everything that affects the document invalidates it, so this is only a safety
+# net for changes made without signals (eg. queryset.update()).
+SPACEAPI_CACHE_TIMEOUT = 300
+
+
+def build_spaceapi_document():
+    """
+    Builds the spaceapi compliant status document.
+    :return: the document as a dict
+    """
+    spaceapi = {
+        "space": config.SITE_OWNER,
+        "logo": config.SITE_LOGO,
+        "url": config.MAIN_SITE_URL,
+        "contact": {
+            "email": config.SPACE_DIRECTORY_CONTACT_EMAIL,
+            "twitter": config.SPACE_DIRECTORY_CONTACT_TWITTER,
+            "phone": config.SPACE_DIRECTORY_CONTACT_PHONE,
+            "facebook": config.SPACE_DIRECTORY_CONTACT_FACEBOOK,
+        },
+        "spacefed": {
+            "spacenet": config.SPACE_DIRECTORY_FED_SPACENET,
+            "spacesaml": config.SPACE_DIRECTORY_FED_SPACESAML,
+            "spacephone": config.SPACE_DIRECTORY_FED_SPACEPHONE,
+        },
+        "projects": json.loads(config.SPACE_DIRECTORY_PROJECTS),
+        "issue_report_channels": ["email"],
+    }
+
+    # Get the default data
+    spaceapi_data = SpaceAPI.objects.get()
+
+    # Create an empty dict to add the sensor data to
+    sensor_data = {}
+
+    # Iterate over the sensors (and their prefetched properties) and update the
+    # dict as appropriate
+    for sensor in SpaceAPISensor.objects.prefetch_related("properties"):
+        # Do we already have a sensor of this type? If not, create it now
+        if sensor.sensor_type not in sensor_data:
+            sensor_data[sensor.sensor_type] = []
+
+        ## Setup the basic details
+        sensor_details = {
+            "name": sensor.name,
+            "description": sensor.description or "",
+            "location": sensor.location,
+        }
+
+        ### Do we have properties? If so, let's add them
+        properties = sensor.properties.all()
+        if properties:
+            sensor_details["properties"] = {
+                prop.name: {"value": prop.value, "unit": prop.unit}
+                for prop in properties
+            }
+        else:
+            sensor_details.update({"value": sensor.value, "unit": sensor.unit})
+
+        sensor_data[sensor.sensor_type].append(sensor_details)
+
+    ## Add the user count and members on site count to the sensors
+    sensor_data["total_member_count"] = [
+        {"value": Profile.objects.filter(state="active").count()}
+    ]
+    sensor_data["people_now_present"] = [
+        {"value": SiteSession.objects.filter(signout_date=None).count()}
+    ]
+
+    # Is the camera array empty? If not, add them
+    if not config.SPACE_DIRECTORY_CAMS:
+        spaceapi["cameras"] = config.SPACE_DIRECTORY_CAMS
+
+    # Set the STATE part of the schema, the icons, and the schema version
+    spaceapi["state"] = {
+        "open": spaceapi_data.space_is_open,
+        "message": spaceapi_data.space_message,
+        "lastchange": spaceapi_data.status_last_change.timestamp(),
+    }
+    spaceapi["icon"] = {
+        "open": config.SPACE_DIRECTORY_ICON_OPEN,
+        "closed": config.SPACE_DIRECTORY_ICON_CLOSED,
+    }
+    spaceapi["api_compatibility"] = ["14"]
+
+    ## Add the sensor data to the main body of the schema
+    spaceapi["sensors"] = sensor_data
+
+    ## Add the location data based on the values in Constance
+    spaceapi["location"] = {
+        "address": config.SPACE_DIRECTORY_LOCATION_ADDRESS,
+        "lat": config.SPACE_DIRECTORY_LOCATION_LAT,
+        "lon": config.SPACE_DIRECTORY_LOCATION_LON,
+    }
+
+    return spaceapi
+
+
+def get_spaceapi_document():
+    """
+    Returns the serialised spaceapi document and its ETag, building it if it
+    isn't cached.
+    :return: (body, etag)
+    """
+    cached = cache.get(SPACEAPI_CACHE_KEY)
+
+    if cached is None:
+        logger.debug("Rebuilding the spaceapi document.")
+        body = json.dumps(
+            build_spaceapi_document(), separators=(",", ":"), cls=JSONEncoder
+        ).encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        cached = (body, etag)
+        cache.set(SPACEAPI_CACHE_KEY, cached, timeout=SPACEAPI_CACHE_TIMEOUT)
+
+    return cached
+
+
+def invalidate_spaceapi_document(**kwargs):
+    cache.delete(SPACEAPI_CACHE_KEY)
+
+
+@receiver(post_save, sender=Profile)
+def on_profile_saved(sender, instance, created, **kwargs):
+    # only changes to a member's state affect the member count
+    if created or instance.state_changed():
+        invalidate_spaceapi_document()
+
+
+post_delete.connect(invalidate_spaceapi_document, sender=Profile)
+post_save.connect(invalidate_spaceapi_document, sender=SiteSession)
+post_delete.connect(invalidate_spaceapi_document, sender=SiteSession)
+post_save.connect(invalidate_spaceapi_document, sender=SpaceAPI)
+post_save.connect(invalidate_spaceapi_document, sender=SpaceAPISensor)
+post_delete.connect(invalidate_spaceapi_document, sender=SpaceAPISensor)
+post_save.connect(invalidate_spaceapi_document, sender=SpaceAPISensorProperties)
+post_delete.connect(invalidate_spaceapi_document, sender=SpaceAPISensorProperties)
+config_updated.connect(invalidate_spaceapi_document)
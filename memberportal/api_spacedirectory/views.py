@@ -1,16 +1,18 @@
+from django.http import HttpResponse, HttpResponseNotModified
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework_api_key.permissions import HasAPIKey
 from rest_framework.views import APIView
 from constance import config
 from .models import SpaceAPI, SpaceAPISensor, SpaceAPISensorProperties
-from profile.models import Profile
-from api_general.models import SiteSession
-import json
+from .spaceapi import get_spaceapi_document
 import logging
 
 logger = logging.getLogger("api_spacedirectory")
 
+# how long aggregators and proxies may reuse the document before revalidating
+SPACEAPI_MAX_AGE = 60
+
 
 class SpaceDirectoryStatus(APIView):
     """Generates a spaceapi compliant status message if enabled."""
@@ -24,102 +26,17 @@ class SpaceDirectoryStatus(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        body, etag = get_spaceapi_document()
+
+        if etag in request.META.get("HTTP_IF_NONE_MATCH", ""):
+            response = HttpResponseNotModified()
         else:
-            spaceapi = {
-                "space": config.SITE_OWNER,
-                "logo": config.SITE_LOGO,
-                "url": config.MAIN_SITE_URL,
-                "contact": {
-                    "email": config.SPACE_DIRECTORY_CONTACT_EMAIL,
-                    "twitter": config.SPACE_DIRECTORY_CONTACT_TWITTER,
-                    "phone": config.SPACE_DIRECTORY_CONTACT_PHONE,
-                    "facebook": config.SPACE_DIRECTORY_CONTACT_FACEBOOK,
-                },
-                "spacefed": {
-                    "spacenet": config.SPACE_DIRECTORY_FED_SPACENET,
-                    "spacesaml": config.SPACE_DIRECTORY_FED_SPACESAML,
-                    "spacephone": config.SPACE_DIRECTORY_FED_SPACEPHONE,
-                },
-                "projects": json.loads(config.SPACE_DIRECTORY_PROJECTS),
-                "issue_report_channels": ["email"],
-            }
-
-            # Get the default data
-            spaceapi_data = SpaceAPI.objects.get()
-
-            # Get a list of all the sensors
-            spaceapi_sensors = SpaceAPISensor.objects.all()
-
-            # Create an empty dict to add the sensor data to
-            sensor_data = {}
-
-            # Iterate over the sensors and update the dict as appropriate
-            for sensor in spaceapi_sensors:
-                sensor_details = {}
-                # Do we already have a sensor of this type? If not, create it now
-                if sensor.sensor_type not in sensor_data:
-                    sensor_data[sensor.sensor_type] = []
-
-                ## Setup the basic details
-                sensor_details = {
-                    "name": sensor.name,
-                    "description": sensor.description or "",
-                    "location": sensor.location,
-                }
-
-                ### Do we have properties? If so, let's add them
-                if len(sensor.properties.all()) > 0:
-                    sensor_details["properties"] = {}
-                    for prop in sensor.properties.all():
-                        properties = {
-                            prop.name: {"value": prop.value, "unit": prop.unit}
-                        }
-                        sensor_details["properties"].update(properties)
-                else:
-                    sensor_details.update({"value": sensor.value, "unit": sensor.unit})
-
-                sensor_data[sensor.sensor_type].append(sensor_details)
-
-            ## Add the user count and members on site count to the sensors
-            spaceapi_user_count = Profile.objects.all().filter(state="active").count()
-            spaceapi_members_on_site = SiteSession.objects.filter(
-                signout_date=None
-            ).order_by("-signin_date")
-
-            sensor_data["total_member_count"] = [{"value": spaceapi_user_count}]
-
-            sensor_data["people_now_present"] = [
-                {"value": spaceapi_members_on_site.count()}
-            ]
-
-            # Is the camera array empty? If not, add them
-            if not config.SPACE_DIRECTORY_CAMS:
-                spaceapi["cameras"] = config.SPACE_DIRECTORY_CAMS
-
-            # Set the STATE part of the schema, the icons, and the schema version
-            spaceapi["state"] = {
-                "open": spaceapi_data.space_is_open,
-                "message": spaceapi_data.space_message,
-                "lastchange": spaceapi_data.status_last_change.timestamp(),
-            }
-            spaceapi["icon"] = {
-                "open": config.SPACE_DIRECTORY_ICON_OPEN,
-                "closed": config.SPACE_DIRECTORY_ICON_CLOSED,
-            }
-            spaceapi["api_compatibility"] = ["14"]
-
-            ## Add the sensor data to the main body of the schema
-            spaceapi["sensors"] = sensor_data
-
-            ## Add the location data based on the values in Constance
-            spaceapi["location"] = {
-                "address": config.SPACE_DIRECTORY_LOCATION_ADDRESS,
-                "lat": config.SPACE_DIRECTORY_LOCATION_LAT,
-                "lon": config.SPACE_DIRECTORY_LOCATION_LON,
-            }
-
-            # Return the JSON document
-            return Response(spaceapi)
+            response = HttpResponse(body, content_type="application/json")
+
+        response["ETag"] = etag
+        response["Cache-Control"] = f"public, max-age={SPACEAPI_MAX_AGE}"
+
+        return response
 
 
 class SpaceDirectoryUpdate(APIView):
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("memberbucks", "0008_alter_memberbucks_description"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="memberbucks",
+            index=models.Index(
+                fields=["user", "date"], name="memberbucks_user_date_idx"
+            ),
+        ),
+    ]
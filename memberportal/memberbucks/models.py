@@ -10,6 +10,9 @@ class MemberBucks(ExportModelOperationsMixin("memberbucks"), models.Model):
     class Meta:
         verbose_name = "Memberbucks"
         verbose_name_plural = "Memberbucks"
+        indexes = [
+            models.Index(fields=["user", "date"], name="memberbucks_user_date_idx"),
+        ]
 
     TRANSACTION_TYPES = (
         ("stripe", "Stripe Top-up"),  # used to track credits via Stripe
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def get_user_queryset():
+    """
+    Returns users with their profile, membership plan and tier joined in, as
+    most authenticated requests use them straight away.
+    """
+    return get_user_model().objects.select_related(
+        "profile__membership_plan__member_tier"
+    )
+
+
+class ProfileBackend(ModelBackend):
+    """
+    Loads the logged in user for each session request with one query. The user
+    is cached on the request by AuthenticationMiddleware.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username, password, **kwargs)
+
+        if user is None:
+            # ModelBackend is only listed for sessions from before this
+            # backend, so don't let it check the password again
+            raise PermissionDenied
+
+        return user
+
+    def get_user(self, user_id):
+        try:
+            user = get_user_queryset().get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+
+        return user if self.user_can_authenticate(user) else None
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that loads the user with one query. DRF caches the user
+    on the request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = get_user_queryset().get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
@@ -65,6 +65,7 @@ INSTALLED_APPS = [
     "api_general",
     "api_access",
     "api_meeting",
+    "api_member_tools",
     "api_admin_tools",
     "api_billing",
     "api_metrics",
@@ -261,6 +262,11 @@ LOGGING = {
             "level": os.environ.get("MM_LOG_LEVEL_SLACK", "INFO"),
             "propagate": False,
         },
+        "notifications": {
+            "handlers": ["console", "file"],
+            "level": os.environ.get("MM_LOG_LEVEL_NOTIFICATIONS", "INFO"),
+            "propagate": False,
+        },
         "emails": {
             "handlers": ["console", "file"],
             "level": os.environ.get("MM_LOG_LEVEL_EMAILS", "INFO"),
@@ -286,6 +292,11 @@ LOGGING = {
             "level": os.environ.get("MM_LOG_LEVEL_CELERY_METRICS", "INFO"),
             "propagate": False,
         },
+        "celery:api_billing": {
+            "handlers": ["console", "file"],
+            "level": os.environ.get("MM_LOG_LEVEL_CELERY_BILLING", "INFO"),
+            "propagate": False,
+        },
         "api_member_bucks": {
             "handlers": ["console", "file"],
             "level": os.environ.get("MM_LOG_LEVEL_MEMBER_BUCKS", "INFO"),
@@ -320,12 +331,20 @@ LOGGING = {
     },
 }
 
+# Authenticated users are loaded with their profile, membership plan and tier in
+# one query. ModelBackend stays listed so sessions that were logged in with it
+# before keep working.
+AUTHENTICATION_BACKENDS = [
+    "membermatters.authentication.ProfileBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
 REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "membermatters.custom_exception_handlers.fix_401",
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "membermatters.authentication.ProfileJWTAuthentication",
     ),
 }
 
@@ -368,11 +387,88 @@ AUTH_USER_MODEL = "profile.User"
 
 REQUEST_TIMEOUT = 0.05
 
+# SMS delivery. "twilio" sends via the Twilio API, "fake" records messages in
+# memory (services.sms.FakeTwilioClient) for local development and testing.
+SMS_BACKEND = os.environ.get("MM_SMS_BACKEND", "twilio")
+# Twilio accepts 1 message per second per long code number by default
+SMS_RATE_LIMIT = os.environ.get("MM_SMS_RATE_LIMIT", "1/s")
+SMS_BATCH_SIZE = int(os.environ.get("MM_SMS_BATCH_SIZE", 50))
+
+# Email outbox. Queued emails are delivered in batches through the Postmark batch
+# API; MM_POSTMARK_API_URL can point at a local stand-in server for testing.
+POSTMARK_API_URL = os.environ.get("MM_POSTMARK_API_URL", "https://api.postmarkapp.com/")
+EMAIL_BATCH_SIZE = int(os.environ.get("MM_EMAIL_BATCH_SIZE", 500))
+EMAIL_BATCH_DELAY = int(os.environ.get("MM_EMAIL_BATCH_DELAY", 2))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("MM_EMAIL_MAX_ATTEMPTS", 6))
+
+# Event logs are buffered and saved in batches every AUDIT_LOG_FLUSH_INTERVAL
+# seconds, or once AUDIT_LOG_BUFFER_SIZE are waiting (0 saves every event straight away).
+AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get("MM_AUDIT_LOG_FLUSH_INTERVAL", 1))
+AUDIT_LOG_BUFFER_SIZE = int(os.environ.get("MM_AUDIT_LOG_BUFFER_SIZE", 200))
+
+# Discord/Slack notifications are buffered per webhook and coalesced into one
+# message every NOTIFICATION_FLUSH_INTERVAL seconds.
+NOTIFICATION_FLUSH_INTERVAL = float(os.environ.get("MM_NOTIFICATION_FLUSH_INTERVAL", 2))
+NOTIFICATION_MAX_PENDING = int(os.environ.get("MM_NOTIFICATION_MAX_PENDING", 100))
+NOTIFICATION_REQUEST_TIMEOUT = float(
+    os.environ.get("MM_NOTIFICATION_REQUEST_TIMEOUT", 5)
+)
+
+# Local copies of Stripe subscriptions and upcoming invoices are kept current by
+# webhooks; anything older than this is refreshed from Stripe before it's used.
+STRIPE_MIRROR_MAX_AGE = timedelta(
+    seconds=int(os.environ.get("MM_STRIPE_MIRROR_MAX_AGE", 3600 * 6))
+)
+
+# The nightly subscription reconciliation won't end more than this many
+# subscriptions in one run (eg. if it's pointed at the wrong Stripe account),
+# it reports them to the admins instead.
+STRIPE_RECONCILE_MAX_ENDED = int(os.environ.get("MM_STRIPE_RECONCILE_MAX_ENDED", 20))
+
+# MM_STRIPE_API_BASE points the Stripe client at a local stand-in (eg. stripe-mock
+# on http://localhost:12111) for testing.
+STRIPE_API_BASE = os.environ.get("MM_STRIPE_API_BASE")
+
+# Members' access permissions are cached for this many seconds (0 turns the cache
+# off). Permission and device changes invalidate the cache; a device going
+# offline shows up when it expires.
+ACCESS_PERMISSIONS_CACHE_TIMEOUT = int(
+    os.environ.get("MM_ACCESS_PERMISSIONS_CACHE_TIMEOUT", 30)
+)
+
+# Metric rows older than METRICS_FULL_RESOLUTION_DAYS are thinned to the last row
+# of each day, and older than METRICS_DAILY_RESOLUTION_DAYS to the last row of each
+# week (0 keeps daily rows forever).
+METRICS_FULL_RESOLUTION_DAYS = int(
+    os.environ.get("MM_METRICS_FULL_RESOLUTION_DAYS", 30)
+)
+METRICS_DAILY_RESOLUTION_DAYS = int(
+    os.environ.get("MM_METRICS_DAILY_RESOLUTION_DAYS", 365 * 2)
+)
+
+# Log rows older than these many days are moved to gzipped JSONL files under
+# LOG_ARCHIVE_LOCATION by a nightly job (0 keeps the rows in the database forever).
+# See profile/log_archive.py and the log_archive management command.
+LOG_ARCHIVE_LOCATION = os.environ.get(
+    "MM_LOG_ARCHIVE_LOCATION", "/usr/src/data/log_archive/"
+)
+LOG_ARCHIVE_BATCH_SIZE = int(os.environ.get("MM_LOG_ARCHIVE_BATCH_SIZE", 1000))
+LOG_RETENTION_DAYS = {
+    "user_event_log": int(os.environ.get("MM_LOG_RETENTION_USER_EVENT_LOG", 0)),
+    "event_log": int(os.environ.get("MM_LOG_RETENTION_EVENT_LOG", 0)),
+    "door_log": int(os.environ.get("MM_LOG_RETENTION_DOOR_LOG", 0)),
+    "interlock_log": int(os.environ.get("MM_LOG_RETENTION_INTERLOCK_LOG", 0)),
+    "metric": int(os.environ.get("MM_LOG_RETENTION_METRIC", 0)),
+}
+
 # Celery configuration
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_BROKER_URL = os.getenv("MM_REDIS_HOST")
 
+# Without a broker there is no worker to pick up queued tasks, so run them inline
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+
 # Django constance configuration
 CONSTANCE_BACKEND = "membermatters.constance_backend.DatabaseBackend"
 CONSTANCE_CONFIG = CONSTANCE_CONFIG
@@ -0,0 +1,225 @@
+"""
+Buffers event log writes and saves them in batches from a background thread.
+
+log_event() and User.log_event() are called for every device connect, sync,
+swipe and admin action, often from websocket handler threads. Saving each
+event is two INSERTs and a commit (EventLog and UserEventLog are multi-table
+models), so events are buffered in process instead and flushed together every
+AUDIT_LOG_FLUSH_INTERVAL seconds, or as soon as AUDIT_LOG_BUFFER_SIZE events
+are waiting. Anything still buffered is flushed when the process exits.
+
+Events logged inside a transaction are only buffered once it commits, so a
+rolled back action doesn't leave a log behind (like before).
+
+Django can't bulk_create multi-table models. On SQLite the rows are inserted
+with one executemany per table, and the new parent ids are read back while the
+transaction still holds SQLite's write lock. Other databases save each row raw
+(like loaddata does) in one transaction per flush.
+"""
+
+from celery.signals import worker_process_shutdown
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.utils import timezone
+from functools import partial
+from services import metrics
+import threading
+import logging
+import atexit
+import time
+import os
+
+logger = logging.getLogger("profile")
+
+MODELS = {"user": "profile.UserEventLog", "event": "profile.EventLog"}
+
+
+def insert_rows(model, fields, objs):
+    """Inserts rows into a model's own table with one executemany."""
+    quote_name = connection.ops.quote_name
+    columns = ", ".join(quote_name(field.column) for field in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})",
+            [
+                [
+                    field.get_db_prep_save(getattr(obj, field.attname), connection)
+                    for field in fields
+                ]
+                for obj in objs
+            ],
+        )
+
+
+def _bulk_insert_sqlite(model, objs):
+    parent = model._meta.get_parent_list()[0]
+    parent_fields = [f for f in parent._meta.local_concrete_fields if not f.primary_key]
+
+    insert_rows(parent, parent_fields, objs)
+
+    # nothing else can write until we commit, so the newest ids are ours (in order)
+    ids = parent.objects.order_by("-pk").values_list("pk", flat=True)[: len(objs)]
+    for obj, pk in zip(objs, reversed(list(ids))):
+        obj.pk = pk
+        setattr(obj, parent._meta.pk.attname, pk)
+
+    insert_rows(model, model._meta.local_concrete_fields, objs)
+
+
+def _save_raw(model, objs):
+    parent = model._meta.get_parent_list()[0]
+    parent_fields = [f.attname for f in parent._meta.concrete_fields]
+
+    for obj in objs:
+        # a raw save keeps the date the event happened (instead of auto_now_add)
+        parent_obj = parent(**{name: getattr(obj, name) for name in parent_fields})
+        parent_obj.save_base(raw=True)
+        obj.pk = parent_obj.pk
+        setattr(obj, parent._meta.pk.attname, parent_obj.pk)
+        obj.save_base(raw=True, force_insert=True)
+
+
+def write_events(events):
+    """
+    Saves a list of (kind, fields) events in one transaction.
+    :return: the number of events saved
+    """
+    by_model = {}
+    for kind, fields in events:
+        by_model.setdefault(MODELS[kind], []).append(fields)
+
+    with transaction.atomic():
+        for model_name, rows in by_model.items():
+            model = apps.get_model(model_name)
+            objs = [model(**fields) for fields in rows]
+
+            if connection.vendor == "sqlite":
+                _bulk_insert_sqlite(model, objs)
+            else:
+                _save_raw(model, objs)
+
+    return len(events)
+
+
+class AuditLogWriter:
+    """
+    Buffers events in process and saves them from a background thread. With a
+    flush interval of 0 every event is saved straight away.
+    """
+
+    def __init__(self, flush_interval, buffer_size):
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._buffer = []
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # a forked process (eg. a celery worker) doesn't inherit our thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._buffer = []
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def write(self, kind, **fields):
+        """Buffers an event ("user" or "event") to be saved on the next flush."""
+        fields.setdefault("date", timezone.now())
+
+        if connection.in_atomic_block:
+            transaction.on_commit(partial(self._buffer_event, kind, fields))
+        else:
+            self._buffer_event(kind, fields)
+
+    def _buffer_event(self, kind, fields):
+        if not self.flush_interval:
+            self._write([(kind, fields)])
+            return
+
+        self._ensure_started()
+
+        with self._lock:
+            self._buffer.append((kind, fields))
+            buffered = len(self._buffer)
+
+        metrics.audit_log_buffered.inc()
+        if buffered >= self.buffer_size:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing the event log buffer: {e}")
+            finally:
+                # the thread keeps its own database connection
+                connection.close()
+
+    def flush(self):
+        """Saves every buffered event."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+
+            if not events:
+                return
+
+            try:
+                self._write(events)
+                metrics.audit_log_buffered.dec(len(events))
+
+            except Exception:
+                # keep them for the next flush (eg. if the database was locked)
+                with self._lock:
+                    self._buffer[:0] = events
+                raise
+
+    def _write(self, events):
+        started = time.monotonic()
+
+        try:
+            write_events(events)
+            metrics.audit_log_events_total.labels(status="written").inc(len(events))
+
+        except IntegrityError:
+            # eg. the member was deleted before we flushed, so save the rest
+            # one at a time and skip the ones that can't be saved
+            for event in events:
+                try:
+                    write_events([event])
+                    metrics.audit_log_events_total.labels(status="written").inc()
+                except IntegrityError as e:
+                    logger.warning(f"Dropped event log {event[1]}: {e}")
+                    metrics.audit_log_events_total.labels(status="dropped").inc()
+
+        metrics.audit_log_flush_seconds.observe(time.monotonic() - started)
+
+
+writer = AuditLogWriter(
+    flush_interval=settings.AUDIT_LOG_FLUSH_INTERVAL,
+    buffer_size=settings.AUDIT_LOG_BUFFER_SIZE,
+)
+
+
+@atexit.register
+@worker_process_shutdown.connect
+def _flush_on_exit(**kwargs):
+    # celery's pool processes exit without running atexit handlers
+    if writer._thread is not None and writer._pid == os.getpid():
+        writer.flush()
@@ -0,0 +1,122 @@
+"""
+Activates or deactivates many members at once.
+
+Profile.activate() and deactivate() save, notify and sync every device for
+one member at a time, which is slow for hundreds of members and floods the
+doors with syncs. These apply the state change in batches, queue the emails
+and SMS messages as batches, and sync each affected device once at the end.
+"""
+
+from constance import config
+from django.db import transaction
+from django.utils import timezone
+from access.models import sync_member_devices
+from profile.models import Profile
+from services import sms
+from services.emails import queue_emails
+import logging
+
+logger = logging.getLogger("profile")
+
+BATCH_SIZE = 500
+
+STATES = ("active", "inactive")
+
+
+def set_members_state(user_ids, state, requesting_user=None, notify=True):
+    """
+    Sets the state of many members, skipping those already in that state.
+    :param user_ids: ids (or a queryset of ids) of the members' users
+    :param state: "active" or "inactive"
+    :param requesting_user: the admin making the change, for the event logs
+    :param notify: email and SMS the members (like activate/deactivate do)
+    :return: a dict with the updated profiles, and counts of unchanged members
+    and synced devices
+    """
+    if state not in STATES:
+        raise ValueError(f"Can't set members to the '{state}' state.")
+
+    members = Profile.objects.filter(user_id__in=user_ids)
+    profiles = list(members.exclude(state=state).select_related("user"))
+    unchanged = members.filter(state=state).count()
+
+    now = timezone.now()
+    admin_name = requesting_user.profile.get_full_name() if requesting_user else None
+    action = "activated" if state == "active" else "deactivated"
+
+    for i in range(0, len(profiles), BATCH_SIZE):
+        batch = profiles[i : i + BATCH_SIZE]
+
+        with transaction.atomic():
+            Profile.objects.filter(id__in=[profile.id for profile in batch]).update(
+                state=state, modified=now
+            )
+
+            for profile in batch:
+                if requesting_user:
+                    profile.user.log_event(
+                        f"{admin_name} {action} member (in bulk).", "admin"
+                    )
+                else:
+                    profile.user.log_event(
+                        f"system {action} member ({profile.get_full_name()}) in bulk.",
+                        "profile",
+                    )
+
+    if requesting_user and profiles:
+        requesting_user.log_event(
+            f"{admin_name} {action} {len(profiles)} members in bulk.", "admin"
+        )
+
+    if notify and profiles:
+        # activate() doesn't notify new members, they get a welcome email instead
+        notified = [
+            profile.user
+            for profile in profiles
+            if state == "inactive" or profile.state != "noob"
+        ]
+        _notify(notified, state == "active")
+
+    for profile in profiles:
+        profile.state = state
+        profile._loaded_state = state
+
+    devices_synced = 0
+    if profiles:
+        from api_spacedirectory.spaceapi import invalidate_spaceapi_document
+
+        devices_synced = sync_member_devices([profile.id for profile in profiles])
+        invalidate_spaceapi_document()
+
+    logger.info(
+        f"{action.capitalize()} {len(profiles)} members in bulk and synced {devices_synced} devices."
+    )
+
+    return {
+        "updated": profiles,
+        "unchanged": unchanged,
+        "devices_synced": devices_synced,
+    }
+
+
+def _notify(users, active):
+    site_owner = config.SITE_OWNER
+    emails = []
+
+    for user in users:
+        if active:
+            subject, message = user.get_enable_member_email(site_owner)
+        else:
+            subject, message = user.get_disable_member_email(site_owner)
+
+        emails.append(
+            {
+                "to_email": user.email,
+                "subject": subject,
+                "template_vars": {"title": subject, "message": message},
+                "user": user,
+            }
+        )
+
+    queue_emails(emails)
+    sms.SMS().send_access_changed_batch(users, active)
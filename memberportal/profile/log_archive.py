@@ -0,0 +1,239 @@
+"""
+Moves old log rows out of the database into compressed archive files.
+
+Event, door, interlock and metric logs grow forever, which slows down the admin
+log views and backups. Rows older than each log's retention period are read in
+chunks (oldest first), appended to gzipped JSONL files partitioned by day, and
+only then deleted, one short transaction per chunk.
+
+Archives are laid out as <LOG_ARCHIVE_LOCATION>/<log>/<year>/<month>/<date>.jsonl.gz.
+Each run appends a new gzip member to a day's file, and if a run stops between
+writing and deleting a chunk, the next run archives those rows again. So
+readers skip rows they've already seen.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from services import metrics
+import gzip
+import json
+import os
+import logging
+
+logger = logging.getLogger("profile")
+
+
+@dataclass
+class ArchivedLog:
+    model: str
+    date_field: str
+    # rows that can't be archived yet (eg. interlock sessions still in progress)
+    exclude: dict = field(default_factory=dict)
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+
+LOGS = {
+    "user_event_log": ArchivedLog("profile.UserEventLog", "date"),
+    "event_log": ArchivedLog("profile.EventLog", "date"),
+    "door_log": ArchivedLog("access.DoorLog", "date"),
+    "interlock_log": ArchivedLog(
+        "access.InterlockLog", "date_started", {"date_ended__isnull": True}
+    ),
+    "metric": ArchivedLog("api_metrics.Metric", "creation_date"),
+}
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder rounds datetimes to milliseconds
+        if isinstance(o, datetime):
+            return o.isoformat()
+
+        return super().default(o)
+
+
+def get_archive_path(log_name, day):
+    return (
+        Path(settings.LOG_ARCHIVE_LOCATION)
+        / log_name
+        / f"{day.year}"
+        / f"{day.month:02d}"
+        / f"{day.isoformat()}.jsonl.gz"
+    )
+
+
+def _get_day(value):
+    return (
+        timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    )
+
+
+def _write_day(log_name, day, rows):
+    path = get_archive_path(log_name, day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "ab") as file:
+        with gzip.GzipFile(fileobj=file, mode="ab") as archive:
+            for row in rows:
+                archive.write(json.dumps(row, cls=ArchiveEncoder).encode() + b"\n")
+
+        # make sure the rows are on disk before they're deleted
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def get_old_rows(log_name, before):
+    """Returns a queryset of the rows in a log that are older than `before`."""
+    log = LOGS[log_name]
+
+    return (
+        log.get_model()
+        .objects.filter(**{f"{log.date_field}__lt": before})
+        .exclude(**log.exclude)
+    )
+
+
+def archive_log(log_name, before, batch_size=None):
+    """
+    Archives and deletes the rows in a log that are older than `before`.
+    :return: the number of rows archived
+    """
+    log = LOGS[log_name]
+    model = log.get_model()
+    batch_size = batch_size or settings.LOG_ARCHIVE_BATCH_SIZE
+    fields = [f.attname for f in model._meta.concrete_fields]
+    old_rows = get_old_rows(log_name, before).order_by(log.date_field, "pk")
+
+    archived = 0
+    while True:
+        rows = list(old_rows.values("pk", *fields)[:batch_size])
+        if not rows:
+            break
+
+        days = {}
+        for row in rows:
+            days.setdefault(_get_day(row[log.date_field]), []).append(row)
+
+        for day, day_rows in days.items():
+            _write_day(log_name, day, day_rows)
+
+        with transaction.atomic():
+            model.objects.filter(pk__in=[row["pk"] for row in rows]).delete()
+
+        archived += len(rows)
+        metrics.log_archive_rows_total.labels(log=log_name).inc(len(rows))
+
+    if archived:
+        logger.info(f"Archived {archived} {log_name} rows from before {before}.")
+
+    return archived
+
+
+def apply_retention(now=None, dry_run=False):
+    """
+    Archives every log's rows that are older than its retention period
+    (LOG_RETENTION_DAYS, where 0 keeps the log forever).
+    :return: {log name: rows archived (or that would be with dry_run)}
+    """
+    now = now or timezone.now()
+    results = {}
+
+    for log_name, days in settings.LOG_RETENTION_DAYS.items():
+        if not days:
+            continue
+
+        before = now - timedelta(days=days)
+        if dry_run:
+            results[log_name] = get_old_rows(log_name, before).count()
+        else:
+            results[log_name] = archive_log(log_name, before)
+
+    return results
+
+
+def list_archives(log_name, since=None, until=None):
+    """Returns the archive files for a log, oldest first, between two dates."""
+    paths = []
+    for path in Path(settings.LOG_ARCHIVE_LOCATION, log_name).glob("*/*/*.jsonl.gz"):
+        day = date.fromisoformat(path.name.split(".")[0])
+        if (since is None or day >= since) and (until is None or day <= until):
+            paths.append((day, path))
+
+    return [path for _, path in sorted(paths)]
+
+
+def iter_archive(log_name, since=None, until=None):
+    """
+    Yields the archived rows of a log between two dates (inclusive), oldest
+    first. Values are left as they were serialised (eg. dates are strings).
+    """
+    seen = set()
+
+    for path in list_archives(log_name, since, until):
+        with gzip.open(path, "rt") as archive:
+            for line in archive:
+                row = json.loads(line)
+                if row["pk"] in seen:
+                    continue
+
+                seen.add(row["pk"])
+                yield row
+
+
+def _to_instance(model, row):
+    return model(
+        **{
+            f.attname: f.to_python(row[f.attname])
+            for f in model._meta.concrete_fields
+            if f.attname in row
+        }
+    )
+
+
+def restore_rows(log_name, rows, batch_size=None):
+    """
+    Puts archived rows back in the database, skipping any that are already
+    there. The archive files are left as they are.
+    :return: the number of rows restored
+    """
+    model = LOGS[log_name].get_model()
+    parents = list(reversed(model._meta.get_parent_list()))
+    batch_size = batch_size or settings.LOG_ARCHIVE_BATCH_SIZE
+    rows = iter(rows)
+
+    restored = 0
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+
+        existing = {
+            str(pk)
+            for pk in model.objects.filter(
+                pk__in=[row["pk"] for row in batch]
+            ).values_list("pk", flat=True)
+        }
+        batch = [row for row in batch if str(row["pk"]) not in existing]
+
+        with transaction.atomic():
+            if parents:
+                # bulk_create can't insert multi-table models, and a normal save
+                # would overwrite auto_now_add dates, so save them raw like
+                # loaddata does (parent row first)
+                for row in batch:
+                    for model_class in parents + [model]:
+                        _to_instance(model_class, row).save_base(raw=True)
+            else:
+                model.objects.bulk_create([_to_instance(model, row) for row in batch])
+
+        restored += len(batch)
+
+    return restored
@@ -0,0 +1,569 @@
+"""
+Management command to fill a database with a large, realistic looking dataset
+for performance testing.
+
+It creates members (users and profiles with RFID tags, plans, billing groups
+and door/interlock permissions), doors, interlocks and access groups, then
+the history a busy space builds up: door swipes, interlock sessions,
+memberbucks transactions, member event logs, site sessions and metrics.
+Everything is written with bulk inserts, in one transaction per batch.
+
+Generated members have @example.com email addresses and can log in with the
+--password given. Run it against an empty (migrated) development database; it
+never touches existing rows and doesn't call Stripe or any other service.
+
+Usage:
+    python manage.py generate_dataset --members 20000
+    python manage.py generate_dataset --members 50000 --days 730 --swipes 200 --seed 1
+"""
+
+from datetime import timedelta
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+from access.models import AccessGroup, Doors, DoorLog, Interlock, InterlockLog
+from api_admin_tools.models import MemberTier, PaymentPlan
+from api_general.models import SiteSession
+from api_metrics.models import Metric
+from memberbucks.models import MemberBucks
+from profile.audit_log import insert_rows
+from profile.models import (
+    BillingGroup,
+    Log,
+    Profile,
+    User,
+    UserEventLog,
+    invalidate_access_permissions,
+)
+import random
+import time
+
+FIRST_NAMES = (
+    "Alex Sam Jordan Taylor Morgan Casey Riley Jamie Charlie Avery Quinn Harper "
+    "Rowan Emerson Finley Hayden"
+).split()
+LAST_NAMES = (
+    "Smith Nguyen Brown Wilson Taylor Martin Anderson White Walker Harris Lee Ryan "
+    "King Kelly Young Campbell"
+).split()
+STATES = [("active", 70), ("inactive", 15), ("noob", 10), ("accountonly", 5)]
+EVENTS = [
+    ("generic", "Logged in."),
+    ("profile", "Updated their profile."),
+    ("door", "Swiped at a door."),
+    ("interlock", "Started an interlock session."),
+    ("memberbucks", "Topped up their memberbucks."),
+    ("email", "Sent email with subject: Your access has been updated."),
+    ("stripe", "Subscription payment succeeded."),
+    ("admin", "An admin changed the member's access."),
+]
+TRANSACTION_TYPES = [("card", 60), ("stripe", 20), ("interlock", 15), ("cash", 5)]
+
+
+def _chunks(objs, size):
+    objs = iter(objs)
+    while True:
+        chunk = list(islice(objs, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _next_id(model):
+    return (model.objects.aggregate(Max("pk"))["pk__max"] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = "Generate a large, realistic dataset for performance testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=2000)
+        parser.add_argument(
+            "--days", type=int, default=365, help="How much history to generate"
+        )
+        parser.add_argument("--doors", type=int, default=8)
+        parser.add_argument("--interlocks", type=int, default=12)
+        parser.add_argument(
+            "--swipes", type=int, default=100, help="Door swipes per member"
+        )
+        parser.add_argument(
+            "--sessions",
+            type=int,
+            default=20,
+            help="Interlock sessions per member",
+        )
+        parser.add_argument(
+            "--transactions",
+            type=int,
+            default=30,
+            help="Memberbucks transactions per member",
+        )
+        parser.add_argument(
+            "--events", type=int, default=50, help="Event logs per member"
+        )
+        parser.add_argument(
+            "--site-sessions", type=int, default=20, help="Site sign ins per member"
+        )
+        parser.add_argument(
+            "--metric-interval",
+            type=int,
+            default=6,
+            help="Hours between generated metric samples",
+        )
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--seed", type=int, help="Make the dataset reproducible")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options["days"])
+        started = time.monotonic()
+
+        plan = self.create_plan()
+        doors, interlocks = self.create_devices()
+        members = self.create_members(plan)
+        self.create_permissions(members, doors, interlocks)
+        self.create_door_logs(members, doors)
+        self.create_interlock_logs(members, interlocks)
+        self.create_transactions(members)
+        self.create_events(members)
+        self.create_site_sessions(members)
+        self.create_metrics()
+        self.update_members(members)
+        self.reset_sequences()
+        invalidate_access_permissions()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated the dataset in {time.monotonic() - started:.1f}s."
+            )
+        )
+
+    def reset_sequences(self):
+        """
+        Moves the id sequences past the ids set explicitly above (like loaddata
+        does), so the next rows the database creates don't collide with them.
+        """
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Profile, BillingGroup, Log, UserEventLog]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def write(self, label, model, objs, raw=False):
+        """
+        Inserts objects in batches. Raw inserts keep auto_now_add dates and
+        can write multi-table models (with their ids set).
+        """
+        started = time.monotonic()
+        count = 0
+
+        for chunk in _chunks(objs, self.options["batch_size"]):
+            with transaction.atomic():
+                if raw:
+                    for model_class in model._meta.get_parent_list()[::-1] + [model]:
+                        fields = [
+                            f
+                            for f in model_class._meta.local_concrete_fields
+                            if not (
+                                f.primary_key and getattr(chunk[0], f.attname) is None
+                            )
+                        ]
+                        insert_rows(model_class, fields, chunk)
+                else:
+                    model.objects.bulk_create(chunk)
+            count += len(chunk)
+
+        self.stdout.write(f"{label}: {count} rows in {time.monotonic() - started:.1f}s")
+        return count
+
+    def choose(self, weighted):
+        return self.random.choices(
+            [value for value, _ in weighted], [weight for _, weight in weighted]
+        )[0]
+
+    def random_date(self, after=None):
+        after = max(after or self.start, self.start)
+        return after + (self.now - after) * self.random.random()
+
+    def create_plan(self):
+        tier, _ = MemberTier.objects.get_or_create(
+            name="Generated Tier",
+            defaults={
+                "description": "Generated for performance testing",
+                "stripe_id": "prod_generated",
+            },
+        )
+        plan, _ = PaymentPlan.objects.get_or_create(
+            stripe_id="price_generated",
+            defaults={
+                "name": "Generated Monthly",
+                "member_tier": tier,
+                "cost": 5000,
+                "interval_count": 1,
+                "interval": "month",
+            },
+        )
+        return plan
+
+    def create_devices(self):
+        doors = []
+        for number in range(1, self.options["doors"] + 1):
+            door, _ = Doors.objects.get_or_create(
+                name=f"Generated Door {number}",
+                defaults={
+                    "description": "Generated door",
+                    "authorised": True,
+                    # the front doors are open to every member
+                    "all_members": number <= 2,
+                },
+            )
+            doors.append(door)
+
+        interlocks = []
+        for number in range(1, self.options["interlocks"] + 1):
+            interlock, _ = Interlock.objects.get_or_create(
+                name=f"Generated Interlock {number}",
+                defaults={
+                    "description": "Generated interlock",
+                    "authorised": True,
+                    "cost_per_hour": self.random.choice([0, 0, 200, 500]),
+                },
+            )
+            interlocks.append(interlock)
+
+        return doors, interlocks
+
+    def create_members(self, plan):
+        count = self.options["members"]
+        password = make_password(self.options["password"])
+        first_id = max(_next_id(User), _next_id(Profile))
+
+        users = []
+        profiles = []
+        for user_id in range(first_id, first_id + count):
+            state = self.choose(STATES)
+            first_name = self.random.choice(FIRST_NAMES)
+            last_name = self.random.choice(LAST_NAMES)
+            created = self.random_date()
+
+            users.append(
+                User(
+                    id=user_id,
+                    email=f"member{user_id}@example.com",
+                    password=password,
+                )
+            )
+            profiles.append(
+                Profile(
+                    id=user_id,
+                    user_id=user_id,
+                    created=created,
+                    modified=created,
+                    digital_id_token_expire=created,
+                    screen_name=f"{first_name}{user_id}",
+                    first_name=first_name,
+                    last_name=last_name,
+                    phone=f"04{self.random.randrange(10**8):08d}",
+                    state=state,
+                    rfid=f"G{user_id:09d}",
+                    membership_plan=plan if state == "active" else None,
+                    subscription_status="active" if state == "active" else "inactive",
+                )
+            )
+
+        self.write("users", User, users)
+        self.write("profiles", Profile, profiles)
+
+        # a few members pay for their family or housemates
+        groups = []
+        grouped = []
+        active = [p for p in profiles if p.state == "active"]
+        others = self.random.sample(profiles, len(profiles))
+        group_id = _next_id(BillingGroup)
+
+        for primary in self.random.sample(active, len(active) // 30):
+            if primary.billing_group_id:
+                continue
+
+            groups.append(
+                BillingGroup(
+                    id=group_id,
+                    name=f"{primary.last_name} family",
+                    primary_member_id=primary.id,
+                )
+            )
+            primary.billing_group_id = group_id
+            grouped.append(primary)
+
+            for _ in range(self.random.randint(1, 3)):
+                member = others.pop()
+                if member.billing_group_id:
+                    continue
+
+                member.billing_group_id = group_id
+                member.subscription_status = (
+                    "group_active" if member.state == "active" else "group_inactive"
+                )
+                grouped.append(member)
+
+            group_id += 1
+
+        self.write("billing groups", BillingGroup, groups)
+        Profile.objects.bulk_update(
+            grouped,
+            ["billing_group", "subscription_status"],
+            batch_size=self.options["batch_size"],
+        )
+
+        return profiles
+
+    def create_permissions(self, members, doors, interlocks):
+        # every member gets the front doors, like set_all_members_access
+        door_access = [
+            Profile.doors.through(profile_id=member.id, doors_id=door.id)
+            for member in members
+            for door in doors[:2]
+        ]
+        interlock_access = []
+        active = [member for member in members if member.state == "active"]
+
+        for member in active:
+            member.door_ids = [door.id for door in doors[:2]]
+            for door in doors[2:]:
+                if self.random.random() < 0.4:
+                    door_access.append(
+                        Profile.doors.through(profile_id=member.id, doors_id=door.id)
+                    )
+                    member.door_ids.append(door.id)
+
+            member.interlock_ids = []
+            for interlock in interlocks:
+                if self.random.random() < 0.25:
+                    interlock_access.append(
+                        Profile.interlocks.through(
+                            profile_id=member.id, interlock_id=interlock.id
+                        )
+                    )
+                    member.interlock_ids.append(interlock.id)
+
+        self.write("door permissions", Profile.doors.through, door_access)
+        self.write(
+            "interlock permissions", Profile.interlocks.through, interlock_access
+        )
+
+        # inducted members get the shared machines through a group
+        group, _ = AccessGroup.objects.get_or_create(
+            name="Generated Workshop Induction",
+            defaults={"description": "Generated for performance testing"},
+        )
+        group.interlocks.add(*interlocks[: len(interlocks) // 3])
+        inducted = self.random.sample(active, len(active) // 5)
+        self.write(
+            "access group members",
+            AccessGroup.members.through,
+            [
+                AccessGroup.members.through(accessgroup_id=group.id, profile_id=m.id)
+                for m in inducted
+            ],
+        )
+        for member in inducted:
+            member.interlock_ids += [i.id for i in interlocks[: len(interlocks) // 3]]
+
+    def get_count(self, option, member):
+        # active members generate most of the history
+        average = self.options[option]
+        if member.state != "active":
+            average //= 10
+        return self.random.randint(0, average * 2)
+
+    def create_door_logs(self, members, doors):
+        door_ids = [door.id for door in doors]
+
+        def door_logs():
+            for member in members:
+                allowed = getattr(member, "door_ids", None)
+                for _ in range(self.get_count("swipes", member)):
+                    yield DoorLog(
+                        user_id=member.user_id,
+                        door_id=self.random.choice(allowed or door_ids),
+                        date=self.random_date(member.created),
+                        success=bool(allowed) and self.random.random() > 0.03,
+                    )
+
+        self.write("door logs", DoorLog, door_logs())
+
+    def create_interlock_logs(self, members, interlocks):
+        interlocks = {interlock.id: interlock for interlock in interlocks}
+
+        def interlock_logs():
+            for member in members:
+                allowed = getattr(member, "interlock_ids", None)
+                if not allowed:
+                    continue
+
+                for _ in range(self.get_count("sessions", member)):
+                    interlock = interlocks[self.random.choice(allowed)]
+                    started = self.random_date(member.created)
+                    duration = timedelta(minutes=self.random.randint(1, 240))
+                    ended = min(started + duration, self.now)
+                    yield InterlockLog(
+                        interlock_id=interlock.id,
+                        user_started_id=member.user_id,
+                        user_ended_id=member.user_id,
+                        date_started=started,
+                        date_updated=ended,
+                        date_ended=ended,
+                        total_time=ended - started,
+                        total_kwh=round(self.random.random() * 5, 3),
+                        total_cost=round(
+                            (ended - started).total_seconds()
+                            / 3600
+                            * interlock.cost_per_hour
+                            / 100,
+                            2,
+                        ),
+                    )
+
+        self.write("interlock logs", InterlockLog, interlock_logs())
+
+    def create_transactions(self, members):
+        def transactions():
+            for member in members:
+                for _ in range(self.get_count("transactions", member)):
+                    transaction_type = self.choose(TRANSACTION_TYPES)
+                    if transaction_type in ("stripe", "cash"):
+                        amount = float(self.random.choice([10, 20, 50]))
+                        description = "Memberbucks top up"
+                    else:
+                        amount = -round(self.random.uniform(0.5, 8), 2)
+                        description = "Vending machine purchase"
+
+                    yield MemberBucks(
+                        user_id=member.user_id,
+                        amount=amount,
+                        transaction_type=transaction_type,
+                        description=description,
+                        date=self.random_date(member.created),
+                        logging_info="",
+                    )
+
+        # raw, so the dates aren't replaced by auto_now_add
+        self.write("memberbucks transactions", MemberBucks, transactions(), raw=True)
+
+    def create_events(self, members):
+        first_id = _next_id(UserEventLog._meta.get_parent_list()[0])
+
+        def events():
+            log_id = first_id
+            for member in members:
+                for _ in range(self.get_count("events", member)):
+                    logtype, description = self.random.choice(EVENTS)
+                    yield UserEventLog(
+                        id=log_id,
+                        log_ptr_id=log_id,
+                        user_id=member.user_id,
+                        logtype=logtype,
+                        description=description,
+                        data="",
+                        date=self.random_date(member.created),
+                    )
+                    log_id += 1
+
+        self.write("user event logs", UserEventLog, events(), raw=True)
+
+    def create_site_sessions(self, members):
+        def site_sessions():
+            for member in members:
+                for _ in range(self.get_count("site_sessions", member)):
+                    signed_in = self.random_date(member.created)
+                    yield SiteSession(
+                        user_id=member.user_id,
+                        signin_date=signed_in,
+                        signout_date=min(
+                            signed_in + timedelta(hours=self.random.uniform(0.5, 6)),
+                            self.now,
+                        ),
+                    )
+
+                # a few members are on site right now
+                if member.state == "active" and self.random.random() < 0.02:
+                    yield SiteSession(user_id=member.user_id, signin_date=self.now)
+
+        self.write("site sessions", SiteSession, site_sessions())
+
+    def create_metrics(self):
+        members = self.options["members"]
+        interval = timedelta(hours=self.options["metric_interval"])
+
+        def metrics():
+            date = self.start
+            while date < self.now:
+                # the membership grows over the period
+                total = int(
+                    members
+                    * (0.5 + 0.5 * (date - self.start) / (self.now - self.start))
+                )
+                by_state = [
+                    {"state": state, "total": total * weight // 100}
+                    for state, weight in STATES
+                ]
+                data = {
+                    Metric.MetricName.MEMBER_COUNT_TOTAL: by_state,
+                    Metric.MetricName.MEMBER_COUNT_6_MONTHS: by_state,
+                    Metric.MetricName.MEMBER_COUNT_12_MONTHS: by_state,
+                    Metric.MetricName.SUBSCRIPTION_COUNT_TOTAL: [
+                        {"state": "active", "total": total * 70 // 100},
+                        {"state": "inactive", "total": total * 30 // 100},
+                    ],
+                    Metric.MetricName.MEMBERBUCKS_BALANCE_TOTAL: {
+                        "value": round(total * 12.5, 2)
+                    },
+                    Metric.MetricName.MEMBERBUCKS_TRANSACTIONS_TOTAL: [
+                        {"type": transaction_type, "total": total * weight}
+                        for transaction_type, weight in TRANSACTION_TYPES
+                    ],
+                }
+                for name, value in data.items():
+                    yield Metric(name=name, data=value, creation_date=date)
+
+                date += interval
+
+        self.write("metrics", Metric, metrics())
+
+    def update_members(self, members):
+        """Sets each member's memberbucks balance and last seen from their history."""
+        started = time.monotonic()
+        ids = [member.user_id for member in members]
+        balances = dict(
+            MemberBucks.objects.filter(user_id__in=ids)
+            .values("user_id")
+            .annotate(balance=Sum("amount"))
+            .values_list("user_id", "balance")
+        )
+        last_seen = dict(
+            DoorLog.objects.filter(user_id__in=ids)
+            .values("user_id")
+            .annotate(last_seen=Max("date"))
+            .values_list("user_id", "last_seen")
+        )
+
+        for member in members:
+            member.memberbucks_balance = round(balances.get(member.user_id) or 0, 2)
+            member.last_seen = last_seen.get(member.user_id)
+
+        Profile.objects.bulk_update(
+            members,
+            ["memberbucks_balance", "last_seen"],
+            batch_size=self.options["batch_size"],
+        )
+        self.stdout.write(
+            f"member balances: {len(members)} rows in {time.monotonic() - started:.1f}s"
+        )
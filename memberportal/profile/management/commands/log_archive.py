@@ -0,0 +1,150 @@
+"""
+Management command to archive old log rows, and to search or restore archives.
+
+Rows older than each log's retention period (see LOG_RETENTION_DAYS) are
+archived nightly by a Celery beat job. This runs it on demand (or with
+--log, only one log, or with --before, a log up to any date), and reads the
+archives back.
+
+Usage:
+    python manage.py log_archive archive --dry-run
+    python manage.py log_archive archive --log door_log
+    python manage.py log_archive archive --log door_log --before 2023-01-01
+    python manage.py log_archive list --log user_event_log
+    python manage.py log_archive query --log user_event_log --since 2022-01-01 --user 12
+    python manage.py log_archive query --log event_log --search "offline" --until 2022-06-30
+    python manage.py log_archive restore --log door_log --since 2022-03-01 --until 2022-03-31
+"""
+
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from profile import log_archive
+import gzip
+import json
+
+USER_FIELDS = ("user_id", "user_started_id", "user_ended_id")
+
+
+class Command(BaseCommand):
+    help = "Archive old log rows, or search and restore archived ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["archive", "list", "query", "restore"])
+        parser.add_argument(
+            "--log",
+            choices=list(log_archive.LOGS),
+            help="The log to use (archive uses every log with a retention period by default)",
+        )
+        parser.add_argument(
+            "--before",
+            type=date.fromisoformat,
+            help="Archive rows from before this date (YYYY-MM-DD) instead of the retention period",
+        )
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="Only archived rows from this date (YYYY-MM-DD) on",
+        )
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help="Only archived rows up to and including this date (YYYY-MM-DD)",
+        )
+        parser.add_argument("--user", type=int, help="Only rows for this user id")
+        parser.add_argument(
+            "--search",
+            help="Only rows containing this text (case insensitive)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show how many rows would be archived or restored",
+        )
+
+    def handle(self, *args, **options):
+        action = options["action"]
+
+        if action != "archive" and not options["log"]:
+            raise CommandError(f"Please choose a log to {action} with --log")
+
+        if action == "archive":
+            self.archive(options)
+        elif action == "list":
+            self.list(options)
+        elif action == "query":
+            for row in self.get_rows(options):
+                self.stdout.write(json.dumps(row))
+        else:
+            rows = self.get_rows(options)
+            if options["dry_run"]:
+                self.stdout.write(f"{sum(1 for _ in rows)} rows would be restored.")
+            else:
+                restored = log_archive.restore_rows(options["log"], rows)
+                self.stdout.write(self.style.SUCCESS(f"Restored {restored} rows."))
+
+    def archive(self, options):
+        log_name = options["log"]
+
+        if options["before"]:
+            if not log_name:
+                raise CommandError("Please choose a log to archive with --log")
+
+            before = timezone.make_aware(datetime.combine(options["before"], time()))
+
+        elif log_name:
+            days = settings.LOG_RETENTION_DAYS.get(log_name)
+            if not days:
+                raise CommandError(
+                    f"{log_name} has no retention period, set "
+                    f"MM_LOG_RETENTION_{log_name.upper()} or use --before."
+                )
+
+            before = timezone.now() - timedelta(days=days)
+
+        else:
+            before = None
+            results = log_archive.apply_retention(dry_run=options["dry_run"])
+
+        if before is not None:
+            if options["dry_run"]:
+                rows = log_archive.get_old_rows(log_name, before).count()
+            else:
+                rows = log_archive.archive_log(log_name, before)
+            results = {log_name: rows}
+
+        if not results:
+            self.stdout.write(
+                "No logs have a retention period, set MM_LOG_RETENTION_* or use --before."
+            )
+
+        verb = "would be archived" if options["dry_run"] else "archived"
+        for log_name, rows in results.items():
+            self.stdout.write(f"{log_name}: {rows} rows {verb}")
+
+    def list(self, options):
+        paths = log_archive.list_archives(
+            options["log"], options["since"], options["until"]
+        )
+
+        for path in paths:
+            with gzip.open(path, "rt") as archive:
+                rows = sum(1 for _ in archive)
+            self.stdout.write(f"{path} ({rows} rows)")
+
+        self.stdout.write(f"{len(paths)} archive files.")
+
+    def get_rows(self, options):
+        user = options["user"]
+        search = (options["search"] or "").lower()
+
+        for row in log_archive.iter_archive(
+            options["log"], options["since"], options["until"]
+        ):
+            if user is not None and user not in [row.get(f) for f in USER_FIELDS]:
+                continue
+            if search and search not in json.dumps(row).lower():
+                continue
+
+            yield row
@@ -0,0 +1,79 @@
+"""
+Management command to activate or deactivate many members at once.
+
+Members are updated in batches, their notifications are queued as batches and
+each affected door and interlock is synced once at the end.
+
+Usage:
+    python manage.py set_members_state inactive --subscription-status inactive --dry-run
+    python manage.py set_members_state inactive --subscription-status inactive
+    python manage.py set_members_state active --members 12 34 56 --no-notify
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from profile.models import Profile
+from profile import lifecycle
+
+
+class Command(BaseCommand):
+    help = "Activate or deactivate many members at once"
+
+    def add_arguments(self, parser):
+        parser.add_argument("state", choices=lifecycle.STATES)
+        parser.add_argument(
+            "--members",
+            nargs="+",
+            type=int,
+            help="Only these members (user ids)",
+        )
+        parser.add_argument(
+            "--subscription-status",
+            choices=[status for status, _ in Profile.SUBSCRIPTION_STATES],
+            help="Only members with this subscription status (eg. inactive for lapsed members)",
+        )
+        parser.add_argument(
+            "--no-notify",
+            action="store_true",
+            help="Don't email or SMS the members",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show what would be done without making changes",
+        )
+
+    def handle(self, *args, **options):
+        state = options["state"]
+
+        if not options["members"] and not options["subscription_status"]:
+            raise CommandError(
+                "Please choose the members to update with --members and/or --subscription-status"
+            )
+
+        members = Profile.objects.all()
+        if options["members"]:
+            members = members.filter(user_id__in=options["members"])
+        if options["subscription_status"]:
+            members = members.filter(subscription_status=options["subscription_status"])
+
+        if options["dry_run"]:
+            to_update = members.exclude(state=state).order_by("first_name", "last_name")
+            self.stdout.write(
+                f"DRY RUN - would set {to_update.count()} members to {state}:"
+            )
+            for profile in to_update:
+                self.stdout.write(f"  - {profile.get_full_name()} ({profile.state})")
+            return
+
+        result = lifecycle.set_members_state(
+            members.values_list("user_id", flat=True),
+            state,
+            notify=not options["no_notify"],
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Set {len(result['updated'])} members to {state} "
+                f"({result['unchanged']} already were) and synced {result['devices_synced']} devices."
+            )
+        )
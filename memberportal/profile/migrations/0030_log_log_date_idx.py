@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profile", "0029_fix_billing_group_subscription_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="log",
+            index=models.Index(fields=["date"], name="log_date_idx"),
+        ),
+    ]
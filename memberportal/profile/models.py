@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import timedelta, datetime
 import pytz
@@ -9,6 +9,8 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 from django.core.validators import RegexValidator
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.conf import settings
 from constance import config
 from api_general.models import SiteSession
@@ -18,6 +20,7 @@ import uuid
 import logging
 from services.emails import send_single_email, send_email_to_admin
 from services import sms
+from profile import audit_log
 from django_prometheus.models import ExportModelOperationsMixin
 
 
@@ -43,6 +46,11 @@ LOG_TYPES = (
 
 
 class Log(ExportModelOperationsMixin("log"), models.Model):
+    class Meta:
+        # the date is on this table rather than UserEventLog's, so a member's
+        # logs are found by their user index and sorted using this one
+        indexes = [models.Index(fields=["date"], name="log_date_idx")]
+
     id = models.AutoField(primary_key=True)
     logtype = models.CharField(
         "Type of action/event", choices=LOG_TYPES, max_length=30, default="generic"
@@ -102,14 +110,15 @@ def log_event(
     interlock=None,
     memberbucks_device=None,
 ):
-    EventLog(
+    audit_log.writer.write(
+        "event",
         description=description,
         logtype="generic" if event_type is None else event_type,
         data=data,
-        door=door,
-        interlock=interlock,
-        memberbucks_device=memberbucks_device,
-    ).save()
+        door_id=door.id if door else None,
+        interlock_id=interlock.id if interlock else None,
+        memberbucks_device_id=memberbucks_device.id if memberbucks_device else None,
+    )
 
 
 class UserManager(BaseUserManager):
@@ -199,9 +208,13 @@ class User(ExportModelOperationsMixin("user"), AbstractBaseUser, PermissionsMixi
         return self.admin
 
     def log_event(self, description: str, event_type, data=""):
-        UserEventLog(
-            description=description, logtype=event_type, user=self, data=data
-        ).save()
+        audit_log.writer.write(
+            "user",
+            description=description,
+            logtype=event_type,
+            user_id=self.id,
+            data=data,
+        )
 
     def __send_email(self, subject, template_vars, template_name=None):
         return send_single_email(
@@ -275,18 +288,28 @@ class User(ExportModelOperationsMixin("user"), AbstractBaseUser, PermissionsMixi
 
         return False
 
-    def email_disable_member(self):
-        return self.email_notification(
-            f"Your {config.SITE_OWNER} site access has been disabled.",
-            f"Your access to {config.SITE_OWNER} has been disabled. This could be due to many reasons, but is "
+    def get_disable_member_email(self, site_owner=None):
+        """:return: (subject, message)"""
+        site_owner = site_owner or config.SITE_OWNER
+        return (
+            f"Your {site_owner} site access has been disabled.",
+            f"Your access to {site_owner} has been disabled. This could be due to many reasons, but is "
             f"usually due to a failed membership payment. If this is unexpected, please let us know.",
         )
 
-    def email_enable_member(self):
-        message = f"Great news {self.profile.first_name}, your {config.SITE_OWNER} site access has been enabled."
-        subject = f"Your {config.SITE_OWNER} site access has been enabled."
+    def get_enable_member_email(self, site_owner=None):
+        """:return: (subject, message)"""
+        site_owner = site_owner or config.SITE_OWNER
+        return (
+            f"Your {site_owner} site access has been enabled.",
+            f"Great news {self.profile.first_name}, your {site_owner} site access has been enabled.",
+        )
 
-        return self.email_notification(subject, message)
+    def email_disable_member(self):
+        return self.email_notification(*self.get_disable_member_email())
+
+    def email_enable_member(self):
+        return self.email_notification(*self.get_enable_member_email())
 
     def reset_password(self):
         self.log_event("Password reset requested", "profile")
@@ -512,6 +535,17 @@ class Profile(ExportModelOperationsMixin("profile"), models.Model):
     def __str__(self):
         return str(self.user)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the state we loaded so we can tell when it changes
+        instance._loaded_state = instance.__dict__.get("state")
+        return instance
+
+    def state_changed(self):
+        """Returns True if the member's state has changed since it was loaded."""
+        return self.state != getattr(self, "_loaded_state", None)
+
     def generate_digital_id_token(self):
         self.digital_id_token = uuid.uuid4()
         self.digital_id_token_expire = make_aware(
@@ -530,13 +564,39 @@ class Profile(ExportModelOperationsMixin("profile"), models.Model):
         else:
             return False
 
+    def _get_device_access_filter(self):
+        return models.Q(profile=self) | models.Q(access_groups__members=self)
+
+    def get_doors(self):
+        """Returns the doors the member can use, directly or through an access group."""
+        from access.models import Doors
+
+        return Doors.objects.filter(self._get_device_access_filter()).distinct()
+
+    def get_interlocks(self):
+        """Returns the interlocks the member can use, directly or through an access group."""
+        from access.models import Interlock
+
+        return Interlock.objects.filter(self._get_device_access_filter()).distinct()
+
     def sync_access(self):
-        for door in self.doors.all():
+        for door in self.get_doors():
             door.sync()
 
-        for interlock in self.interlocks.all():
+        for interlock in self.get_interlocks():
             interlock.sync()
 
+    def grant_default_access(self):
+        """Gives the member access to every device members get by default."""
+        from access.models import Doors, Interlock
+
+        self.doors.add(
+            *Doors.objects.filter(all_members=True).values_list("id", flat=True)
+        )
+        self.interlocks.add(
+            *Interlock.objects.filter(all_members=True).values_list("id", flat=True)
+        )
+
     def deactivate(self, request=None):
         if request:
             request.user.log_event(
@@ -558,7 +618,8 @@ class Profile(ExportModelOperationsMixin("profile"), models.Model):
         sms_message.send_deactivated_access(self.phone)
         self.state = "inactive"
         self.save()
-        self.sync_access()
+        # the devices read the new state, so only sync them once it's committed
+        transaction.on_commit(self.sync_access)
         return True
 
     def activate(self, request=None):
@@ -584,7 +645,7 @@ class Profile(ExportModelOperationsMixin("profile"), models.Model):
 
         self.state = "active"
         self.save()
-        self.sync_access()
+        transaction.on_commit(self.sync_access)
         return True
 
     def set_account_only(self):
@@ -731,67 +792,54 @@ class Profile(ExportModelOperationsMixin("profile"), models.Model):
         returns a dictionary of the user's access permissions
         :return:
         """
-        doors = []
-        interlocks = []
+        timeout = settings.ACCESS_PERMISSIONS_CACHE_TIMEOUT
+        if timeout:
+            # the state is part of the key so activating or deactivating a
+            # member doesn't need to invalidate anything
+            generation = cache.get_or_set(ACCESS_PERMISSIONS_GENERATION_KEY, 0, None)
+            key = f"access_permissions:{generation}:{self.id}:{self.state}:{int(ignore_user_state)}"
+            permissions = cache.get(key)
 
-        user_active = self.state == "active"
+            if permissions is None:
+                permissions = self._get_access_permissions(ignore_user_state)
+                cache.set(key, permissions, timeout=timeout)
 
-        if ignore_user_state:
-            user_active = True
+            return permissions
 
+        return self._get_access_permissions(ignore_user_state)
+
+    def _get_access_permissions(self, ignore_user_state=False):
         from access.models import Doors, Interlock
 
-        for door in Doors.objects.all():
-            if door.hidden:
-                continue
-
-            if door in self.doors.all() and user_active:
-                doors.append(
-                    {
-                        "name": door.name,
-                        "access": True,
-                        "id": door.id,
-                        "locked_out": door.locked_out,
-                        "offline": door.get_unavailable(),
-                    }
-                )
-
-            else:
-                doors.append(
-                    {
-                        "name": door.name,
-                        "access": False,
-                        "id": door.id,
-                        "locked_out": door.locked_out,
-                        "offline": door.get_unavailable(),
-                    }
-                )
-
-        for interlock in Interlock.objects.all():
-            if interlock.hidden:
-                continue
-
-            if interlock in self.interlocks.all() and user_active:
-                interlocks.append(
-                    {
-                        "name": interlock.name,
-                        "access": True,
-                        "id": interlock.id,
-                        "locked_out": interlock.locked_out,
-                        "offline": interlock.get_unavailable(),
-                    }
-                )
-
-            else:
-                interlocks.append(
-                    {
-                        "name": interlock.name,
-                        "access": False,
-                        "id": interlock.id,
-                        "locked_out": interlock.locked_out,
-                        "offline": interlock.get_unavailable(),
-                    }
-                )
+        user_active = ignore_user_state or self.state == "active"
+
+        door_ids = (
+            set(self.get_doors().values_list("id", flat=True)) if user_active else set()
+        )
+        interlock_ids = (
+            set(self.get_interlocks().values_list("id", flat=True))
+            if user_active
+            else set()
+        )
+
+        def get_permission(device, device_ids):
+            return {
+                "name": device.name,
+                "access": device.id in device_ids,
+                "id": device.id,
+                "locked_out": device.locked_out,
+                "offline": device.get_unavailable(),
+            }
+
+        fields = ("id", "name", "locked_out", "last_seen")
+        doors = [
+            get_permission(door, door_ids)
+            for door in Doors.objects.filter(hidden=False).only(*fields)
+        ]
+        interlocks = [
+            get_permission(interlock, interlock_ids)
+            for interlock in Interlock.objects.filter(hidden=False).only(*fields)
+        ]
 
         return {"doors": doors, "interlocks": interlocks}
 
@@ -829,10 +877,39 @@ class Profile(ExportModelOperationsMixin("profile"), models.Model):
         if not self.id:
             self.created = timezone.now()
         self.modified = timezone.now()
-        return super(Profile, self).save(*args, **kwargs)
+        result = super(Profile, self).save(*args, **kwargs)
+        self._loaded_state = self.state
+        return result
 
     def has_billing_group_invite(self):
         return self.billing_group_invite is not None
 
     def has_billing_group(self):
         return self.billing_group is not None
+
+
+ACCESS_PERMISSIONS_GENERATION_KEY = "profile:access_permissions_generation"
+
+
+def invalidate_access_permissions(**kwargs):
+    """Invalidates every member's cached access permissions."""
+    try:
+        cache.incr(ACCESS_PERMISSIONS_GENERATION_KEY)
+    except ValueError:
+        cache.set(ACCESS_PERMISSIONS_GENERATION_KEY, 1, None)
+
+
+def on_device_saved(sender, instance, update_fields=None, **kwargs):
+    # devices save their last_seen time on every check in, which only changes
+    # the offline status and can wait for the cache to expire
+    if update_fields and set(update_fields) <= {"last_seen"}:
+        return
+
+    invalidate_access_permissions()
+
+
+m2m_changed.connect(invalidate_access_permissions, sender=Profile.doors.through)
+m2m_changed.connect(invalidate_access_permissions, sender=Profile.interlocks.through)
+for device_model in ("access.Doors", "access.Interlock"):
+    post_save.connect(on_device_saved, sender=device_model)
+    post_delete.connect(invalidate_access_permissions, sender=device_model)
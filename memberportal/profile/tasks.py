@@ -0,0 +1,26 @@
+from membermatters.celeryapp import app
+from profile import log_archive
+import logging
+
+logger = logging.getLogger("profile")
+
+
+@app.on_after_finalize.connect
+def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(
+        3600 * 24,
+        archive_old_logs.s(),
+        expires=3600,
+        name="celery_archive_old_logs",
+    )
+
+
+@app.task
+def archive_old_logs():
+    """Archives log rows that are older than their retention period."""
+    results = log_archive.apply_retention()
+
+    if results:
+        logger.info(f"Archived old log rows: {results}")
+
+    return results
@@ -7,6 +7,10 @@ This script helps identify:
 2. Duplicate Stripe products
 3. Orphaned Stripe products (products without corresponding add-ons)
 
+Stripe is read once with auto-paged list calls, and products are archived
+concurrently with --workers requests at a time. Use --api-base to point the
+script at stripe-mock.
+
 Usage:
     python scripts/cleanup_duplicate_addons.py --dry-run  # Just show what would be cleaned
     python scripts/cleanup_duplicate_addons.py --cleanup  # Actually perform cleanup
@@ -28,6 +32,7 @@ django.setup()
 
 from constance import config
 from api_admin_tools.models import SubscriptionAddon
+from api_admin_tools import stripe_sync
 
 
 def find_database_duplicates():
@@ -56,91 +61,40 @@ def find_database_duplicates():
     return duplicates
 
 
-def find_stripe_duplicates():
+def find_stripe_duplicates(products):
     """Find duplicate Stripe products"""
     print("\n=== Checking for duplicate Stripe products ===")
 
-    if not config.ENABLE_STRIPE:
-        print("✗ Stripe is not enabled")
-        return {}
-
-    try:
-        stripe.api_key = config.STRIPE_SECRET_KEY
-
-        # Get all products
-        products = stripe.Product.list(limit=100, active=True)
-
-        # Group by name and addon type
-        product_groups = defaultdict(list)
-        for product in products.data:
-            addon_type = product.metadata.get("addon_type", "unknown")
-            key = f"{product.name}_{addon_type}"
-            product_groups[key].append(product)
-
-        duplicates = {k: v for k, v in product_groups.items() if len(v) > 1}
-
-        if duplicates:
-            print(f"Found {len(duplicates)} duplicate product groups:")
-            for key, products_list in duplicates.items():
-                print(f"\n  {key}:")
-                for product in products_list:
-                    print(
-                        f"    - ID: {product.id}, Created: {product.created}, Django ID: {product.metadata.get('django_id', 'N/A')}"
-                    )
-        else:
-            print("✓ No duplicate Stripe products found")
-
-        return duplicates
-
-    except stripe.error.StripeError as e:
-        print(f"✗ Stripe error: {str(e)}")
-        return {}
-    except Exception as e:
-        print(f"✗ Error: {str(e)}")
-        return {}
-
-
-def find_orphaned_stripe_products():
-    """Find Stripe products that don't have corresponding add-ons"""
-    print("\n=== Checking for orphaned Stripe products ===")
+    duplicates = stripe_sync.find_duplicate_products(products)
 
-    if not config.ENABLE_STRIPE:
-        print("✗ Stripe is not enabled")
-        return []
-
-    try:
-        stripe.api_key = config.STRIPE_SECRET_KEY
+    if duplicates:
+        print(f"Found {len(duplicates)} duplicate product groups:")
+        for key, products_list in duplicates.items():
+            print(f"\n  {key}:")
+            for product in products_list:
+                print(
+                    f"    - ID: {product.id}, Created: {product.created}, Django ID: {product.metadata.get('django_id', 'N/A')}"
+                )
+    else:
+        print("✓ No duplicate Stripe products found")
 
-        # Get all products
-        products = stripe.Product.list(limit=100, active=True)
+    return duplicates
 
-        # Get all add-on Stripe product IDs
-        addon_product_ids = set(
-            SubscriptionAddon.objects.exclude(stripe_product_id="").values_list(
-                "stripe_product_id", flat=True
-            )
-        )
 
-        orphaned = []
-        for product in products.data:
-            if product.id not in addon_product_ids:
-                orphaned.append(product)
+def find_orphaned_stripe_products(products):
+    """Find Stripe products that don't have corresponding add-ons"""
+    print("\n=== Checking for orphaned Stripe products ===")
 
-        if orphaned:
-            print(f"Found {len(orphaned)} orphaned products:")
-            for product in orphaned:
-                print(f"  - {product.id}: {product.name} (created: {product.created})")
-        else:
-            print("✓ No orphaned Stripe products found")
+    orphaned = stripe_sync.find_orphaned_products(products)
 
-        return orphaned
+    if orphaned:
+        print(f"Found {len(orphaned)} orphaned products:")
+        for product in orphaned:
+            print(f"  - {product.id}: {product.name} (created: {product.created})")
+    else:
+        print("✓ No orphaned Stripe products found")
 
-    except stripe.error.StripeError as e:
-        print(f"✗ Stripe error: {str(e)}")
-        return []
-    except Exception as e:
-        print(f"✗ Error: {str(e)}")
-        return []
+    return orphaned
 
 
 def cleanup_database_duplicates(duplicates, dry_run=True):
@@ -174,7 +128,20 @@ def cleanup_database_duplicates(duplicates, dry_run=True):
                     print(f"  ✗ Failed to delete {addon.id}: {str(e)}")
 
 
-def cleanup_stripe_duplicates(duplicates, dry_run=True):
+def _archive_products(products, prices, workers):
+    for product, archived_prices, error in stripe_sync.archive_products(
+        products, prices, workers
+    ):
+        if error:
+            print(f"  ✗ Failed to archive {product.id}: {error}")
+            continue
+
+        print(f"  ✓ Archived product: {product.id}")
+        for price_id in archived_prices:
+            print(f"    ✓ Archived price: {price_id}")
+
+
+def cleanup_stripe_duplicates(duplicates, prices, workers, dry_run=True):
     """Clean up duplicate Stripe products"""
     print("\n=== Cleaning up Stripe duplicates ===")
 
@@ -182,45 +149,20 @@ def cleanup_stripe_duplicates(duplicates, dry_run=True):
         print("No duplicates to clean up")
         return
 
-    if not config.ENABLE_STRIPE:
-        print("✗ Stripe is not enabled")
-        return
-
-    try:
-        stripe.api_key = config.STRIPE_SECRET_KEY
-
-        for key, products_list in duplicates.items():
-            print(f"\nProcessing {key}:")
-
-            # Sort by creation date (keep the oldest)
-            products_list.sort(key=lambda p: p.created)
-
-            # Keep the first one, archive the rest
-            for i, product in enumerate(products_list[1:], 1):
-                if dry_run:
-                    print(f"  Would archive: {product.id} (created: {product.created})")
-                else:
-                    try:
-                        # Archive the product
-                        stripe.Product.modify(product.id, active=False)
-                        print(f"  ✓ Archived product: {product.id}")
-
-                        # Archive associated prices
-                        prices = stripe.Price.list(product=product.id, active=True)
-                        for price in prices.data:
-                            stripe.Price.modify(price.id, active=False)
-                            print(f"    ✓ Archived price: {price.id}")
-
-                    except stripe.error.StripeError as e:
-                        print(f"  ✗ Failed to archive {product.id}: {str(e)}")
+    # Keep the oldest product in each group, archive the rest
+    to_archive = []
+    for key, products_list in duplicates.items():
+        print(f"\nProcessing {key}:")
+        for product in products_list[1:]:
+            if dry_run:
+                print(f"  Would archive: {product.id} (created: {product.created})")
+            to_archive.append(product)
 
-    except stripe.error.StripeError as e:
-        print(f"✗ Stripe error: {str(e)}")
-    except Exception as e:
-        print(f"✗ Error: {str(e)}")
+    if not dry_run:
+        _archive_products(to_archive, prices, workers)
 
 
-def cleanup_orphaned_products(orphaned, dry_run=True):
+def cleanup_orphaned_products(orphaned, prices, workers, dry_run=True):
     """Clean up orphaned Stripe products"""
     print("\n=== Cleaning up orphaned Stripe products ===")
 
@@ -228,35 +170,11 @@ def cleanup_orphaned_products(orphaned, dry_run=True):
         print("No orphaned products to clean up")
         return
 
-    if not config.ENABLE_STRIPE:
-        print("✗ Stripe is not enabled")
-        return
-
-    try:
-        stripe.api_key = config.STRIPE_SECRET_KEY
-
+    if dry_run:
         for product in orphaned:
-            if dry_run:
-                print(f"Would archive orphaned product: {product.id} ({product.name})")
-            else:
-                try:
-                    # Archive the product
-                    stripe.Product.modify(product.id, active=False)
-                    print(f"✓ Archived orphaned product: {product.id}")
-
-                    # Archive associated prices
-                    prices = stripe.Price.list(product=product.id, active=True)
-                    for price in prices.data:
-                        stripe.Price.modify(price.id, active=False)
-                        print(f"  ✓ Archived price: {price.id}")
-
-                except stripe.error.StripeError as e:
-                    print(f"✗ Failed to archive {product.id}: {str(e)}")
-
-    except stripe.error.StripeError as e:
-        print(f"✗ Stripe error: {str(e)}")
-    except Exception as e:
-        print(f"✗ Error: {str(e)}")
+            print(f"Would archive orphaned product: {product.id} ({product.name})")
+    else:
+        _archive_products(orphaned, prices, workers)
 
 
 def main():
@@ -271,6 +189,16 @@ def main():
     parser.add_argument(
         "--cleanup", action="store_true", help="Actually perform the cleanup"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=stripe_sync.DEFAULT_WORKERS,
+        help="Number of concurrent Stripe requests",
+    )
+    parser.add_argument(
+        "--api-base",
+        help="Stripe API base URL (eg. http://localhost:12111 for stripe-mock)",
+    )
 
     args = parser.parse_args()
 
@@ -279,11 +207,25 @@ def main():
         sys.exit(1)
 
     dry_run = args.dry_run
+    workers = max(1, args.workers)
 
     # Find duplicates
     db_duplicates = find_database_duplicates()
-    stripe_duplicates = find_stripe_duplicates()
-    orphaned_products = find_orphaned_stripe_products()
+
+    stripe_duplicates, orphaned_products, prices = {}, [], {}
+    if not config.ENABLE_STRIPE:
+        print("\n✗ Stripe is not enabled")
+    else:
+        try:
+            # read Stripe once and check the same snapshot for both problems
+            stripe_sync.configure_stripe(workers, args.api_base)
+            products = stripe_sync.list_products()
+            prices = stripe_sync.list_prices_by_product()
+
+            stripe_duplicates = find_stripe_duplicates(products)
+            orphaned_products = find_orphaned_stripe_products(products)
+        except stripe.error.StripeError as e:
+            print(f"\n✗ Stripe error: {str(e)}")
 
     # Summary
     total_issues = len(db_duplicates) + len(stripe_duplicates) + len(orphaned_products)
@@ -306,8 +248,8 @@ def main():
 
     # Perform cleanup
     cleanup_database_duplicates(db_duplicates, dry_run)
-    cleanup_stripe_duplicates(stripe_duplicates, dry_run)
-    cleanup_orphaned_products(orphaned_products, dry_run)
+    cleanup_stripe_duplicates(stripe_duplicates, prices, workers, dry_run)
+    cleanup_orphaned_products(orphaned_products, prices, workers, dry_run)
 
     if not dry_run:
         print("\n✅ Cleanup completed!")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+Script to compare the endpoint benchmarks of two git revisions.
+
+Each revision is checked out into a temporary git worktree and runs the
+benchmark_endpoints command (the copy from this tree, so both revisions are
+measured the same way) against its own copy of the database. The copy is
+migrated to the revision first, so use a database that is at or before the
+older revision's migrations (eg. one made by generate_dataset on that
+revision). Prints a report of the changes in query count, time and memory.
+Both revisions run on this machine, so their times can be compared.
+
+Usage:
+    python scripts/compare_benchmarks.py main HEAD
+    python scripts/compare_benchmarks.py v3.2.0 my-branch --repeat 10 --output report.md
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+PORTAL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMAND = os.path.join(
+    "api_admin_tools", "management", "commands", "benchmark_endpoints.py"
+)
+
+# changes smaller than these are treated as noise
+TIME_THRESHOLD = 0.2
+MEMORY_THRESHOLD = 0.2
+
+
+def git(*args, cwd=PORTAL_DIR):
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def run_benchmark(revision, database, workdir, args):
+    """Runs the benchmarks on a revision and returns its results."""
+    repo_dir = git("rev-parse", "--show-toplevel")
+    portal_path = os.path.relpath(PORTAL_DIR, repo_dir)
+    worktree = os.path.join(workdir, revision.replace("/", "_"))
+
+    print(f"=== Benchmarking {revision} ===")
+    git("worktree", "add", "--detach", worktree, revision)
+
+    try:
+        portal_dir = os.path.join(worktree, portal_path)
+        shutil.copy(
+            os.path.join(PORTAL_DIR, COMMAND), os.path.join(portal_dir, COMMAND)
+        )
+
+        env = dict(os.environ, MM_DB_LOCATION=os.path.join(worktree, "db.sqlite3"))
+        shutil.copy(database, env["MM_DB_LOCATION"])
+
+        results = os.path.join(worktree, "results.json")
+        command = [
+            sys.executable,
+            "manage.py",
+            "benchmark_endpoints",
+            "--repeat",
+            str(args.repeat),
+            "--json",
+            results,
+            # only compare the revisions, not the budgets
+            "--budgets",
+            os.path.join(worktree, "no-budgets.json"),
+        ]
+        if args.only:
+            command += ["--only", *args.only]
+
+        subprocess.run(
+            [sys.executable, "manage.py", "migrate", "-v0"],
+            cwd=portal_dir,
+            env=env,
+            check=True,
+        )
+        subprocess.run(command, cwd=portal_dir, env=env, check=True)
+
+        with open(results) as file:
+            return json.load(file)["endpoints"]
+
+    finally:
+        git("worktree", "remove", "--force", worktree)
+
+
+def change(old, new):
+    if not old:
+        return ""
+    return f"{(new - old) / old:+.0%}"
+
+
+def make_report(base, head, base_results, head_results):
+    """Returns a markdown report of the changes and a list of regressions."""
+    lines = [
+        f"## Endpoint benchmarks: {base} → {head}",
+        "",
+        "| Endpoint | Queries | Median time (ms) | Peak memory (kB) |",
+        "| --- | --- | --- | --- |",
+    ]
+    regressions = []
+
+    for name, new in head_results.items():
+        old = base_results.get(name)
+        if old is None:
+            lines.append(
+                f"| {name} | {new['queries']} | {new['time_ms']} | {new['memory_kb']} |"
+            )
+            continue
+
+        slower = new["time_ms"] > old["time_ms"] * (1 + TIME_THRESHOLD)
+        bigger = new["memory_kb"] > old["memory_kb"] * (1 + MEMORY_THRESHOLD)
+        if new["queries"] > old["queries"] or slower or bigger:
+            regressions.append(name)
+
+        lines.append(
+            f"| {'⚠️ ' if name in regressions else ''}{name} "
+            f"| {old['queries']} → {new['queries']} "
+            f"| {old['time_ms']} → {new['time_ms']} ({change(old['time_ms'], new['time_ms'])}) "
+            f"| {old['memory_kb']} → {new['memory_kb']} ({change(old['memory_kb'], new['memory_kb'])}) |"
+        )
+
+    return "\n".join(lines) + "\n", regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the endpoint benchmarks of two git revisions"
+    )
+    parser.add_argument("base", help="The revision to compare against")
+    parser.add_argument("head", help="The revision to compare")
+    parser.add_argument(
+        "--database",
+        default=os.environ.get("MM_DB_LOCATION"),
+        help="The SQLite database to benchmark with (defaults to MM_DB_LOCATION)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="Only compare these endpoints")
+    parser.add_argument("--output", help="Also save the report to this file")
+    args = parser.parse_args()
+
+    if not args.database or not os.path.exists(args.database):
+        parser.error("Please set --database (or MM_DB_LOCATION) to a SQLite database")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        base_results = run_benchmark(args.base, args.database, workdir, args)
+        head_results = run_benchmark(args.head, args.database, workdir, args)
+
+    report, regressions = make_report(args.base, args.head, base_results, head_results)
+    print()
+    print(report)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report)
+
+    if regressions:
+        print(f"{len(regressions)} endpoints regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
-import requests
-from django.conf import settings
 from constance import config
+from services.notifications import post_to_discord
 import logging
 
 logger = logging.getLogger("discord")
@@ -52,10 +51,7 @@ def post_door_swipe_to_discord(name, door, status):
                 }
             )
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_discord(url, json_message)
 
     return True
 
@@ -124,10 +120,7 @@ def post_interlock_swipe_to_discord(name, interlock, type, time=None):
                 }
             )
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_discord(url, json_message)
 
     else:
         return True
@@ -147,10 +140,7 @@ def post_kiosk_swipe_to_discord(name, sign_in):
             }
         )
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_discord(url, json_message)
 
     return True
 
@@ -172,10 +162,7 @@ def post_purchase_to_discord(description):
             }
         )
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_discord(url, json_message)
 
     return True
 
@@ -208,10 +195,7 @@ def post_reported_issue_to_discord(
                 "color": 5025616,
             }
         )
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_discord(url, json_message)
 
     return True
 
@@ -230,9 +214,6 @@ def post_door_bump_to_discord(name, door):
             }
         )
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_discord(url, json_message)
 
     return True
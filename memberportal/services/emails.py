@@ -1,23 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.utils.html import escape
 from constance import config
-from postmarker.core import PostmarkClient, ClientError
+from postmarker.core import PostmarkClient
+from membermatters.celeryapp import app
+from api_general.models import OutboundEmail
+from datetime import timedelta
+import threading
 import logging
 import json
 
 logger = logging.getLogger("emails")
 
+EMAIL_DELIVERY_SCHEDULED_KEY = "services:emails:delivery_scheduled"
 
-def send_single_email(
-    to_email: object,
-    subject: object,
-    template_vars: object,
-    template_name=None,
-    reply_to=None,
-    user: object | None = None,
-) -> object:
-    # TODO: move to celery
+# how long a worker may hold a claimed batch before it's considered abandoned
+EMAIL_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+_postmark_client = None
+_postmark_client_key = None
+_postmark_lock = threading.Lock()
 
+
+def get_postmark_client():
+    """
+    Returns a Postmark client that is reused (along with its HTTP session) until
+    the API key or URL changes.
+    """
+    global _postmark_client, _postmark_client_key
+
+    client_key = (config.POSTMARK_API_KEY, settings.POSTMARK_API_URL)
+
+    with _postmark_lock:
+        if _postmark_client is None or _postmark_client_key != client_key:
+            _postmark_client = PostmarkClient(
+                server_token=client_key[0], root_api_url=client_key[1]
+            )
+            _postmark_client_key = client_key
+
+        return _postmark_client
+
+
+def render_email(template_vars, template_name=None):
     template_to_use = template_name if template_name else "email_without_button.html"
     logger.debug("Using email template: " + template_to_use)
     logger.debug("Using template vars: " + json.dumps(template_vars))
@@ -27,52 +54,74 @@ def send_single_email(
             "~br~", "<br>"
         )
 
-    email_string = render_to_string(
-        template_to_use, {"email": template_vars, "config": config}
-    )
+    return render_to_string(template_to_use, {"email": template_vars, "config": config})
 
-    if config.POSTMARK_API_KEY:
-        postmark = PostmarkClient(server_token=config.POSTMARK_API_KEY)
-        try:
-            postmark.emails.send(
-                From=config.EMAIL_DEFAULT_FROM,
-                To=to_email,
-                Subject=subject,
-                HtmlBody=email_string,
-                ReplyTo=reply_to or config.EMAIL_DEFAULT_FROM,
-            )
-        except ClientError as e:
-            code = e.error_code
-
-            if code == 406:
-                if user:
-                    logger.warning(
-                        f"Email NOT sent because recipient is INACTIVE in postmark"
-                    )
-                    user.log_event(
-                        "Email NOT sent because recipient is INACTIVE in postmark: ",
-                        "email",
-                        "Email content: " + json.dumps(template_vars),
-                    )
-            else:
-                logger.error("Error sending email: " + str(e))
-                raise e
-
-        if user:
-            logger.info("Email sent to " + to_email + " with subject: " + subject)
-            user.log_event(
-                "Sent email with subject: " + subject,
-                "email",
-                "Email content: " + json.dumps(template_vars),
-            )
-    else:
+
+def _schedule_delivery():
+    # only one delivery run needs to be pending at a time, bursts of emails
+    # queued before it starts are sent together as one batch
+    if cache.add(EMAIL_DELIVERY_SCHEDULED_KEY, True, timeout=60):
+        send_queued_emails.apply_async(countdown=settings.EMAIL_BATCH_DELAY)
+
+
+def queue_emails(emails):
+    """
+    Adds a list of emails to the outbox and schedules delivery. Each email is a
+    dict with to_email, subject, template_vars and optionally template_name,
+    reply_to and user.
+    :return: the number of emails queued
+    """
+    if not config.POSTMARK_API_KEY:
         logger.warning("No postmark API key set, not sending email")
-        if user:
-            user.log_event(
-                "Email NOT sent due to configuration issue: " + subject,
-                "email",
-                "Email content: " + json.dumps(template_vars),
+        for email in emails:
+            if email.get("user"):
+                email["user"].log_event(
+                    "Email NOT sent due to configuration issue: " + email["subject"],
+                    "email",
+                    "Email content: " + json.dumps(email["template_vars"]),
+                )
+        return 0
+
+    outbound_emails = []
+    for email in emails:
+        html_body = render_email(email["template_vars"], email.get("template_name"))
+        outbound_emails.append(
+            OutboundEmail(
+                user=email.get("user"),
+                to_email=email["to_email"],
+                reply_to=email.get("reply_to") or "",
+                subject=email["subject"],
+                html_body=html_body,
+                template_vars=json.dumps(email["template_vars"]),
             )
+        )
+
+    OutboundEmail.objects.bulk_create(outbound_emails)
+    transaction.on_commit(_schedule_delivery)
+
+    return len(outbound_emails)
+
+
+def send_single_email(
+    to_email: object,
+    subject: object,
+    template_vars: object,
+    template_name=None,
+    reply_to=None,
+    user: object | None = None,
+) -> object:
+    queue_emails(
+        [
+            {
+                "to_email": to_email,
+                "subject": subject,
+                "template_vars": template_vars,
+                "template_name": template_name,
+                "reply_to": reply_to,
+                "user": user,
+            }
+        ]
+    )
     return True
 
 
@@ -91,3 +140,143 @@ def send_email_to_admin(
         reply_to=reply_to,
         user=user,
     )
+
+
+def _claim_queued_emails(limit):
+    """
+    Claims a batch of due emails for this worker. Claimed emails can be
+    reclaimed by another worker if they aren't resolved within
+    EMAIL_CLAIM_TIMEOUT.
+    """
+    now = timezone.now()
+
+    # MariaDB can't SKIP LOCKED or lock only some tables (OF), so only ask for
+    # them where the database supports them
+    lock_options = {}
+    if connection.features.has_select_for_update_skip_locked:
+        lock_options["skip_locked"] = True
+    if connection.features.has_select_for_update_of:
+        lock_options["of"] = ("self",)
+
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(**lock_options)
+            .select_related("user")
+            .filter(status__in=["queued", "sending"], next_attempt__lte=now)
+            .order_by("next_attempt")[:limit]
+        )
+        OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            status="sending", next_attempt=now + EMAIL_CLAIM_TIMEOUT
+        )
+
+    return emails
+
+
+def _retry_later(email, error):
+    email.attempts += 1
+    email.last_error = error
+
+    if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        logger.error(
+            f"Giving up on email to {email.to_email} after {email.attempts} attempts: {error}"
+        )
+        email.status = "dead"
+    else:
+        email.status = "queued"
+        email.next_attempt = timezone.now() + timedelta(minutes=2**email.attempts)
+
+
+def deliver_queued_emails(limit=None):
+    """
+    Sends a batch of queued emails with one call to the Postmark batch API.
+    :return: the number of emails processed
+    """
+    emails = _claim_queued_emails(limit or settings.EMAIL_BATCH_SIZE)
+
+    if not emails:
+        return 0
+
+    messages = [
+        {
+            "From": config.EMAIL_DEFAULT_FROM,
+            "To": email.to_email,
+            "Subject": email.subject,
+            "HtmlBody": email.html_body,
+            "ReplyTo": email.reply_to or config.EMAIL_DEFAULT_FROM,
+        }
+        for email in emails
+    ]
+
+    try:
+        responses = get_postmark_client().emails.send_batch(*messages)
+
+    except Exception as e:
+        logger.error("Error sending email batch: " + str(e))
+        for email in emails:
+            _retry_later(email, str(e))
+        responses = []
+
+    for email, response in zip(emails, responses):
+        code = response.get("ErrorCode")
+
+        if code == 0:
+            email.status = "sent"
+            email.sent_date = timezone.now()
+            email.provider_message_id = response.get("MessageID")
+            logger.info(
+                "Email sent to " + email.to_email + " with subject: " + email.subject
+            )
+            if email.user:
+                email.user.log_event(
+                    "Sent email with subject: " + email.subject,
+                    "email",
+                    "Email content: " + email.template_vars,
+                )
+
+        elif code == 406:
+            logger.warning(f"Email NOT sent because recipient is INACTIVE in postmark")
+            email.status = "failed"
+            email.last_error = response.get("Message")
+            if email.user:
+                email.user.log_event(
+                    "Email NOT sent because recipient is INACTIVE in postmark: ",
+                    "email",
+                    "Email content: " + email.template_vars,
+                )
+
+        else:
+            logger.error(
+                f"Error sending email: [{code}] {response.get('Message')}",
+            )
+            _retry_later(email, f"[{code}] {response.get('Message')}")
+
+    OutboundEmail.objects.bulk_update(
+        emails,
+        [
+            "status",
+            "attempts",
+            "last_error",
+            "next_attempt",
+            "sent_date",
+            "provider_message_id",
+        ],
+    )
+
+    return len(emails)
+
+
+@app.task
+def send_queued_emails():
+    """Drains the email outbox in batches."""
+    cache.delete(EMAIL_DELIVERY_SCHEDULED_KEY)
+
+    total = 0
+    while True:
+        processed = deliver_queued_emails()
+        total += processed
+
+        if processed < settings.EMAIL_BATCH_SIZE:
+            break
+
+    logger.debug(f"Processed {total} queued emails.")
+    return total
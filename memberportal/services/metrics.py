@@ -0,0 +1,89 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+sms_messages_total = Counter(
+    "mm_sms_messages_total",
+    "Number of SMS messages processed by the SMS dispatcher",
+    ["status"],
+)
+
+sms_delivery_latency_seconds = Histogram(
+    "mm_sms_delivery_latency_seconds",
+    "Time from an SMS being queued to it being accepted by the provider",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+
+notifications_total = Counter(
+    "mm_notifications_total",
+    "Number of Discord/Slack notifications by outcome (sent, coalesced, delayed, dropped, failed)",
+    ["service", "status"],
+)
+
+notifications_pending = Gauge(
+    "mm_notifications_pending",
+    "Number of Discord/Slack notifications waiting to be sent",
+    ["service"],
+)
+
+stripe_mirror_reads_total = Counter(
+    "mm_stripe_mirror_reads_total",
+    "Reads of the local Stripe mirror by result (hit, miss, stale)",
+    ["object", "result"],
+)
+
+stripe_webhook_events_total = Counter(
+    "mm_stripe_webhook_events_total",
+    "Stripe webhook events by outcome (received, duplicate, processed, failed)",
+    ["type", "status"],
+)
+
+stripe_webhook_lag_seconds = Histogram(
+    "mm_stripe_webhook_lag_seconds",
+    "Time from Stripe creating a webhook event to us processing it",
+    buckets=(1, 2.5, 5, 10, 30, 60, 300, 900, 3600, 21600),
+)
+
+stripe_webhook_events_pending = Gauge(
+    "mm_stripe_webhook_events_pending",
+    "Number of Stripe webhook events waiting to be processed",
+)
+
+stripe_reconciliation_duration_seconds = Histogram(
+    "mm_stripe_reconciliation_duration_seconds",
+    "Time taken to reconcile member subscriptions with Stripe",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+
+stripe_reconciliation_corrections_total = Counter(
+    "mm_stripe_reconciliation_corrections_total",
+    "Member subscription corrections made by reconciliation with Stripe",
+    ["change"],
+)
+
+log_archive_rows_total = Counter(
+    "mm_log_archive_rows_total",
+    "Log rows moved from the database to archive files",
+    ["log"],
+)
+
+metric_rows_downsampled_total = Counter(
+    "mm_metric_rows_downsampled_total",
+    "Old metric rows removed by downsampling",
+    ["resolution"],
+)
+
+audit_log_buffered = Gauge(
+    "mm_audit_log_buffered",
+    "Number of event logs waiting to be saved",
+)
+
+audit_log_flush_seconds = Histogram(
+    "mm_audit_log_flush_seconds",
+    "Time taken to save a batch of buffered event logs",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+audit_log_events_total = Counter(
+    "mm_audit_log_events_total",
+    "Event logs saved from the buffer by outcome (written, dropped)",
+    ["status"],
+)
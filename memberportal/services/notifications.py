@@ -0,0 +1,223 @@
+from collections import deque
+from django.conf import settings
+from services import metrics
+import requests
+import threading
+import logging
+import atexit
+import time
+import os
+
+logger = logging.getLogger("notifications")
+
+# Discord allows at most 10 embeds in one webhook message
+DISCORD_MAX_EMBEDS = 10
+SLACK_MAX_LINES = 20
+
+
+def _coalesce_discord(messages):
+    """
+    Merges queued Discord messages into one webhook payload. Returns the payload
+    and the number of messages it includes.
+    """
+    content = []
+    embeds = []
+    count = 0
+
+    for message in messages:
+        message_embeds = message.get("embeds", [])
+        if count and len(embeds) + len(message_embeds) > DISCORD_MAX_EMBEDS:
+            break
+
+        if message.get("content"):
+            content.append(message["content"])
+        embeds.extend(message_embeds)
+        count += 1
+
+    payload = {"embeds": embeds}
+    if content:
+        payload["content"] = "\n".join(content)
+
+    return payload, count
+
+
+def _coalesce_slack(messages):
+    """
+    Merges queued Slack messages into one webhook payload. Returns the payload
+    and the number of messages it includes.
+    """
+    lines = [message.get("text", "") for message in messages[:SLACK_MAX_LINES]]
+
+    return {"text": "\n".join(lines)}, len(lines)
+
+
+COALESCERS = {"discord": _coalesce_discord, "slack": _coalesce_slack}
+
+
+def _get_retry_after(response):
+    """Returns how many seconds a rate limited webhook asked us to wait."""
+    retry_after = response.headers.get("Retry-After")
+
+    if retry_after is None:
+        try:
+            retry_after = response.json().get("retry_after")
+        except ValueError:
+            retry_after = None
+
+    try:
+        return max(float(retry_after), 0)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class NotificationDispatcher:
+    """
+    Sends Discord and Slack webhook notifications from a background thread.
+
+    Messages are buffered per webhook and flushed every flush_interval
+    seconds, so a burst of swipes becomes one webhook call. A webhook that
+    responds with 429 is paused for its Retry-After period and its messages are
+    kept until then. Each webhook buffers at most max_pending messages and the
+    oldest are dropped beyond that.
+    """
+
+    def __init__(self, flush_interval, max_pending, timeout):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._blocked_until = {}
+        self._thread = None
+        self._pid = None
+        self._session = None
+
+    def _ensure_started(self):
+        # a forked process (eg. a celery worker) doesn't inherit our thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._session = requests.Session()
+                self._thread = threading.Thread(
+                    target=self._run, name="notification-dispatcher", daemon=True
+                )
+                self._thread.start()
+
+    def post(self, url, message, service):
+        """Queues a webhook message to be sent on the next flush."""
+        self._ensure_started()
+
+        with self._lock:
+            service_pending = self._pending.setdefault(url, (service, deque()))[1]
+
+            if len(service_pending) >= self.max_pending:
+                service_pending.popleft()
+                metrics.notifications_total.labels(
+                    service=service, status="dropped"
+                ).inc()
+                logger.warning(f"Dropped a queued {service} notification.")
+
+            service_pending.append(message)
+            metrics.notifications_pending.labels(service=service).inc()
+
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing notifications: {e}")
+
+    def _take_batches(self):
+        now = time.monotonic()
+        batches = []
+
+        with self._lock:
+            for url, (service, pending) in self._pending.items():
+                if not pending:
+                    continue
+
+                # rate limited messages were counted as delayed when requeued
+                if self._blocked_until.get(url, 0) > now:
+                    continue
+
+                payload, count = COALESCERS[service](list(pending))
+                messages = [pending.popleft() for _ in range(count)]
+                metrics.notifications_pending.labels(service=service).dec(count)
+                batches.append((url, service, payload, messages))
+
+        return batches
+
+    def _requeue(self, url, service, messages):
+        with self._lock:
+            pending = self._pending.setdefault(url, (service, deque()))[1]
+            pending.extendleft(reversed(messages))
+            metrics.notifications_pending.labels(service=service).inc(len(messages))
+
+    def flush(self):
+        """Sends one coalesced message to every webhook that has messages queued."""
+        for url, service, payload, messages in self._take_batches():
+            count = len(messages)
+
+            try:
+                response = self._session.post(url, json=payload, timeout=self.timeout)
+
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Failed to post {service} notification: {e}")
+                metrics.notifications_total.labels(
+                    service=service, status="failed"
+                ).inc(count)
+                continue
+
+            if response.status_code == 429:
+                retry_after = _get_retry_after(response)
+                logger.warning(
+                    f"{service} webhook rate limited us, retrying in {retry_after}s."
+                )
+                self._blocked_until[url] = time.monotonic() + retry_after
+                self._requeue(url, service, messages)
+                metrics.notifications_total.labels(
+                    service=service, status="delayed"
+                ).inc(count)
+
+            elif response.status_code >= 400:
+                logger.warning(
+                    f"Failed to post {service} notification: {response.status_code} {response.text}"
+                )
+                metrics.notifications_total.labels(
+                    service=service, status="failed"
+                ).inc(count)
+
+            else:
+                metrics.notifications_total.labels(service=service, status="sent").inc()
+                if count > 1:
+                    metrics.notifications_total.labels(
+                        service=service, status="coalesced"
+                    ).inc(count - 1)
+
+
+dispatcher = NotificationDispatcher(
+    flush_interval=settings.NOTIFICATION_FLUSH_INTERVAL,
+    max_pending=settings.NOTIFICATION_MAX_PENDING,
+    timeout=settings.NOTIFICATION_REQUEST_TIMEOUT,
+)
+
+
+@atexit.register
+def _flush_on_exit():
+    if dispatcher._thread is not None and dispatcher._pid == os.getpid():
+        dispatcher.flush()
+
+
+def post_to_discord(url, message):
+    return dispatcher.post(url, message, "discord")
+
+
+def post_to_slack(url, message):
+    return dispatcher.post(url, message, "slack")
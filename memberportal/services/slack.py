@@ -1,6 +1,5 @@
-import requests
-from django.conf import settings
 from constance import config
+from services.notifications import post_to_slack
 import logging
 
 logger = logging.getLogger("slack")
@@ -48,10 +47,7 @@ def post_door_swipe_to_slack(name, door, status):
                 }
             )
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_slack(url, json_message)
 
     return True
 
@@ -65,10 +61,7 @@ def post_door_bump_to_slack(name, door):
         json_message = {}
         json_message.update({"text": ":unlock: {} just bumped {}.".format(name, door)})
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_slack(url, json_message)
 
     return True
 
@@ -131,10 +124,7 @@ def post_interlock_swipe_to_slack(name, interlock, type, time=None):
                 }
             )
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_slack(url, json_message)
 
     else:
         return True
@@ -153,9 +143,6 @@ def post_kiosk_swipe_to_slack(name, sign_in):
             }
         )
 
-        try:
-            requests.post(url, json=json_message, timeout=settings.REQUEST_TIMEOUT)
-        except requests.exceptions.ReadTimeout:
-            return True
+        post_to_slack(url, json_message)
 
     return True
@@ -1,36 +1,279 @@
 from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
 from constance import config
+from membermatters.celeryapp import app
+from services import metrics
+from types import SimpleNamespace
+from functools import partial
+import itertools
+import threading
 import json
 import logging
-import os
+import time
 
 logger = logging.getLogger("sms")
 
 
+class FakeTwilioClient:
+    """
+    A stand-in for the Twilio client that records messages in memory instead of
+    sending them. Enabled with MM_SMS_BACKEND=fake for local development and
+    testing.
+    """
+
+    outbox = []
+    _ids = itertools.count(1)
+
+    def __init__(self, *args, **kwargs):
+        self.messages = self
+
+    def create(self, body, from_, to):
+        message = SimpleNamespace(
+            sid=f"SMfake{next(self._ids):08d}",
+            body=body,
+            from_=from_,
+            to=to,
+            status="queued",
+        )
+        self.outbox.append(message)
+        return message
+
+
+class SMSDispatcher:
+    """
+    Long lived SMS dispatcher shared by every SMS in the process. The Twilio
+    client (and its pooled HTTP session) and the parsed SMS_MESSAGES templates
+    are kept around and only rebuilt when the relevant config changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_key = None
+        self._messages = None
+        self._messages_raw = None
+
+    def get_client(self):
+        client_key = (
+            settings.SMS_BACKEND,
+            config.TWILIO_ACCOUNT_SID,
+            config.TWILIO_AUTH_TOKEN,
+        )
+
+        with self._lock:
+            if self._client is None or self._client_key != client_key:
+                backend, account_sid, auth_token = client_key
+                if backend == "fake":
+                    self._client = FakeTwilioClient()
+                else:
+                    self._client = Client(account_sid, auth_token)
+                self._client_key = client_key
+
+            return self._client
+
+    def get_messages(self):
+        messages_raw = config.SMS_MESSAGES
+
+        with self._lock:
+            if self._messages is None or self._messages_raw != messages_raw:
+                try:
+                    self._messages = json.loads(messages_raw)
+                except Exception as e:
+                    logger.error(e)
+                    raise e
+                self._messages_raw = messages_raw
+
+            return self._messages
+
+    def deliver(self, to_number, body, queued_at=None):
+        """
+        Sends a single message through the provider. Returns the provider's
+        message object.
+        """
+        message = self.get_client().messages.create(
+            body=body, from_=config.SMS_SENDER_ID, to=to_number
+        )
+
+        metrics.sms_messages_total.labels(status="sent").inc()
+        if queued_at:
+            latency = max(time.time() - queued_at, 0)
+            metrics.sms_delivery_latency_seconds.observe(latency)
+            logger.debug(f"SMS delivery latency was {latency:.2f}s")
+
+        return message
+
+
+dispatcher = SMSDispatcher()
+
+
+def _parse_rate_limit(rate_limit):
+    """Converts a celery style rate limit ("1/s", "60/m") to messages per second."""
+    if not rate_limit:
+        return None
+
+    amount, _, unit = str(rate_limit).partition("/")
+    seconds = {"s": 1, "m": 60, "h": 3600}.get(unit or "s", 1)
+
+    return float(amount) / seconds
+
+
+SMS_RATE_LIMIT_PER_SECOND = _parse_rate_limit(settings.SMS_RATE_LIMIT)
+
+
+def _log_sent(body, sender_id=None, recipient_id=None):
+    User = get_user_model()
+    users = User.objects.in_bulk(
+        [user_id for user_id in (sender_id, recipient_id) if user_id]
+    )
+    portal_user_sender = users.get(sender_id)
+    portal_user_recipient = users.get(recipient_id)
+
+    if portal_user_recipient:
+        sender = portal_user_sender.get_full_name() if portal_user_sender else "unknown"
+        portal_user_recipient.log_event(
+            description=f"Sent SMS by {sender}: {body}", event_type="sms", data=body
+        )
+    if portal_user_sender and portal_user_recipient:
+        message = f"Sent SMS to {portal_user_recipient.get_full_name()}: {body}"
+        portal_user_sender.log_event(description=message, event_type="sms", data=body)
+
+
+def _is_retryable(exception):
+    return exception.status == 429 or exception.status >= 500
+
+
+@app.task(
+    bind=True,
+    rate_limit=settings.SMS_RATE_LIMIT,
+    max_retries=5,
+    default_retry_delay=30,
+)
+def send_sms(self, to_number, body, sender_id=None, recipient_id=None, queued_at=None):
+    """
+    Sends a single queued SMS. The task rate limit keeps us within Twilio's
+    per number sending limits.
+    """
+    try:
+        dispatcher.deliver(to_number, body, queued_at=queued_at)
+
+    except TwilioRestException as e:
+        if _is_retryable(e):
+            metrics.sms_messages_total.labels(status="retried").inc()
+            raise self.retry(exc=e)
+
+        metrics.sms_messages_total.labels(status="failed").inc()
+        logger.error(f"Failed to send sms to phone ending in {to_number[-3:]}: {e}")
+        return False
+
+    logger.info(f"Sent sms to phone ending in {to_number[-3:]}")
+    _log_sent(body, sender_id, recipient_id)
+    return True
+
+
+@app.task(bind=True, max_retries=5, default_retry_delay=30)
+def send_sms_batch(self, messages):
+    """
+    Sends a batch of queued SMS messages through one client, pacing them to
+    stay within the configured rate limit. Messages that fail with a retryable
+    error are re-queued as a smaller batch.
+    """
+    rate = SMS_RATE_LIMIT_PER_SECOND
+    failed = []
+
+    for message in messages:
+        started = time.monotonic()
+
+        try:
+            dispatcher.deliver(
+                message["to_number"],
+                message["body"],
+                queued_at=message.get("queued_at"),
+            )
+            _log_sent(
+                message["body"], message.get("sender_id"), message.get("recipient_id")
+            )
+
+        except TwilioRestException as e:
+            if _is_retryable(e):
+                failed.append(message)
+            else:
+                metrics.sms_messages_total.labels(status="failed").inc()
+                logger.error(
+                    f"Failed to send sms to phone ending in {message['to_number'][-3:]}: {e}"
+                )
+
+        elapsed = time.monotonic() - started
+        if rate and elapsed < 1 / rate:
+            time.sleep(1 / rate - elapsed)
+
+    if failed:
+        metrics.sms_messages_total.labels(status="retried").inc(len(failed))
+        raise self.retry(args=(failed,))
+
+    return len(messages)
+
+
+def queue_sms_batch(messages):
+    """
+    Queues a list of messages ({"to_number": ..., "body": ...}) to be sent in
+    batches of SMS_BATCH_SIZE.
+    """
+    queued_at = time.time()
+    messages = [{"queued_at": queued_at, **message} for message in messages]
+
+    # like the email outbox, nothing is sent until the transaction commits
+    for i in range(0, len(messages), settings.SMS_BATCH_SIZE):
+        transaction.on_commit(
+            partial(send_sms_batch.delay, messages[i : i + settings.SMS_BATCH_SIZE])
+        )
+
+    metrics.sms_messages_total.labels(status="queued").inc(len(messages))
+    return len(messages)
+
+
+ACCESS_MESSAGES = {
+    "activated_access": "Hi! Your site access was just turned on. Please make sure you stay up to date"
+    " with our policies and rules by visiting our website.",
+    "deactivated_access": "Hi! Your site access was just turned off. Please check your email and "
+    "contact us if you need assistance.",
+}
+
+
 class SMS:
     def __init__(self):
         self.sms_enable = config.SMS_ENABLE
-        self.account_sid = config.TWILIO_ACCOUNT_SID
-        self.auth_token = config.TWILIO_AUTH_TOKEN
         self.default_country_code = config.SMS_DEFAULT_COUNTRY_CODE
-        self.sender_id = config.SMS_SENDER_ID
         self.sms_footer = config.SMS_FOOTER
-        if self.sms_enable:
-            self.client = Client(self.account_sid, self.auth_token)
-        else:
-            self.client = None
+        self.sms_messages = dispatcher.get_messages()
 
-        try:
-            self.sms_messages = json.loads(config.SMS_MESSAGES)
-        except Exception as e:
-            logger.error(e)
-            raise e
+    def _prepare(self, to_number="", body=""):
+        """
+        Validates and formats an SMS for sending.
+        :return: (to_number, body)
+        """
+        if len(body) < 1:
+            raise RuntimeError("SMS body has no characters!")
+
+        if len(to_number) < 10:
+            raise RuntimeError("SMS to_number is less than 10!")
+
+        # if the to_number does not include a country code, add our default one to the front
+        if not to_number.startswith("+"):
+            to_number = self.default_country_code + to_number
+
+        if self.sms_footer:
+            body = body + "\n\n" + self.sms_footer
+
+        return to_number, body
 
     def _send(
         self, to_number="", body="", portal_user_sender=None, portal_user_recipient=None
     ):
         """
-        Send an SMS to the specified phone number with the body.
+        Queue an SMS to the specified phone number with the body.
         :param to_number:
         :type to_number: string
         :param body:
@@ -41,6 +284,7 @@ class SMS:
 
         if not self.sms_enable:
             logger.info("Skipping SMS sending because it's turned off!")
+            metrics.sms_messages_total.labels(status="skipped").inc()
             if portal_user_recipient:
                 portal_user_recipient.log_event(
                     description="Skipped sending SMS because SMS is turned off",
@@ -54,36 +298,65 @@ class SMS:
                 )
             return False
 
-        if len(body) < 1:
-            raise RuntimeError("SMS body has no characters!")
+        to_number, body = self._prepare(to_number, body)
 
-        if len(to_number) < 10:
-            raise RuntimeError("SMS to_number is less than 10!")
+        # like the email outbox, nothing is sent until the transaction commits
+        transaction.on_commit(
+            partial(
+                send_sms.delay,
+                to_number,
+                body,
+                sender_id=portal_user_sender.id if portal_user_sender else None,
+                recipient_id=(
+                    portal_user_recipient.id if portal_user_recipient else None
+                ),
+                queued_at=time.time(),
+            )
+        )
+        metrics.sms_messages_total.labels(status="queued").inc()
 
-        # if the to_number does not include a country code, add our default one to the front
-        if not to_number.startswith("+"):
-            to_number = self.default_country_code + to_number
+        logger.info(f"Queued sms to phone ending in {to_number[-3:]}")
+        return True
 
-        if self.sms_footer:
-            body = body + "\n\n" + self.sms_footer
+    def _send_batch(self, messages):
+        """
+        Queues many SMS messages to be sent in batches.
+        :param messages: a list of (to_number, body, portal_user_recipient)
+        :return: the number of messages queued
+        """
+        if not self.sms_enable:
+            logger.info("Skipping SMS sending because it's turned off!")
+            metrics.sms_messages_total.labels(status="skipped").inc(len(messages))
+            return 0
 
-        self.client.messages.create(body=body, from_=self.sender_id, to=to_number)
+        batch = []
+        for to_number, body, portal_user_recipient in messages:
+            try:
+                to_number, body = self._prepare(to_number or "", body)
+            except RuntimeError as e:
+                logger.warning(f"Not sending SMS: {e}")
+                continue
 
-        logger.info(f"Sent sms to phone ending in {to_number[-3:]}")
-        if portal_user_recipient:
-            sender = (
-                portal_user_sender.get_full_name() if portal_user_sender else "unknown"
-            )
-            portal_user_recipient.log_event(
-                description=f"Sent SMS by {sender}: {body}", event_type="sms", data=body
-            )
-        if portal_user_sender and portal_user_recipient:
-            message = f"Sent SMS to {portal_user_recipient.get_full_name()}: {body}"
-            portal_user_sender.log_event(
-                description=message, event_type="sms", data=body
+            batch.append(
+                {
+                    "to_number": to_number,
+                    "body": body,
+                    "recipient_id": (
+                        portal_user_recipient.id if portal_user_recipient else None
+                    ),
+                }
             )
 
-        return True
+        return queue_sms_batch(batch)
+
+    def _get_access_message(self, active):
+        key = "activated_access" if active else "deactivated_access"
+        return self.sms_messages.get(key, ACCESS_MESSAGES[key])
+
+    def send_access_changed_batch(self, users, active):
+        """Tells a list of members their site access was turned on or off."""
+        message = self._get_access_message(active)
+        return self._send_batch([(user.profile.phone, message, user) for user in users])
 
     def send_inactive_swipe_alert(
         self, to_number, portal_user_sender=None, portal_user_recipient=None
@@ -110,21 +383,13 @@ class SMS:
     def send_deactivated_access(
         self, to_number, portal_user_sender=None, portal_user_recipient=None
     ):
-        message = self.sms_messages.get(
-            "deactivated_access",
-            "Hi! Your site access was just turned off. Please check your email and "
-            "contact us if you need assistance.",
-        )
+        message = self._get_access_message(active=False)
         self._send(to_number, message, portal_user_sender, portal_user_recipient)
 
     def send_activated_access(
         self, to_number, portal_user_sender=None, portal_user_recipient=None
     ):
-        message = self.sms_messages.get(
-            "activated_access",
-            "Hi! Your site access was just turned on. Please make sure you stay up to date"
-            " with our policies and rules by visiting our website.",
-        )
+        message = self._get_access_message(active=True)
         self._send(to_number, message, portal_user_sender, portal_user_recipient)
 
     def send_custom_notification(